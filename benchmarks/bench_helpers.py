@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for pure hot-path helpers
+Run: python benchmarks/bench_helpers.py            (compare with baseline)
+     python benchmarks/bench_helpers.py --update   (store new baseline)
+     python -m pytest tests/test_benchmarks.py --benchmarks
+                                                   (same gate under pytest / CI, skipped without the flag)
+
+Each function is timed against a fixed reference workload in the same run
+(interleaved, median of N rounds), and the baseline stores that ratio rather than
+absolute nanoseconds, so a slower or busier host doesn't read as a
+regression. Fails (exit 1) if any ratio is above baseline * threshold.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Config is read at import time, give it something valid
+os.environ.setdefault("MONGO_DB_URL", "mongodb://localhost")
+
+from helpers import (
+    normalize_name,
+    encode_payload,
+    decode_payload,
+    parse_quality,
+    format_size
+)
+from utils.codec import KIND_QUALITY, decode, decode_callback, encode_callback
+from utils.monetize import create_download_link
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Extra measurements of a benchmark that looks regressed
+RETRIES = 2
+
+TOKEN = "PZtD5bf2FehHwz93gm63gw"
+PAYLOAD = encode_payload(1234, 2, "1080p", TOKEN)
+CALLBACK = encode_callback(KIND_QUALITY, 1234, 2, "1080p")
+LEGACY_PAYLOAD = "a2lsbF9iaWxsfDF8NzIwcHxQWnRENWJmMkZlaEh3ejkzZ202M2d3"
+
+# name -> zero-arg callable
+BENCHMARKS = {
+    "normalize_name": lambda: normalize_name("Kill Bill: Vol. 1 (2003)  -  Director's Cut!"),
+    "encode_payload": lambda: encode_payload(1234, 2, "1080p", TOKEN),
+    "decode_payload": lambda: decode_payload(PAYLOAD),
+    # decode() is lru_cached - measure the real parse too
+    "codec_decode_uncached": lambda: decode.__wrapped__(PAYLOAD),
+    "decode_payload_legacy": lambda: decode_payload(LEGACY_PAYLOAD),
+    "encode_callback": lambda: encode_callback(KIND_QUALITY, 1234, 2, "1080p"),
+    "decode_callback": lambda: decode_callback(CALLBACK),
+    "decode_callback_legacy": lambda: decode_callback("quality:kill_bill:2:1080p"),
+    "create_download_link": lambda: create_download_link(
+        "https://example.com/file/videos/file_123.mp4",
+        "Kill Bill - Part 1 (1080p).mp4",
+        "1.45 GB",
+        "1080p"
+    ),
+    "parse_quality": lambda: parse_quality(" 4k "),
+    "format_size": lambda: format_size(1556925644),
+}
+
+
+def reference():
+    """Fixed pure-Python workload every benchmark is measured against"""
+    counts = {}
+    for word in "the quick brown fox jumps over the lazy dog".split():
+        counts[word] = counts.get(word, 0) + len(word)
+    return "-".join(sorted(counts))
+
+
+def loops(timer: timeit.Timer) -> int:
+    """Calls per timing - about 20ms worth"""
+    number, _ = timer.autorange()
+    return max(1, number // 10)
+
+
+def measure(func, repeat: int = 15) -> tuple:
+    """
+    (best ns per call, cost in reference units) - func and the reference are
+    timed back to back each round and the median of the round ratios is kept,
+    so drift and one-off stalls on either side cancel out
+    """
+    timer = timeit.Timer(func)
+    ref_timer = timeit.Timer(reference)
+    number = loops(timer)
+    ref_number = loops(ref_timer)
+    times, ratios = [], []
+    for _ in range(repeat):
+        t = timer.timeit(number) / number
+        ratios.append(t / (ref_timer.timeit(ref_number) / ref_number))
+        times.append(t)
+    return min(times) * 1e9, statistics.median(ratios)
+
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE) as f:
+        return json.load(f)
+
+
+def run(names: list = None, threshold: float = 1.5, baseline: dict = None, verbose: bool = True) -> tuple:
+    """Benchmark `names` (default all) -> ({name: ratio to reference}, [regressed names])"""
+    baseline = load_baseline() if baseline is None else baseline
+    results = {}
+    regressions = []
+
+    if verbose:
+        print(f"{'benchmark':<26}{'ns/call':>10}{'x ref':>8}{'baseline':>10}{'change':>8}")
+    for name in names or list(BENCHMARKS):
+        base = baseline.get(name)
+        ns, ratio = measure(BENCHMARKS[name])
+        # Re-measure before calling it a regression
+        for _ in range(RETRIES):
+            if not base or ratio / base <= threshold:
+                break
+            ns, ratio = min((ns, ratio), measure(BENCHMARKS[name]), key=lambda m: m[1])
+        results[name] = round(ratio, 3)
+
+        change = ratio / base if base else None
+        flag = ""
+        if change and change > threshold:
+            regressions.append(name)
+            flag = "  ❌ REGRESSION"
+        if verbose:
+            print(f"{name:<26}{ns:>10.1f}{ratio:>8.2f}{base or '-':>10}"
+                  f"{f'{change:.2f}' if change else '-':>8}{flag}")
+
+    return results, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=1.5, help="allowed slowdown factor")
+    parser.add_argument("names", nargs="*", help="only run these benchmarks")
+    args = parser.parse_args()
+
+    baseline = load_baseline()
+    results, regressions = run(args.names, args.threshold, baseline)
+
+    if args.update:
+        baseline.update(results)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n✅ Baseline saved to {BASELINE_FILE}")
+        return 0
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) past {args.threshold}x: {', '.join(regressions)}")
+        return 1
+
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
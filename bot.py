@@ -4,11 +4,15 @@ Movie Bot - Main Entry Point with Flask for Render
 Run: python bot.py
 """
 import asyncio
+import atexit
+import hmac
 import logging
+import signal
 import sys
 import threading
 import os
-from flask import Flask, jsonify
+from pathlib import Path
+from flask import Flask, Response, jsonify, request
 
 # Event loop fix
 try:
@@ -16,20 +20,44 @@ try:
 except RuntimeError:
     asyncio.set_event_loop(asyncio.new_event_loop())
 
-from pyrogram import Client
 from pyrogram.enums import ParseMode
 from config import Config
 from handlers import register_all_handlers
-from database import db
+from jobs import register_all_jobs
+from database import db, db_monitor
+from helpers import close_http_session
+from utils.analytics import analytics
+from utils.breaker import breakers
+from utils.chunk_cache import chunk_cache
+from utils.deadline import budgets
+from utils.leader import leader
+from utils.lifecycle import lifecycle
+from utils.limiter import limiters
+from utils.logs import setup_logging
+from utils.memory import memory, register_size
+from utils.offload import offload
+from utils.outbox import OutboundClient, outbox
+from utils.recorder import recorder
+from utils.scheduler import scheduler
+from utils.session_store import MappedFileStorage, MongoStorage
+from utils.singleflight import flights
+from utils.stream import streamer
+from utils.watchdog import watchdog
+from utils.warmstart import warm_start
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Logging (records go through a queue, a background thread writes them)
+log_listener = setup_logging(
+    level=Config.LOG_LEVEL,
+    sampling=Config.LOG_SAMPLING,
+    error_burst=Config.LOG_ERROR_BURST
 )
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
+# Trace allocations from startup when MEMORY_TRACE_FRAMES is set (otherwise /memory start)
+memory.start()
+
 # Flask app for Render port binding
 app = Flask(__name__)
 
@@ -37,6 +65,10 @@ app = Flask(__name__)
 bot_instance = None
 bot_username = None
 
+# Bot thread loop + stop signal (set from the main thread on SIGTERM)
+bot_loop = None
+stop_event = None
+
 @app.route('/')
 def home():
     """Home route for health check"""
@@ -62,13 +94,48 @@ def status():
     return jsonify({
         "running": bot_instance is not None,
         "bot_username": bot_username,
+        "leader": leader.snapshot(),
         "version": "1.0.0"
     }), 200
 
+@app.route('/metrics')
+def metrics():
+    """Runtime metrics (concurrency limits, queues)"""
+    return jsonify({
+        "limiters": {name: l.snapshot() for name, l in limiters.items()},
+        "breakers": {name: b.snapshot() for name, b in breakers.items()},
+        "outbox": outbox.snapshot(),
+        "budgets": {name: b.snapshot() for name, b in budgets.items()},
+        "flights": {name: f.snapshot() for name, f in flights.items()},
+        "loop": watchdog.snapshot(),
+        "offload": offload.snapshot(),
+        "mongo": db_monitor.snapshot(),
+        "memory": memory.last,
+        "warm_start": warm_start.snapshot(),
+        "streams": streamer.snapshot(),
+        "chunk_cache": chunk_cache.snapshot(),
+        "session": bot_instance.storage.snapshot() if bot_instance else None
+    }), 200
+
+@app.route('/memory')
+def memory_report():
+    """Top allocations, growth since the baseline, cache and buffer sizes (needs X-Admin-Token)"""
+    token = request.headers.get("X-Admin-Token", "")
+    if not Config.MEMORY_HTTP_TOKEN or not hmac.compare_digest(token, Config.MEMORY_HTTP_TOKEN):
+        return jsonify({"error": "forbidden"}), 403
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 50)
+    return jsonify(memory.snapshot(limit)), 200
+
+@app.route('/dl/<token>/<path:name>')
+def download(token, name):
+    """Signed download link - streams the file from Telegram (Range supported)"""
+    status, headers, body = streamer.prepare(token, name, request.headers.get("Range"))
+    return Response(body, status=status, headers=headers, direct_passthrough=True)
+
 
 async def run_bot():
     """Run the Pyrogram bot"""
-    global bot_instance, bot_username
+    global bot_instance, bot_username, stop_event
     
     # Validate config
     try:
@@ -78,18 +145,64 @@ async def run_bot():
         logger.error(f"❌ Config Error: {e}")
         sys.exit(1)
     
-    # Create bot
-    bot_instance = Client(
-        name="movie_bot",
+    # Fill caches from the last snapshot (values are decoded on first use)
+    warm_start.load()
+    chunk_cache.load()
+    
+    # Create bot (all sends are paced through the outbox)
+    bot_instance = OutboundClient(
+        name=Config.SESSION_NAME,
         api_id=Config.API_ID,
         api_hash=Config.API_HASH,
-        bot_token=Config.BOT_TOKEN
+        bot_token=Config.BOT_TOKEN,
+        # Every download holds one of these for its whole stream (Pyrogram defaults to 1)
+        max_concurrent_transmissions=Config.STREAM_MAX_STREAMS
     )
     
+    # Session (auth key + peers) outside the container filesystem
+    if Config.SESSION_STORAGE == "mongo":
+        bot_instance.storage = MongoStorage(Config.SESSION_NAME, db.db)
+    else:
+        bot_instance.storage = MappedFileStorage(Config.SESSION_NAME, Path(Config.SESSION_DIR))
+    
     # Register handlers
     register_all_handlers(bot_instance)
     logger.info("✅ Handlers registered")
     
+    # Register background jobs
+    register_all_jobs(scheduler, app)
+    
+    # Buffers reported in /memory and the memory gauges
+    register_size("analytics_buffer", lambda: len(analytics.buffer))
+    register_size("outbox_queued", lambda: sum(outbox.snapshot()["queued"].values()))
+    register_size("inflight_updates", lambda: lifecycle.inflight)
+    register_size("pyrogram_peers", lambda: bot_instance.storage.snapshot()["peers"])
+    
+    async def stop_telegram():
+        if bot_instance.is_connected:
+            await bot_instance.stop()
+    
+    # Cleanup hooks (run after in-flight updates are drained)
+    lifecycle.on_shutdown("scheduler", scheduler.stop)
+    lifecycle.on_shutdown("leader", leader.stop)
+    lifecycle.on_shutdown("streams", lambda: streamer.drain(Config.SHUTDOWN_TIMEOUT))
+    lifecycle.on_shutdown("analytics", analytics.flush)
+    lifecycle.on_shutdown("warm_start", warm_start.save)
+    lifecycle.on_shutdown("recorder", recorder.flush)
+    lifecycle.on_shutdown("outbox", outbox.stop)
+    lifecycle.on_shutdown("http", close_http_session)
+    lifecycle.on_shutdown("offload", offload.shutdown)
+    lifecycle.on_shutdown("watchdog", watchdog.stop)
+    lifecycle.on_shutdown("session", bot_instance.storage.save)
+    # Stopping the client closes its storage (MongoStorage flushes) - Mongo must still be open
+    lifecycle.on_shutdown("telegram", stop_telegram)
+    lifecycle.on_shutdown("mongo", db.close)
+    
+    stop_event = asyncio.Event()
+    
+    # Measure event loop lag from here on (stalls are logged with the blocking stack)
+    watchdog.start()
+    
     # Start
     try:
         await bot_instance.start()
@@ -97,25 +210,58 @@ async def run_bot():
         bot_username = me.username
         logger.info(f"✅ Bot started: @{bot_username}")
         
-        # Keep running
-        await asyncio.Event().wait()
+        # Download links are served by the web thread, reading through this client
+        streamer.attach(bot_instance, asyncio.get_running_loop())
+        
+        await db.ensure_indexes()
+        
+        # Elect a leader among replicas - singleton work runs only there
+        await leader.start(db.leases)
+        if leader.is_leader:
+            backfilled = await db.backfill_movie_ids()
+            if backfilled:
+                logger.info(f"✅ Assigned ids to {backfilled} movies")
+        
+        scheduler.start()
+        
+        # Startup allocations are done - diff from here
+        memory.reset_baseline()
+        
+        # Keep running until SIGTERM/SIGINT
+        await stop_event.wait()
         
     except Exception as e:
         logger.error(f"❌ Error: {e}")
     finally:
-        await bot_instance.stop()
+        await lifecycle.shutdown(Config.SHUTDOWN_TIMEOUT)
+        logger.info("👋 Bot stopped")
 
 
 def start_bot_thread():
     """Start bot in a separate thread with its own event loop"""
+    global bot_loop
+    
     # Create new event loop for this thread
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    bot_loop = loop
     
     # Run bot
     loop.run_until_complete(run_bot())
 
 
+def handle_signal(signum, frame):
+    """Stop the bot gracefully, then exit the web server"""
+    logger.info(f"📴 Received signal {signum}, stopping...")
+    
+    if bot_loop is not None and stop_event is not None:
+        bot_loop.call_soon_threadsafe(stop_event.set)
+    
+    # Drain deadline + time for cleanup hooks and client stop
+    bot_thread.join(timeout=Config.SHUTDOWN_TIMEOUT + 10)
+    sys.exit(0)
+
+
 if __name__ == "__main__":
     print("""
 ╔════════════════════════════════╗
@@ -128,6 +274,10 @@ if __name__ == "__main__":
     bot_thread.start()
     logger.info("✅ Bot thread started")
     
+    # Graceful shutdown (signals are delivered to the main thread)
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
     # Get port from environment (Render provides this)
     port = int(os.environ.get("PORT", 10000))
     
@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,8 +21,102 @@ class Config:
     MONGO_DB_URL = os.environ.get("MONGO_DB_URL", "")
     DB_NAME = os.environ.get("DB_NAME", "MovieBot")
     
+    # Database routing profiles (pool size per profile)
+    MONGO_PRIMARY_POOL_SIZE = int(os.environ.get("MONGO_PRIMARY_POOL_SIZE", 10))
+    MONGO_CATALOG_POOL_SIZE = int(os.environ.get("MONGO_CATALOG_POOL_SIZE", 50))
+    MONGO_TOKEN_POOL_SIZE = int(os.environ.get("MONGO_TOKEN_POOL_SIZE", 30))
+    MONGO_USER_POOL_SIZE = int(os.environ.get("MONGO_USER_POOL_SIZE", 20))
+    # Catalog reads may lag the primary by this much (Mongo minimum is 90)
+    MONGO_MAX_STALENESS = int(os.environ.get("MONGO_MAX_STALENESS", 120))
+    # User upserts write concern ("1", "majority", or "0" for fire-and-forget)
+    MONGO_USER_WRITE_CONCERN = os.environ.get("MONGO_USER_WRITE_CONCERN", "1")
+    
+    # Command monitoring (slow log threshold, fraction of slow reads to explain)
+    MONGO_SLOW_MS = float(os.environ.get("MONGO_SLOW_MS", 100))
+    MONGO_EXPLAIN_SAMPLE = float(os.environ.get("MONGO_EXPLAIN_SAMPLE", 0.1))
+    
     # TMDB
     TMDB_API_KEY = os.environ.get("TMDB_API_KEY", "")
+    # Local metadata store (filled by: python -m utils.tmdb_store dump.json.gz)
+    TMDB_STORE_PATH = os.environ.get("TMDB_STORE_PATH", "tmdb.sqlite3")
+    
+    # Concurrency limits (adaptive, these are the upper bounds)
+    MONGO_MAX_CONCURRENCY = int(os.environ.get("MONGO_MAX_CONCURRENCY", 100))
+    TELEGRAM_MAX_CONCURRENCY = int(os.environ.get("TELEGRAM_MAX_CONCURRENCY", 50))
+    LIMITER_QUEUE_TIMEOUT = float(os.environ.get("LIMITER_QUEUE_TIMEOUT", 3))
+    
+    # Outgoing message pacing (Telegram: ~30 msgs/s overall, ~1 msg/s per chat)
+    OUTBOX_RATE = float(os.environ.get("OUTBOX_RATE", 30))
+    OUTBOX_CHAT_RATE = float(os.environ.get("OUTBOX_CHAT_RATE", 1))
+    OUTBOX_CHAT_BURST = float(os.environ.get("OUTBOX_CHAT_BURST", 3))
+    
+    # Time budget per update (seconds) - optional steps are cancelled past it
+    UPDATE_BUDGET = float(os.environ.get("UPDATE_BUDGET", 5))
+    
+    # Reply with catalog data first, edit in TMDB details if they arrive within UPDATE_BUDGET
+    PROGRESSIVE_REPLIES = os.environ.get("PROGRESSIVE_REPLIES", "true").lower() == "true"
+    
+    # Logging (sampling: "logger=rate,..." applies to records below WARNING)
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    LOG_SAMPLING = os.environ.get("LOG_SAMPLING", "handlers.user=0.1")
+    LOG_ERROR_BURST = int(os.environ.get("LOG_ERROR_BURST", 10))
+    
+    # Leader election between replicas (lease length, renewal interval in seconds)
+    LEADER_TTL = float(os.environ.get("LEADER_TTL", 30))
+    LEADER_HEARTBEAT = float(os.environ.get("LEADER_HEARTBEAT", 10))
+    
+    # Update recording for replay tests (opt-in; sample = fraction of users)
+    RECORD_UPDATES = os.environ.get("RECORD_UPDATES", "false").lower() == "true"
+    RECORD_DIR = os.environ.get("RECORD_DIR", "recordings")
+    RECORD_SAMPLE = float(os.environ.get("RECORD_SAMPLE", 1.0))
+    # Database replays run against (defaults to MONGO_DB_URL / DB_NAME; must differ from them)
+    REPLAY_MONGO_URL = os.environ.get("REPLAY_MONGO_URL", "")
+    REPLAY_DB_NAME = os.environ.get("REPLAY_DB_NAME", "")
+    
+    # Memory profiling (tracemalloc frames traced from startup, 0 = only via /memory start;
+    # RSS warning threshold, 0 = off)
+    MEMORY_TRACE_FRAMES = int(os.environ.get("MEMORY_TRACE_FRAMES", 0))
+    MEMORY_WARN_MB = float(os.environ.get("MEMORY_WARN_MB", 400))
+    # Secret for the /memory HTTP report (sent as X-Admin-Token; empty = report disabled)
+    MEMORY_HTTP_TOKEN = os.environ.get("MEMORY_HTTP_TOKEN", "")
+    
+    # Pyrogram session storage: "mongo" (survives redeploys) or "file" (SQLite in SESSION_DIR, e.g. a mounted volume)
+    SESSION_STORAGE = os.environ.get("SESSION_STORAGE", "mongo").lower()
+    SESSION_DIR = os.environ.get("SESSION_DIR", ".")
+    # One session (auth key) per replica - Telegram revokes an auth key used by two connections at once.
+    # Defaults to the platform instance id (Render) or the hostname, so a replica keeps its session
+    SESSION_NAME = os.environ.get(
+        "SESSION_NAME",
+        "movie_bot-" + os.environ.get("RENDER_INSTANCE_ID", socket.gethostname())
+    )
+    
+    # Warm start: cache snapshot file ("" = off) and how often it is rewritten (seconds)
+    WARM_START_PATH = os.environ.get("WARM_START_PATH", "warm_cache.bin")
+    WARM_START_INTERVAL = int(os.environ.get("WARM_START_INTERVAL", 300))
+    
+    # Download server: public base URL of this app (Render sets RENDER_EXTERNAL_URL),
+    # link signing secret (default: derived from BOT_TOKEN), link lifetime (seconds),
+    # chunks buffered per download (1 MiB each) and concurrent downloads
+    PUBLIC_URL = os.environ.get("PUBLIC_URL", os.environ.get("RENDER_EXTERNAL_URL", ""))
+    STREAM_SECRET = os.environ.get("STREAM_SECRET", "")
+    STREAM_LINK_TTL = int(os.environ.get("STREAM_LINK_TTL", 3600))
+    STREAM_BUFFER_CHUNKS = int(os.environ.get("STREAM_BUFFER_CHUNKS", 4))
+    STREAM_MAX_STREAMS = int(os.environ.get("STREAM_MAX_STREAMS", 20))
+    
+    # Disk cache for /dl chunks (1 MiB each, shared by every download of a file).
+    # Size in MB, off (0) by default - only turn it on with local disk to spare, the
+    # cache fills up to CHUNK_CACHE_MB in CHUNK_CACHE_DIR and evicts from there
+    CHUNK_CACHE_DIR = os.environ.get("CHUNK_CACHE_DIR", "chunk_cache")
+    CHUNK_CACHE_MB = int(os.environ.get("CHUNK_CACHE_MB", 0))
+    
+    # Event loop watchdog: log the blocking stack when the loop is stuck this long (ms)
+    LOOP_LAG_THRESHOLD_MS = float(os.environ.get("LOOP_LAG_THRESHOLD_MS", 250))
+    
+    # Worker threads for heavy admin work (formatting, tracemalloc snapshots)
+    OFFLOAD_THREADS = int(os.environ.get("OFFLOAD_THREADS", 4))
+    
+    # Shutdown (seconds to drain in-flight updates on SIGTERM)
+    SHUTDOWN_TIMEOUT = int(os.environ.get("SHUTDOWN_TIMEOUT", 25))
     
     @classmethod
     def validate(cls):
@@ -1,40 +1,325 @@
 import logging
 import time
 import secrets
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import Config
+from utils.cache import TTLCache
+from utils.dbmonitor import CommandMonitor
+from utils.limiter import AdaptiveLimiter
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Shared by every request-path query below
+mongo_limiter = AdaptiveLimiter(
+    "mongo",
+    initial=20,
+    max_limit=Config.MONGO_MAX_CONCURRENCY,
+    target_latency=0.2,
+    queue_timeout=Config.LIMITER_QUEUE_TIMEOUT
+)
+
+# Latency histograms / slow log for every client below (shown in /dbstats)
+db_monitor = CommandMonitor(slow_ms=Config.MONGO_SLOW_MS, explain_rate=Config.MONGO_EXPLAIN_SAMPLE)
+
+
+# Movie docs by code, plus ("mid", id) -> code. Catalog reads already accept
+# MONGO_MAX_STALENESS of lag; writes made here drop the entry right away
+movie_cache = TTLCache("catalog", ttl=60, max_size=2000, persist=True)
+
+# Concurrent misses for one movie (a posted deep link) share one query
+movie_flight = SingleFlight("movie")
+
+
+def _write_concern(value: str) -> WriteConcern:
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+# Routing profiles: one client (own pool) per profile
+#   primary - catalog writes, admin reads, maintenance (majority writes)
+#   catalog - catalog reads from secondaries with bounded staleness
+#   token   - token create/redeem, primary only, fast acknowledged writes
+#   user    - user upserts, write concern from Config
+PROFILES = {
+    "primary": {
+        "pool_size": Config.MONGO_PRIMARY_POOL_SIZE,
+        "read_preference": Primary(),
+        "write_concern": WriteConcern(w="majority")
+    },
+    "catalog": {
+        "pool_size": Config.MONGO_CATALOG_POOL_SIZE,
+        "read_preference": SecondaryPreferred(max_staleness=Config.MONGO_MAX_STALENESS),
+        "write_concern": WriteConcern(w="majority")
+    },
+    "token": {
+        "pool_size": Config.MONGO_TOKEN_POOL_SIZE,
+        "read_preference": Primary(),
+        "write_concern": WriteConcern(w=1)
+    },
+    "user": {
+        "pool_size": Config.MONGO_USER_POOL_SIZE,
+        "read_preference": Primary(),
+        "write_concern": _write_concern(Config.MONGO_USER_WRITE_CONCERN)
+    }
+}
+
 
 class Database:
     def __init__(self):
-        self.client = AsyncIOMotorClient(Config.MONGO_DB_URL)
-        self.db = self.client[Config.DB_NAME]
+        self.clients = {}
+        self.dbs = {}
+        for name, profile in PROFILES.items():
+            client = AsyncIOMotorClient(
+                Config.MONGO_DB_URL,
+                maxPoolSize=profile["pool_size"],
+                event_listeners=[db_monitor]
+            )
+            self.clients[name] = client
+            self.dbs[name] = client.get_database(
+                Config.DB_NAME,
+                read_preference=profile["read_preference"],
+                write_concern=profile["write_concern"]
+            )
+        
+        self.client = self.clients["primary"]
+        self.db = self.dbs["primary"]
         self.movies = self.db["movies"]
-        self.users = self.db["users"]
-        self.tokens = self.db["tokens"]
+        self.catalog = self.dbs["catalog"]["movies"]
+        self.users = self.dbs["user"]["users"]
+        self.tokens = self.dbs["token"]["tokens"]
+        self.stats = self.db["stats"]
+        self.movie_stats = self.db["movie_stats"]
+        self.query_stats = self.db["query_stats"]
+        self.counters = self.db["counters"]
+        self.leases = self.db["leases"]
+        self.broadcasts = self.db["broadcasts"]
+    
+    async def ensure_indexes(self):
+        # One document per code - concurrent /add upserts can't create a second copy.
+        # Duplicates are merged first, whatever indexes exist (no-op when there are none)
+        try:
+            await self.merge_duplicate_codes()
+            indexes = await self.movies.index_information()
+            if "code_1" in indexes and not indexes["code_1"].get("unique"):
+                await self.movies.drop_index("code_1")
+        except Exception as e:
+            logger.error(f"Index error (duplicate codes): {e}")
+        
+        # Each on its own - one failing must not leave the others missing
+        for collection, key, options in (
+            (self.movies, "code", {"unique": True}),
+            (self.movies, "mid", {"unique": True, "sparse": True}),
+            (self.movies, "old_mids", {"sparse": True}),
+            # Rollup fencing (save_stats_rollup) relies on this one
+            (self.stats, "hour", {"unique": True})
+        ):
+            try:
+                await collection.create_index(key, **options)
+            except Exception as e:
+                logger.error(f"Index error ({collection.name}.{key}): {e}")
+    
+    async def merge_duplicate_codes(self) -> int:
+        """
+        Fold movies sharing a code into the oldest copy (migration for the unique code index)
+        Qualities and parts are merged, other copies' ids are kept as old_mids for old links
+        """
+        cursor = self.movies.aggregate([
+            {"$group": {"_id": "$code", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}}
+        ])
+        merged = 0
+        async for group in cursor:
+            copies = await self.movies.find({"_id": {"$in": group["ids"]}}).sort("_id", 1).to_list(None)
+            keeper, others = copies[0], copies[1:]
+            
+            qualities = dict(keeper.get("qualities", {}))
+            parts_data = {k: dict(v) for k, v in keeper.get("parts_data", {}).items()}
+            parts = keeper.get("parts", 1)
+            old_mids = list(keeper.get("old_mids", []))
+            mid = keeper.get("mid")
+            for other in others:
+                for quality, file in other.get("qualities", {}).items():
+                    qualities.setdefault(quality, file)
+                for part_key, part in other.get("parts_data", {}).items():
+                    merged_part = parts_data.setdefault(part_key, {})
+                    for quality, file in part.get("qualities", {}).items():
+                        merged_part.setdefault("qualities", {}).setdefault(quality, file)
+                parts = max(parts, other.get("parts", 1))
+                if other.get("mid"):
+                    if mid is None:
+                        mid = other["mid"]
+                    else:
+                        old_mids.append(other["mid"])
+                old_mids.extend(other.get("old_mids", []))
+            
+            # Drop the copies first - their mids have to be free before the keeper takes one
+            await self.movies.delete_many({"_id": {"$in": [o["_id"] for o in others]}})
+            update = {"qualities": qualities, "parts_data": parts_data, "parts": parts}
+            if mid is not None:
+                update["mid"] = mid
+            if old_mids:
+                update["old_mids"] = old_mids
+            await self.movies.update_one({"_id": keeper["_id"]}, {"$set": update, "$inc": {"version": 1}})
+            merged += len(others)
+            logger.warning(f"Merged {len(others)} duplicate(s) of movie {group['_id']}")
+        return merged
     
     # Movie operations
+    @mongo_limiter.wrap
     async def add_movie(self, data: dict) -> bool:
         try:
             code = data["code"].lower().strip()
             data["code"] = code
-            await self.movies.update_one(
-                {"code": code},
-                {"$set": data},
-                upsert=True
-            )
+            data.pop("version", None)
+            # Catalog version - bumped on every write so rendered views get rebuilt
+            update = {"$set": data, "$inc": {"version": 1}}
+            try:
+                result = await self.movies.update_one({"code": code}, update, upsert=True)
+            except DuplicateKeyError:
+                # Concurrent insert of the same code won - update that one
+                result = await self.movies.update_one({"code": code}, update, upsert=True)
+            movie_cache.pop(code)
+            if result.upserted_id is not None:
+                await self.assign_movie_id(code)
             return True
         except Exception as e:
             logger.error(f"Add movie error: {e}")
             return False
     
-    async def get_movie(self, code: str) -> dict:
+    # Targeted updates - touch only the changed paths, atomic per document
+    @mongo_limiter.wrap
+    async def set_quality(self, code: str, title: str, quality: str, file: dict) -> dict:
+        """
+        Add or replace one quality, creating the movie if needed
+        Returns the movie as it was before (None if this call created it)
+        """
+        code = code.lower().strip()
+        before = await self._upsert_movie(
+            code,
+            {
+                "$set": {f"qualities.{quality}": file},
+                "$setOnInsert": {"title": title, "parts": 1},
+                "$inc": {"version": 1}
+            },
+            projection={"title": 1, "qualities": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            await self.assign_movie_id(code)
+        return before
+    
+    @mongo_limiter.wrap
+    async def set_part_quality(self, code: str, title: str, part: int, quality: str, file: dict) -> dict:
+        """
+        Add or replace one quality of one part, creating the movie if needed
+        Returns the updated parts count and that part's qualities
+        """
+        code = code.lower().strip()
+        part_key = f"parts_data.part_{part}.qualities"
+        after = await self._upsert_movie(
+            code,
+            {
+                "$set": {f"{part_key}.{quality}": file},
+                "$max": {"parts": part},
+                "$setOnInsert": {"title": title, "qualities": {}},
+                "$inc": {"version": 1}
+            },
+            projection={"parts": 1, "mid": 1, part_key: 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if "mid" not in after:
+            await self.assign_movie_id(code)
+        return after
+    
+    async def _upsert_movie(self, code: str, update: dict, **kwargs) -> dict:
+        """find_one_and_update upsert by code; a concurrent insert of the same code is retried as an update"""
+        try:
+            result = await self.movies.find_one_and_update({"code": code}, update, upsert=True, **kwargs)
+        except DuplicateKeyError:
+            # Lost the insert race on the unique code index - the movie exists now
+            result = await self.movies.find_one_and_update({"code": code}, update, upsert=True, **kwargs)
+        movie_cache.pop(code)
+        return result
+    
+    @mongo_limiter.wrap
+    async def unset_quality(self, code: str, quality: str) -> dict:
+        """
+        Remove one quality, deleting the movie when it was the last one
+        Returns the remaining qualities (None if the movie or quality wasn't there)
+        """
+        code = code.lower().strip()
+        after = await self.movies.find_one_and_update(
+            {"code": code, f"qualities.{quality}": {"$exists": True}},
+            {"$unset": {f"qualities.{quality}": ""}, "$inc": {"version": 1}},
+            projection={"qualities": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        movie_cache.pop(code)
+        if after is None:
+            return None
+        remaining = after.get("qualities", {})
+        if not remaining:
+            # Only if still empty - a concurrent /add wins over the delete
+            await self.movies.delete_one({"code": code, "qualities": {}})
+        return remaining
+    
+    async def get_movie(self, code, fresh: bool = False) -> dict:
+        """
+        Get movie by code, or by numeric movie id (from encoded payloads)
+        fresh=True reads from the primary (right after a write)
+        """
         if not code:
             return None
-        return await self.movies.find_one({"code": code.lower().strip()})
+        if not fresh:
+            key = movie_cache.get(("mid", code)) if isinstance(code, int) else code.lower().strip()
+            movie = movie_cache.get(key) if key else None
+            if movie:
+                return movie
+            movie = await movie_flight.do(key or code, self._find_movie, code, False)
+        else:
+            movie = await self._find_movie(code, True)
+        
+        if movie:
+            movie_cache.set(movie["code"], movie)
+            if movie.get("mid"):
+                movie_cache.set(("mid", movie["mid"]), movie["code"])
+            if isinstance(code, int):
+                # Also covers old_mids of merged duplicates
+                movie_cache.set(("mid", code), movie["code"])
+        return movie
+    
+    @mongo_limiter.wrap
+    async def _find_movie(self, code, fresh: bool) -> dict:
+        collection = self.movies if fresh else self.catalog
+        if isinstance(code, int):
+            # old_mids: ids of duplicates merged into this movie (old deep links)
+            return await collection.find_one({"$or": [{"mid": code}, {"old_mids": code}]})
+        return await collection.find_one({"code": code.lower().strip()})
+    
+    # Numeric movie ids (keep deep links and callback data short)
+    async def assign_movie_id(self, code: str) -> int:
+        counter = await self.counters.find_one_and_update(
+            {"_id": "movie_id"},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        mid = counter["seq"]
+        await self.movies.update_one({"code": code, "mid": {"$exists": False}}, {"$set": {"mid": mid}})
+        return mid
+    
+    async def backfill_movie_ids(self) -> int:
+        count = 0
+        async for movie in self.movies.find({"mid": {"$exists": False}}, {"code": 1}):
+            await self.assign_movie_id(movie["code"])
+            count += 1
+        return count
     
+    @mongo_limiter.wrap
     async def search_movies(self, query: str) -> list:
         if not query:
             return []
@@ -43,7 +328,7 @@ class Database:
         # Also search with underscores replaced by spaces
         search_query = query.replace("_", " ").replace(" ", "_")
         
-        cursor = self.movies.find({
+        cursor = self.catalog.find({
             "$or": [
                 {"code": {"$regex": query.replace(" ", "_"), "$options": "i"}},
                 {"title": {"$regex": query, "$options": "i"}},
@@ -52,15 +337,20 @@ class Database:
         }).limit(10)
         return await cursor.to_list(length=10)
     
+    @mongo_limiter.wrap
     async def delete_movie(self, code: str) -> bool:
-        result = await self.movies.delete_one({"code": code.lower().strip()})
+        code = code.lower().strip()
+        result = await self.movies.delete_one({"code": code})
+        movie_cache.pop(code)
         return result.deleted_count > 0
     
+    @mongo_limiter.wrap
     async def get_all_movies(self) -> list:
-        cursor = self.movies.find({})
+        cursor = self.catalog.find({})
         return await cursor.to_list(length=1000)
     
     # User operations
+    @mongo_limiter.wrap
     async def add_user(self, user_id: int, username: str = None):
         await self.users.update_one(
             {"user_id": user_id},
@@ -68,14 +358,62 @@ class Database:
             upsert=True
         )
     
+    @mongo_limiter.wrap
     async def get_user_count(self) -> int:
         return await self.users.count_documents({})
     
+    @mongo_limiter.wrap
     async def get_all_users(self) -> list:
         cursor = self.users.find({})
         return await cursor.to_list(length=100000)
     
+    async def get_users_after(self, last_id, limit: int) -> list:
+        """Next `limit` users in _id order after `last_id` (None = from the start)"""
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        cursor = self.users.find(query, {"user_id": 1}).sort("_id", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+    
+    # Broadcast queue - any replica queues, the leader sends (fenced with its lease token)
+    async def queue_broadcast(self, from_chat_id: int, message_id: int,
+                              status_chat_id: int, status_message_id: int):
+        await self.broadcasts.insert_one({
+            "from_chat_id": from_chat_id,
+            "message_id": message_id,
+            "status_chat_id": status_chat_id,
+            "status_message_id": status_message_id,
+            "state": "queued",
+            "fence": 0,
+            "last_user": None,
+            "sent": 0,
+            "failed": 0,
+            "created_at": time.time()
+        })
+    
+    async def claim_broadcast(self, fence: int) -> dict:
+        """Oldest unfinished broadcast - also takes over one a deposed leader was sending"""
+        return await self.broadcasts.find_one_and_update(
+            {"state": {"$ne": "done"}, "fence": {"$lte": fence}},
+            {"$set": {"state": "running", "fence": fence}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def save_broadcast_progress(self, broadcast_id, fence: int, last_user, sent: int,
+                                      failed: int, done: bool = False) -> bool:
+        """False once a newer leader has claimed the broadcast"""
+        result = await self.broadcasts.update_one(
+            {"_id": broadcast_id, "fence": fence},
+            {"$set": {
+                "last_user": last_user,
+                "sent": sent,
+                "failed": failed,
+                "state": "done" if done else "running"
+            }}
+        )
+        return result.matched_count == 1
+    
     # Token operations - Now includes quality
+    @mongo_limiter.wrap
     async def create_token(self, user_id: int, movie_code: str, part: int = 1, quality: str = "") -> str:
         token = secrets.token_urlsafe(16)
         await self.tokens.insert_one({
@@ -89,6 +427,7 @@ class Database:
         })
         return token
     
+    @mongo_limiter.wrap
     async def verify_token(self, token: str, user_id: int) -> dict:
         ten_min_ago = time.time() - 600
         return await self.tokens.find_one_and_update(
@@ -104,6 +443,80 @@ class Database:
     async def cleanup_tokens(self):
         one_hour_ago = time.time() - 3600
         await self.tokens.delete_many({"created_at": {"$lt": one_hour_ago}})
+    
+    # Stats operations
+    async def get_stats(self) -> dict:
+        users = await self.users.count_documents({})
+        movies = await self.catalog.count_documents({})
+        
+        cursor = self.catalog.aggregate([
+            {"$project": {"n": {"$size": {"$objectToArray": {"$ifNull": ["$qualities", {}]}}}}},
+            {"$group": {"_id": None, "files": {"$sum": "$n"}}}
+        ])
+        result = await cursor.to_list(length=1)
+        files = result[0]["files"] if result else 0
+        
+        return {"users": users, "movies": movies, "files": files}
+    
+    async def save_stats_rollup(self, hour: int, stats: dict, fence: int = 0) -> bool:
+        # Fenced: a rollup already written by a newer leader (higher token) wins
+        try:
+            await self.stats.update_one(
+                {"hour": hour, "fence": {"$not": {"$gt": fence}}},
+                {"$set": {"hour": hour, **stats, "fence": fence, "created_at": time.time()}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            logger.warning(f"Stats rollup for {hour} rejected: stale fencing token {fence}")
+            return False
+    
+    # Analytics operations (counters bucketed per hour)
+    async def inc_movie_stats(self, counters: dict):
+        if not counters:
+            return
+        ops = [
+            UpdateOne({"code": code, "hour": hour}, {"$inc": inc}, upsert=True)
+            for (code, hour), inc in counters.items()
+        ]
+        await self.movie_stats.bulk_write(ops, ordered=False)
+    
+    async def inc_query_stats(self, counters: dict):
+        if not counters:
+            return
+        ops = [
+            UpdateOne({"query": query, "hour": hour}, {"$inc": inc}, upsert=True)
+            for (query, hour), inc in counters.items()
+        ]
+        await self.query_stats.bulk_write(ops, ordered=False)
+    
+    async def top_movies(self, since: float, limit: int = 10) -> list:
+        cursor = self.movie_stats.aggregate([
+            {"$match": {"hour": {"$gte": since}}},
+            {"$group": {
+                "_id": "$code",
+                "hits": {"$sum": "$hits"},
+                "views": {"$sum": "$views"},
+                "selections": {"$sum": "$selections"},
+                "redeems": {"$sum": "$redeems"}
+            }},
+            {"$sort": {"redeems": -1, "views": -1, "hits": -1}},
+            {"$limit": limit}
+        ])
+        return await cursor.to_list(length=limit)
+    
+    async def top_missed_queries(self, since: float, limit: int = 10) -> list:
+        cursor = self.query_stats.aggregate([
+            {"$match": {"hour": {"$gte": since}, "misses": {"$gt": 0}}},
+            {"$group": {"_id": "$query", "misses": {"$sum": "$misses"}}},
+            {"$sort": {"misses": -1}},
+            {"$limit": limit}
+        ])
+        return await cursor.to_list(length=limit)
+    
+    async def close(self):
+        for client in self.clients.values():
+            client.close()
 
 
 # Global instance
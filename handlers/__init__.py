@@ -1,9 +1,13 @@
 from handlers.admin import register_admin_handlers
 from handlers.user import register_user_handlers
 from handlers.callbacks import register_callback_handlers
+from handlers.record import register_record_handlers
+from config import Config
 
 def register_all_handlers(app):
     """Register all handlers"""
     register_admin_handlers(app)
     register_user_handlers(app)
-    register_callback_handlers(app)
\ No newline at end of file
+    register_callback_handlers(app)
+    if Config.RECORD_UPDATES:
+        register_record_handlers(app)
\ No newline at end of file
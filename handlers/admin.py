@@ -2,23 +2,52 @@ if __name__ == "__main__":
     exit("Run bot.py instead!")
 
 import logging
+import time
 from pyrogram import Client, filters
 from pyrogram.enums import ParseMode
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
-from database import db
-from helpers import normalize_name, check_subscription
+from database import db, db_monitor
+from helpers import normalize_name, check_subscription, format_size, parse_quality
+from utils import render
+from utils.analytics import analytics
+from utils.breaker import breakers
+from utils.codec import QUALITY_OPTIONS
+from utils.leader import leader
+from utils.lifecycle import lifecycle
+from utils.limiter import limiters
+from utils.memory import memory, sizes
+from utils.offload import offload
+from utils.outbox import LANE_NAMES, outbox
+from utils.scheduler import scheduler
 
 logger = logging.getLogger(__name__)
 
-# Available quality options
-QUALITY_OPTIONS = ["360p", "480p", "720p", "1080p", "1440p", "2160p", "4K"]
+
+def format_movie_list(movies: list, limit: int = 50) -> str:
+    """/list text (runs on the offload pool)"""
+    text = "📽️ **All Movies:**\n\n"
+    
+    for i, m in enumerate(movies[:limit], 1):
+        qualities = m.get("qualities", {})
+        quality_list = ", ".join(qualities.keys()) if qualities else "No qualities"
+        parts = m.get("parts", 1)
+        parts_text = f" ({parts} parts)" if parts > 1 else ""
+        
+        text += f"{i}. **{m['title']}**{parts_text}\n"
+        text += f"   Code: `{m['code']}`\n"
+        text += f"   Qualities: {quality_list}\n\n"
+    
+    if len(movies) > limit:
+        text += f"\n_...and {len(movies) - limit} more_"
+    return text
 
 
 def register_admin_handlers(app: Client):
     
     # ============ /add COMMAND ============
     @app.on_message(filters.command("add") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
     async def add_movie(bot: Client, message: Message):
         """
         Add movie with quality
@@ -87,16 +116,14 @@ def register_admin_handlers(app: Client):
             return
         
         # Validate quality
-        quality = quality.upper() if quality.upper() == "4K" else quality.lower()
-        valid_qualities = [q.lower() for q in QUALITY_OPTIONS]
-        
-        if quality.lower() not in valid_qualities and quality != "4K":
+        if not parse_quality(quality):
             await message.reply_text(
                 f"❌ **Invalid quality:** `{quality}`\n\n"
                 f"**Available:** {', '.join(QUALITY_OPTIONS)}",
                 parse_mode=ParseMode.MARKDOWN
             )
             return
+        quality = parse_quality(quality)
         
         if not title:
             await message.reply_text("❌ Movie title cannot be empty!")
@@ -106,23 +133,17 @@ def register_admin_handlers(app: Client):
         code = normalize_name(title).replace(" ", "_")
         
         # Format file size
-        size_mb = round(file_size / (1024 * 1024), 2) if file_size else 0
-        size_text = f"{size_mb} MB" if size_mb < 1024 else f"{round(size_mb/1024, 2)} GB"
+        size_text = format_size(file_size)
         
-        # Check if movie exists
-        existing = await db.get_movie(code)
+        # One atomic upsert - creates the movie or adds this quality to it
+        existing = await db.set_quality(code, title, quality, {"file_id": file_id, "size": size_text, "bytes": file_size})
+        render.invalidate(code)
         
         if existing:
-            # Add quality to existing movie
-            qualities = existing.get("qualities", {})
-            qualities[quality] = {
-                "file_id": file_id,
-                "size": size_text
-            }
-            existing["qualities"] = qualities
-            await db.add_movie(existing)
-            
-            available = ", ".join(qualities.keys())
+            qualities = list(existing.get("qualities", {}))
+            if quality not in qualities:
+                qualities.append(quality)
+            available = ", ".join(qualities)
             await message.reply_text(
                 f"✅ **Quality Added to Existing Movie!**\n\n"
                 f"📽️ **Title:** {existing['title']}\n"
@@ -132,20 +153,6 @@ def register_admin_handlers(app: Client):
                 parse_mode=ParseMode.MARKDOWN
             )
         else:
-            # Create new movie
-            movie_data = {
-                "code": code,
-                "title": title,
-                "qualities": {
-                    quality: {
-                        "file_id": file_id,
-                        "size": size_text
-                    }
-                },
-                "parts": 1
-            }
-            await db.add_movie(movie_data)
-            
             await message.reply_text(
                 f"✅ **Movie Added!**\n\n"
                 f"📽️ **Title:** {title}\n"
@@ -159,6 +166,7 @@ def register_admin_handlers(app: Client):
     
     # ============ /addpart COMMAND ============
     @app.on_message(filters.command("addpart") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
     async def add_part(bot: Client, message: Message):
         """
         Add part to existing movie with quality
@@ -216,56 +224,27 @@ def register_admin_handlers(app: Client):
             return
         
         quality = parts[2].strip().lower()
-        quality = quality.upper() if quality.upper() == "4K" else quality.lower()
         
         # Validate quality
-        valid_qualities = [q.lower() for q in QUALITY_OPTIONS]
-        if quality.lower() not in valid_qualities and quality != "4K":
+        if not parse_quality(quality):
             await message.reply_text(
                 f"❌ **Invalid quality:** `{quality}`\n\n"
                 f"**Available:** {', '.join(QUALITY_OPTIONS)}",
                 parse_mode=ParseMode.MARKDOWN
             )
             return
+        quality = parse_quality(quality)
         
         code = normalize_name(title).replace(" ", "_")
         
         # Format file size
-        size_mb = round(file_size / (1024 * 1024), 2) if file_size else 0
-        size_text = f"{size_mb} MB" if size_mb < 1024 else f"{round(size_mb/1024, 2)} GB"
-        
-        # Get or create movie
-        movie = await db.get_movie(code)
-        
-        if not movie:
-            movie = {
-                "code": code,
-                "title": title,
-                "qualities": {},
-                "parts": part_num,
-                "parts_data": {}
-            }
-        
-        # Initialize parts_data if not exists
-        if "parts_data" not in movie:
-            movie["parts_data"] = {}
-        
-        # Add part with quality
-        part_key = f"part_{part_num}"
-        if part_key not in movie["parts_data"]:
-            movie["parts_data"][part_key] = {"qualities": {}}
+        size_text = format_size(file_size)
         
-        movie["parts_data"][part_key]["qualities"][quality] = {
-            "file_id": file_id,
-            "size": size_text
-        }
+        # One atomic upsert - sets this part's quality and raises the parts count
+        movie = await db.set_part_quality(code, title, part_num, quality, {"file_id": file_id, "size": size_text, "bytes": file_size})
+        render.invalidate(code)
         
-        # Update parts count
-        movie["parts"] = max(movie.get("parts", 1), part_num)
-        
-        await db.add_movie(movie)
-        
-        available_qualities = ", ".join(movie["parts_data"][part_key]["qualities"].keys())
+        available_qualities = ", ".join(movie["parts_data"][f"part_{part_num}"]["qualities"].keys())
         
         await message.reply_text(
             f"✅ **Part {part_num} Added!**\n\n"
@@ -280,6 +259,7 @@ def register_admin_handlers(app: Client):
     
     # ============ /delete COMMAND ============
     @app.on_message(filters.command("delete") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
     async def delete_movie(bot: Client, message: Message):
         """Delete movie or specific quality"""
         
@@ -304,38 +284,35 @@ def register_admin_handlers(app: Client):
             parts = text.split("|")
             title = parts[0].strip()
             quality = parts[1].strip().lower()
-            quality = quality.upper() if quality.upper() == "4K" else quality
+            quality = parse_quality(quality) or quality
             
             code = normalize_name(title).replace(" ", "_")
-            movie = await db.get_movie(code)
+            qualities = await db.unset_quality(code, quality)
             
-            if not movie:
-                await message.reply_text(f"❌ Movie `{title}` not found!", parse_mode=ParseMode.MARKDOWN)
+            if qualities is None:
+                # Nothing removed - tell which part was missing
+                if not await db.get_movie(code, fresh=True):
+                    await message.reply_text(f"❌ Movie `{title}` not found!", parse_mode=ParseMode.MARKDOWN)
+                else:
+                    await message.reply_text(f"❌ Quality `{quality}` not found!", parse_mode=ParseMode.MARKDOWN)
                 return
             
-            qualities = movie.get("qualities", {})
-            if quality in qualities:
-                del qualities[quality]
-                movie["qualities"] = qualities
-                
-                if not qualities:
-                    # No qualities left, delete movie
-                    await db.delete_movie(code)
-                    await message.reply_text(f"✅ `{title}` deleted (no qualities left)!", parse_mode=ParseMode.MARKDOWN)
-                else:
-                    await db.add_movie(movie)
-                    await message.reply_text(
-                        f"✅ **Quality `{quality}` removed from `{title}`!**\n\n"
-                        f"Remaining: {', '.join(qualities.keys())}",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
+            render.invalidate(code)
+            if not qualities:
+                # No qualities left, movie deleted
+                await message.reply_text(f"✅ `{title}` deleted (no qualities left)!", parse_mode=ParseMode.MARKDOWN)
             else:
-                await message.reply_text(f"❌ Quality `{quality}` not found!", parse_mode=ParseMode.MARKDOWN)
+                await message.reply_text(
+                    f"✅ **Quality `{quality}` removed from `{title}`!**\n\n"
+                    f"Remaining: {', '.join(qualities.keys())}",
+                    parse_mode=ParseMode.MARKDOWN
+                )
         else:
             # Delete entire movie
             code = normalize_name(text).replace(" ", "_")
             
             if await db.delete_movie(code):
+                render.invalidate(code)
                 await message.reply_text(f"✅ `{text}` deleted!", parse_mode=ParseMode.MARKDOWN)
             else:
                 await message.reply_text(f"❌ `{text}` not found!", parse_mode=ParseMode.MARKDOWN)
@@ -343,6 +320,7 @@ def register_admin_handlers(app: Client):
     
     # ============ /list COMMAND ============
     @app.on_message(filters.command("list") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
     async def list_movies(bot: Client, message: Message):
         movies = await db.get_all_movies()
         
@@ -350,67 +328,257 @@ def register_admin_handlers(app: Client):
             await message.reply_text("📭 No movies yet!")
             return
         
-        text = "📽️ **All Movies:**\n\n"
-        
-        for i, m in enumerate(movies[:50], 1):
-            qualities = m.get("qualities", {})
-            quality_list = ", ".join(qualities.keys()) if qualities else "No qualities"
-            parts = m.get("parts", 1)
-            parts_text = f" ({parts} parts)" if parts > 1 else ""
-            
-            text += f"{i}. **{m['title']}**{parts_text}\n"
-            text += f"   Code: `{m['code']}`\n"
-            text += f"   Qualities: {quality_list}\n\n"
-        
-        if len(movies) > 50:
-            text += f"\n_...and {len(movies) - 50} more_"
-        
+        # Built off the event loop - user updates keep flowing meanwhile
+        text = await offload.run(format_movie_list, movies)
         await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
     
     
     # ============ /stats COMMAND ============
     @app.on_message(filters.command("stats") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
     async def stats(bot: Client, message: Message):
-        users = await db.get_user_count()
-        movies = await db.get_all_movies()
-        
-        total_qualities = 0
-        for m in movies:
-            total_qualities += len(m.get("qualities", {}))
+        # Counted by Mongo - no catalog scan in Python
+        stats = await db.get_stats()
         
         await message.reply_text(
             f"📊 **Bot Statistics**\n\n"
-            f"👥 Users: {users}\n"
-            f"🎬 Movies: {len(movies)}\n"
-            f"🎞️ Total Files: {total_qualities}",
+            f"👥 Users: {stats['users']}\n"
+            f"🎬 Movies: {stats['movies']}\n"
+            f"🎞️ Total Files: {stats['files']}",
             parse_mode=ParseMode.MARKDOWN
         )
     
     
     # ============ /broadcast COMMAND ============
     @app.on_message(filters.command("broadcast") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
     async def broadcast(bot: Client, message: Message):
         if not message.reply_to_message:
             await message.reply_text("❌ Reply to a message to broadcast!")
             return
         
-        users = await db.get_all_users()
-        sent, failed = 0, 0
+        # Any replica may get the command - queue it, the leader's broadcasts job sends it
+        status = await message.reply_text("📢 Broadcast queued, the leader replica sends it shortly...")
+        await db.queue_broadcast(
+            message.chat.id, message.reply_to_message.id, status.chat.id, status.id
+        )
+    
+    
+    # ============ /top COMMAND ============
+    @app.on_message(filters.command("top") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
+    async def top(bot: Client, message: Message):
+        """
+        Show top movies and top missed searches
+        Usage: /top [hours]
+        Example: /top 168
+        """
+        args = message.text.split()[1:]
+        hours = int(args[0]) if args and args[0].isdigit() else 24
+        since = int((time.time() - hours * 3600) // 3600) * 3600
+        
+        # Include events still sitting in the buffer
+        await analytics.flush()
+        
+        movies = await db.top_movies(since)
+        queries = await db.top_missed_queries(since)
+        
+        text = f"🏆 **Top Movies** (last {hours}h)\n\n"
+        
+        if movies:
+            for i, m in enumerate(movies, 1):
+                text += f"{i}. `{m['_id']}`\n"
+                text += f"   📥 {m['redeems']} | 👁️ {m['views']} | 🎞️ {m['selections']} | 🔍 {m['hits']}\n"
+        else:
+            text += "_No data yet_\n"
+        
+        text += "\n❓ **Top Missed Searches**\n\n"
+        
+        if queries:
+            for i, q in enumerate(queries, 1):
+                text += f"{i}. `{q['_id']}` - {q['misses']}x\n"
+        else:
+            text += "_No misses_\n"
+        
+        await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    
+    # ============ /jobs COMMAND ============
+    @app.on_message(filters.command("jobs") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
+    async def jobs(bot: Client, message: Message):
+        """
+        Show background jobs, or run one now
+        Usage: /jobs
+        Usage: /jobs run token_cleanup
+        """
+        args = message.text.split()[1:]
+        
+        if len(args) == 2 and args[0] == "run":
+            name = args[1]
+            if name not in scheduler.jobs:
+                await message.reply_text(f"❌ Unknown job `{name}`", parse_mode=ParseMode.MARKDOWN)
+                return
+            if await scheduler.run_now(name):
+                await message.reply_text(f"✅ Job `{name}` finished", parse_mode=ParseMode.MARKDOWN)
+            else:
+                await message.reply_text(f"⏳ Job `{name}` is already running", parse_mode=ParseMode.MARKDOWN)
+            return
+        
+        jobs_info = scheduler.snapshot()
+        if not jobs_info:
+            await message.reply_text("📭 No jobs registered!")
+            return
         
-        status = await message.reply_text("📢 Broadcasting...")
+        now = time.time()
+        role = "👑 leader" if leader.is_leader else f"standby (leader: `{leader.holder}`)"
+        text = f"⏱️ **Background Jobs:**\n\nThis replica: {role}\n\n"
         
-        for user in users:
-            try:
-                await message.reply_to_message.copy(user["user_id"])
-                sent += 1
-            except:
-                failed += 1
+        for j in jobs_info:
+            last = f"{int(now - j['last_run'])}s ago" if j["last_run"] else "never"
+            duration = f"{j['last_duration']:.2f}s" if j["last_duration"] is not None else "-"
+            next_in = f"{max(int(j['next_run'] - now), 0)}s" if j["next_run"] else "-"
+            state = "🔄 running" if j["running"] else "💤 idle"
+            
+            scope = " 👑" if j["leader_only"] else ""
+            text += f"**{j['name']}** ({j['schedule']}){scope} {state}\n"
+            text += f"   Last: {last} in {duration} | Next: {next_in}\n"
+            text += f"   Runs: {j['runs']} | Failed: {j['failures']} | Skipped: {j['skipped']}\n"
+            if j["last_error"]:
+                text += f"   Error: `{j['last_error'][:100]}`\n"
+            text += "\n"
         
-        await status.edit_text(f"📢 **Done!**\n\n✅ Sent: {sent}\n❌ Failed: {failed}", parse_mode=ParseMode.MARKDOWN)
+        await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    
+    # ============ /limits COMMAND ============
+    @app.on_message(filters.command("limits") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
+    async def limits(bot: Client, message: Message):
+        """Show adaptive concurrency limits per dependency"""
+        text = "🚦 **Concurrency Limits:**\n\n"
+        
+        for name, limiter in limiters.items():
+            s = limiter.snapshot()
+            text += f"**{name}**: {s['inflight']}/{s['limit']} in flight, {s['queued']} queued\n"
+            text += f"   ✅ {s['completed']} | ❌ {s['failed']} | 🚫 {s['rejected']} rejected\n\n"
+        
+        s = outbox.snapshot()
+        queued = ", ".join(f"{name} {s['queued'][name]}" for name in LANE_NAMES)
+        text += f"📤 **outbox**: {queued} queued\n"
+        text += f"   ✅ {s['sent']} | ❌ {s['failed']} | ⏳ {s['flood_waits']} flood waits\n"
+        
+        await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    
+    # ============ /breakers COMMAND ============
+    @app.on_message(filters.command("breakers") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
+    async def breakers_cmd(bot: Client, message: Message):
+        """Show circuit breaker state per dependency"""
+        icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+        text = "🔌 **Circuit Breakers:**\n\n"
+        
+        for name, breaker in breakers.items():
+            s = breaker.snapshot()
+            retry = f", retry in {s['retry_in']}s" if s["state"] == "open" else ""
+            text += f"{icons[s['state']]} **{name}**: {s['state']}{retry}\n"
+            text += f"   Window: {s['failures']}/{s['calls']} failed | Trips: {s['trips']} | Fast-failed: {s['rejected']}\n\n"
+        
+        await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    
+    # ============ /dbstats COMMAND ============
+    @app.on_message(filters.command("dbstats") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
+    async def dbstats(bot: Client, message: Message):
+        """Show Mongo command latencies, slow commands and explained plans"""
+        # Explain whatever is still queued so the plans below are current
+        await db_monitor.run_explains(db.client)
+        
+        def busiest(group: dict) -> list:
+            return sorted(group.items(), key=lambda item: item[1]["count"], reverse=True)[:8]
+        
+        text = "🗄️ **Mongo Commands:**\n\n"
+        for name, s in busiest(db_monitor.by_command()):
+            text += f"`{name}`: {s['count']} | p50 {s['p50_ms']}ms | p95 {s['p95_ms']}ms | max {s['max_ms']}ms\n"
+        
+        text += "\n📁 **Collections:**\n\n"
+        for name, s in busiest(db_monitor.by_collection()):
+            text += f"`{name}`: {s['count']} | p95 {s['p95_ms']}ms | ❌ {s['failed']}\n"
+        
+        slow = list(db_monitor.slow)[-5:]
+        text += f"\n🐢 **Slow (>{db_monitor.slow_ms:g}ms):**\n\n"
+        for s in reversed(slow):
+            text += f"`{s['collection']}.{s['command']}` {s['ms']}ms `{s['shape']}`\n"
+        if not slow:
+            text += "_None_\n"
+        
+        explains = list(db_monitor.explains)[-5:]
+        if explains:
+            text += "\n🔬 **Explained:**\n\n"
+            for e in reversed(explains):
+                flag = "🔴 COLLSCAN" if e["collscan"] else "🟢"
+                text += f"{flag} `{e['collection']}.{e['command']}` {e['ms']}ms\n   `{e['plan']}`\n"
+        
+        await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    
+    # ============ /memory COMMAND ============
+    @app.on_message(filters.command("memory") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
+    async def memory_cmd(bot: Client, message: Message):
+        """
+        Show memory usage and top allocations
+        Usage: /memory [top|diff|reset|start|stop]
+        """
+        args = message.text.split()[1:]
+        mode = args[0].lower() if args else "top"
+        
+        if mode == "start":
+            await offload.run(memory.trace)
+            await message.reply_text("✅ Allocation tracing started, baseline taken!")
+            return
+        
+        if mode == "stop":
+            await offload.run(memory.stop)
+            await message.reply_text("✅ Allocation tracing stopped!")
+            return
+        
+        if mode == "reset":
+            await offload.run(memory.reset_baseline)
+            await message.reply_text("✅ Memory baseline reset!")
+            return
+        
+        gauges = memory.gauges()
+        text = (
+            f"🧠 **Memory:**\n\n"
+            f"RSS: {gauges['rss_mb']}MB ({gauges['rss_growth_mb']:+}MB since baseline)\n"
+            f"Traced: {gauges['traced_mb']}MB (peak {gauges['traced_peak_mb']}MB)\n"
+            f"GC objects: {gauges['gc_objects']}\n\n"
+            f"📦 **Sizes:**\n"
+        )
+        for name, value in gauges.items():
+            if name.startswith("cache_") or name in sizes:
+                text += f"`{name}`: {value}\n"
+        
+        if not memory.tracing:
+            text += "\n_tracemalloc is off_ (`/memory start` to trace, `/memory stop` when done)"
+        elif mode == "diff":
+            text += "\n📈 **Growth since baseline:**\n\n"
+            for d in await offload.run(memory.diff, 10):
+                text += f"`{d['where']}`\n   {d['diff_kb']:+}KB ({d['count_diff']:+} blocks)\n"
+        else:
+            text += "\n🔝 **Top allocations:**\n\n"
+            for t in await offload.run(memory.top, 10):
+                text += f"`{t['where']}`\n   {t['size_kb']}KB ({t['count']} blocks)\n"
+        
+        await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
     
     
     # ============ /checksub COMMAND ============
     @app.on_message(filters.command("checksub") & filters.private & filters.user(Config.ADMIN_ID))
+    @lifecycle.track
     async def checksub(bot: Client, message: Message):
         user_id = message.from_user.id
         is_sub = await check_subscription(bot, user_id)
@@ -8,36 +8,47 @@ from pyrogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardBu
 from config import Config
 from database import db
 from helpers import check_subscription, encode_payload
+from utils.analytics import analytics
+from utils.codec import (
+    KIND_MOVIE,
+    KIND_PART,
+    KIND_QUALITY,
+    KIND_BACKQ,
+    decode_callback,
+    encode_callback,
+    movie_ref
+)
+from utils.lifecycle import lifecycle
+from utils.render import get_qualities, render_parts, render_qualities
 
 logger = logging.getLogger(__name__)
 
 
+def payload_kind(kind: int):
+    """Filter callback queries by decoded payload kind"""
+    async def func(_, __, query: CallbackQuery):
+        payload = decode_callback(query.data)
+        return payload is not None and payload.kind == kind
+    return filters.create(func)
+
+
 def register_callback_handlers(app: Client):
     
     # ============ MOVIE SELECTION ============
-    @app.on_callback_query(filters.regex(r"^movie:"))
+    @app.on_callback_query(payload_kind(KIND_MOVIE))
+    @lifecycle.track
     async def movie_cb(bot: Client, query: CallbackQuery):
-        code = query.data.split(":")[1]
-        movie = await db.get_movie(code)
+        movie = await db.get_movie(decode_callback(query.data).ref)
         
         if not movie:
             await query.answer("❌ Not found!", show_alert=True)
             return
         
+        analytics.track("view", movie["code"])
+        
         if movie.get("parts", 1) > 1:
-            buttons = []
-            for i in range(1, movie["parts"] + 1):
-                buttons.append(InlineKeyboardButton(f"📦 Part {i}", callback_data=f"part:{code}:{i}"))
-            
-            keyboard = [buttons[i:i+3] for i in range(0, len(buttons), 3)]
-            
-            await query.message.edit_text(
-                f"🎬 **{movie['title']}**\n\n"
-                f"This movie has {movie['parts']} parts.\n"
-                f"Select one:",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode=ParseMode.MARKDOWN
-            )
+            text, keyboard = render_parts(movie)
+            await query.message.edit_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
         else:
             await show_quality_buttons(query, movie, 1)
         
@@ -45,12 +56,13 @@ def register_callback_handlers(app: Client):
     
     
     # ============ PART SELECTION ============
-    @app.on_callback_query(filters.regex(r"^part:"))
+    @app.on_callback_query(payload_kind(KIND_PART))
+    @lifecycle.track
     async def part_cb(bot: Client, query: CallbackQuery):
-        _, code, part = query.data.split(":")
-        part = int(part)
+        payload = decode_callback(query.data)
+        part = payload.part
         
-        movie = await db.get_movie(code)
+        movie = await db.get_movie(payload.ref)
         if not movie:
             await query.answer("❌ Not found!", show_alert=True)
             return
@@ -60,43 +72,41 @@ def register_callback_handlers(app: Client):
     
     
     # ============ QUALITY SELECTION ============
-    @app.on_callback_query(filters.regex(r"^quality:"))
+    @app.on_callback_query(payload_kind(KIND_QUALITY))
+    @lifecycle.track
     async def quality_cb(bot: Client, query: CallbackQuery):
         user_id = query.from_user.id
-        parts = query.data.split(":")
-        code = parts[1]
-        part = int(parts[2])
-        quality = parts[3]
+        payload = decode_callback(query.data)
+        part = payload.part
+        quality = payload.quality
         
         # Check subscription
         if not await check_subscription(bot, user_id):
             await query.answer("❌ Join channel first!", show_alert=True)
             return
         
-        movie = await db.get_movie(code)
+        movie = await db.get_movie(payload.ref)
         if not movie:
             await query.answer("❌ Not found!", show_alert=True)
             return
         
+        analytics.track("quality", movie["code"], quality=quality)
+        
         # Create token and generate link
-        token = await db.create_token(user_id, code, part, quality)
-        payload = encode_payload(code, part, quality, token)
-        bot_link = f"https://t.me/{bot.me.username}?start={payload}"
+        token = await db.create_token(user_id, movie["code"], part, quality)
+        link_payload = encode_payload(movie_ref(movie), part, quality, token)
+        bot_link = f"https://t.me/{bot.me.username}?start={link_payload}"
         
         # Get file size
-        if part > 1 and "parts_data" in movie:
-            part_key = f"part_{part}"
-            size = movie["parts_data"].get(part_key, {}).get("qualities", {}).get(quality, {}).get("size", "")
-        else:
-            size = movie.get("qualities", {}).get(quality, {}).get("size", "")
+        size = get_qualities(movie, part).get(quality, {}).get("size", "")
         
         size_text = f"\n📁 Size: {size}" if size else ""
         
         # Back button
         if movie.get("parts", 1) > 1:
-            back_btn = InlineKeyboardButton("◀️ Back to Parts", callback_data=f"movie:{code}")
+            back_btn = InlineKeyboardButton("◀️ Back to Parts", callback_data=encode_callback(KIND_MOVIE, movie_ref(movie)))
         else:
-            back_btn = InlineKeyboardButton("◀️ Back", callback_data=f"backq:{code}:{part}")
+            back_btn = InlineKeyboardButton("◀️ Back", callback_data=encode_callback(KIND_BACKQ, movie_ref(movie), part))
         
         await query.message.edit_text(
             f"✅ **{movie['title']}**\n\n"
@@ -114,12 +124,13 @@ def register_callback_handlers(app: Client):
     
     
     # ============ BACK TO QUALITY SELECTION ============
-    @app.on_callback_query(filters.regex(r"^backq:"))
+    @app.on_callback_query(payload_kind(KIND_BACKQ))
+    @lifecycle.track
     async def back_quality_cb(bot: Client, query: CallbackQuery):
-        _, code, part = query.data.split(":")
-        part = int(part)
+        payload = decode_callback(query.data)
+        part = payload.part
         
-        movie = await db.get_movie(code)
+        movie = await db.get_movie(payload.ref)
         if not movie:
             await query.answer("❌ Not found!", show_alert=True)
             return
@@ -132,35 +143,14 @@ def register_callback_handlers(app: Client):
 
 async def show_quality_buttons(query: CallbackQuery, movie: dict, part: int):
     """Show quality selection buttons"""
+    rendered = render_qualities(movie, part)
     
-    if part > 1 and "parts_data" in movie:
-        part_key = f"part_{part}"
-        qualities = movie["parts_data"].get(part_key, {}).get("qualities", {})
-    else:
-        qualities = movie.get("qualities", {})
-    
-    if not qualities:
+    if not rendered:
         await query.message.edit_text(
             f"❌ No files available for **{movie['title']}** Part {part}",
             parse_mode=ParseMode.MARKDOWN
         )
         return
     
-    buttons = []
-    for quality, data in qualities.items():
-        size = data.get("size", "")
-        btn_text = f"🎞️ {quality}" + (f" ({size})" if size else "")
-        buttons.append([
-            InlineKeyboardButton(btn_text, callback_data=f"quality:{movie['code']}:{part}:{quality}")
-        ])
-    
-    if movie.get("parts", 1) > 1:
-        buttons.append([InlineKeyboardButton("◀️ Back to Parts", callback_data=f"movie:{movie['code']}")])
-    
-    await query.message.edit_text(
-        f"🎬 **{movie['title']}**\n\n"
-        f"📦 Part: {part}\n\n"
-        f"Select quality:",
-        reply_markup=InlineKeyboardMarkup(buttons),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    text, keyboard = rendered
+    await query.message.edit_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
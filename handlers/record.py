@@ -0,0 +1,26 @@
+if __name__ == "__main__":
+    exit("Run bot.py instead!")
+
+from pyrogram import Client, filters
+from pyrogram.types import Message, CallbackQuery
+from config import Config
+from utils.lifecycle import lifecycle
+from utils.recorder import recorder
+
+
+def register_record_handlers(app: Client):
+    
+    # Group -1 runs before the real handlers and doesn't stop propagation
+    not_admin = ~filters.user(Config.ADMIN_ID)
+    
+    # ============ RECORD MESSAGES ============
+    @app.on_message(filters.text & filters.private & not_admin, group=-1)
+    @lifecycle.track(notify=False)
+    async def record_message(bot: Client, message: Message):
+        recorder.record("m", message.from_user.id, message.text)
+    
+    # ============ RECORD CALLBACKS ============
+    @app.on_callback_query(not_admin, group=-1)
+    @lifecycle.track(notify=False)
+    async def record_callback(bot: Client, query: CallbackQuery):
+        recorder.record("c", query.from_user.id, query.data)
@@ -10,11 +10,18 @@ from database import db
 from helpers import (
     check_subscription,
     get_movie_info,
+    is_movie_info_cached,
     encode_payload,
     decode_payload,
     normalize_name
 )
+from utils.analytics import analytics
+from utils.codec import KIND_MOVIE, encode_callback, movie_ref
+from utils.deadline import Budget
+from utils.lifecycle import lifecycle
 from utils.monetize import create_download_link, is_monetization_enabled
+from utils.render import get_qualities, render_card, render_parts, render_qualities
+from utils.stream import streamer
 
 logger = logging.getLogger(__name__)
 
@@ -23,138 +30,145 @@ def register_user_handlers(app: Client):
     
     # ============ /start COMMAND ============
     @app.on_message(filters.command("start") & filters.private)
+    @lifecycle.track
     async def start_cmd(bot: Client, message: Message):
         user_id = message.from_user.id
         username = message.from_user.username
         text = message.text.strip()
         
-        logger.info(f"START from {user_id}: {text}")
+        # The payload carries the download token - log only that there was one
+        logger.info("start", extra={"fields": {"user": user_id, "payload": len(text.split(maxsplit=1)) > 1}})
         
-        await db.add_user(user_id, username)
+        # Recording the user never holds up the reply, and is never cancelled
+        lifecycle.spawn(db.add_user(user_id, username))
         
-        parts = text.split(maxsplit=1)
-        
-        # No payload - welcome
-        if len(parts) == 1:
-            await send_welcome(message)
-            return
-        
-        payload = parts[1].strip()
-        
-        if not payload:
-            await send_welcome(message)
-            return
-        
-        # Block controller payloads
-        blocked = ["connect", "controller", "setup", "config", "admin", "panel", "settings"]
-        if any(b in payload.lower() for b in blocked):
-            if user_id != Config.ADMIN_ID:
+        async with Budget("start", Config.UPDATE_BUDGET) as budget:
+            parts = text.split(maxsplit=1)
+            
+            # No payload - welcome
+            if len(parts) == 1:
                 await send_welcome(message)
                 return
-        
-        # Decode payload
-        movie_code, part, quality, token = decode_payload(payload)
-        
-        logger.info(f"Decoded: code={movie_code}, part={part}, quality={quality}, token={token[:10] if token else 'None'}...")
-        
-        if not movie_code:
-            await send_welcome(message)
-            return
-        
-        # Check subscription
-        if not await check_subscription(bot, user_id):
-            await message.reply_text(
-                "🔒 **Join to Continue**\n\n"
-                "You must join our channel first.",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("✅ Join Channel", url=Config.BACKUP_CHANNEL_LINK)],
-                    [InlineKeyboardButton("🔄 Try Again", url=f"https://t.me/{bot.me.username}?start={payload}")]
-                ]),
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return
-        
-        # Has token - send file via ad page
-        if token:
-            token_data = await db.verify_token(token, user_id)
             
-            if token_data:
-                movie = await db.get_movie(token_data["movie_code"])
+            payload = parts[1].strip()
+            
+            if not payload:
+                await send_welcome(message)
+                return
+            
+            # Block controller payloads
+            blocked = ["connect", "controller", "setup", "config", "admin", "panel", "settings"]
+            if any(b in payload.lower() for b in blocked):
+                if user_id != Config.ADMIN_ID:
+                    await send_welcome(message)
+                    return
+            
+            # Decode payload
+            ref, part, quality, token = decode_payload(payload)
+            
+            logger.info("decoded", extra={"fields": {"movie": ref, "part": part, "quality": quality, "token": bool(token)}})
+            
+            if not ref:
+                await send_welcome(message)
+                return
+            
+            # Independent lookups run together (the movie one speculatively)
+            budget.run("subscription", check_subscription(bot, user_id))
+            budget.run("movie", db.get_movie(ref))
+            
+            # Check subscription
+            if not await budget.get("subscription"):
+                await message.reply_text(
+                    "🔒 **Join to Continue**\n\n"
+                    "You must join our channel first.",
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("✅ Join Channel", url=Config.BACKUP_CHANNEL_LINK)],
+                        [InlineKeyboardButton("🔄 Try Again", url=f"https://t.me/{bot.me.username}?start={payload}")]
+                    ]),
+                    parse_mode=ParseMode.MARKDOWN
+                )
+                return
+            
+            # Has token - send file via ad page
+            if token:
+                # Redeemed only after the subscription check - it marks the token used
+                token_data = await budget.get("token", db.verify_token(token, user_id))
                 
-                if movie:
-                    t_part = token_data.get("part", 1)
-                    t_quality = token_data.get("quality", "")
-                    
-                    # Get file_id and size based on part and quality
-                    file_id = None
-                    file_size = ""
+                if token_data:
+                    movie = await budget.get("movie")
+                    if not movie or movie["code"] != token_data["movie_code"]:
+                        movie = await budget.get("token_movie", db.get_movie(token_data["movie_code"]))
                     
-                    if t_part > 1 and "parts_data" in movie:
-                        part_key = f"part_{t_part}"
-                        if part_key in movie["parts_data"]:
-                            qualities = movie["parts_data"][part_key].get("qualities", {})
+                    if movie:
+                        t_part = token_data.get("part", 1)
+                        t_quality = token_data.get("quality", "")
+                        
+                        # Get file_id and size based on part and quality
+                        file_id = None
+                        file_size = ""
+                        file_bytes = 0
+                        
+                        if t_part > 1 and "parts_data" in movie:
+                            part_key = f"part_{t_part}"
+                            if part_key in movie["parts_data"]:
+                                qualities = movie["parts_data"][part_key].get("qualities", {})
+                                if t_quality in qualities:
+                                    file_id = qualities[t_quality].get("file_id")
+                                    file_size = qualities[t_quality].get("size", "")
+                                    file_bytes = qualities[t_quality].get("bytes", 0)
+                        else:
+                            qualities = movie.get("qualities", {})
                             if t_quality in qualities:
                                 file_id = qualities[t_quality].get("file_id")
                                 file_size = qualities[t_quality].get("size", "")
-                    else:
-                        qualities = movie.get("qualities", {})
-                        if t_quality in qualities:
-                            file_id = qualities[t_quality].get("file_id")
-                            file_size = qualities[t_quality].get("size", "")
+                                file_bytes = qualities[t_quality].get("bytes", 0)
+                        
+                        if file_id:
+                            analytics.track("redeem", movie["code"], quality=t_quality)
+                            await send_file_with_ads(
+                                bot, message, movie, file_id,
+                                t_part, t_quality, file_size, file_bytes
+                            )
+                            return
                     
-                    if file_id:
-                        await send_file_with_ads(
-                            bot, message, movie, file_id,
-                            t_part, t_quality, file_size
-                        )
-                        return
+                    await message.reply_text("❌ File not available. Try searching again.")
+                    return
                 
-                await message.reply_text("❌ File not available. Try searching again.")
+                await message.reply_text("⏰ Link expired! Please search again.")
                 return
             
-            await message.reply_text("⏰ Link expired! Please search again.")
-            return
-        
-        # No token - show movie
-        movie = await db.get_movie(movie_code)
-        
-        if not movie:
-            await send_welcome(message)
-            return
-        
-        # Check if multi-part
-        if movie.get("parts", 1) > 1:
-            buttons = []
-            for i in range(1, movie["parts"] + 1):
-                buttons.append(InlineKeyboardButton(f"📦 Part {i}", callback_data=f"part:{movie_code}:{i}"))
+            # No token - show movie
+            movie = await budget.get("movie")
             
-            keyboard = [buttons[i:i+3] for i in range(0, len(buttons), 3)]
+            if not movie:
+                await send_welcome(message)
+                return
             
-            await message.reply_text(
-                f"🎬 **{movie['title']}**\n\n"
-                f"This movie has {movie['parts']} parts.\n"
-                f"Select one:",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return
-        
-        # Single part - show quality selection
-        qualities = movie.get("qualities", {})
-        
-        if not qualities:
-            await message.reply_text("❌ No files available for this movie.")
-            return
-        
-        if len(qualities) == 1:
-            quality = list(qualities.keys())[0]
-            await generate_download_link(bot, message, movie, 1, quality)
-        else:
-            await show_quality_selection(message, movie, 1)
+            analytics.track("view", movie["code"])
+            
+            # Check if multi-part
+            if movie.get("parts", 1) > 1:
+                text, keyboard = render_parts(movie)
+                await message.reply_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+                return
+            
+            # Single part - show quality selection
+            qualities = movie.get("qualities", {})
+            
+            if not qualities:
+                await message.reply_text("❌ No files available for this movie.")
+                return
+            
+            if len(qualities) == 1:
+                quality = list(qualities.keys())[0]
+                await generate_download_link(bot, message, movie, 1, quality)
+            else:
+                await show_quality_selection(message, movie, 1)
     
     
     # ============ /help COMMAND ============
     @app.on_message(filters.command("help") & filters.private)
+    @lifecycle.track
     async def help_cmd(bot: Client, message: Message):
         user_id = message.from_user.id
         
@@ -178,7 +192,13 @@ def register_user_handlers(app: Client):
                 "`/delete Movie Name | quality`\n"
                 "`/list` - List all movies\n"
                 "`/stats` - Statistics\n"
-                "`/broadcast` - Send to all"
+                "`/broadcast` - Send to all\n"
+                "`/top` - Top movies & misses\n"
+                "`/jobs` - Background jobs\n"
+                "`/limits` - Concurrency limits\n"
+                "`/breakers` - Circuit breakers\n"
+                "`/dbstats` - Mongo command stats\n"
+                "`/memory` - Memory usage (`start`/`stop` tracing)"
             )
         
         await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
@@ -186,57 +206,64 @@ def register_user_handlers(app: Client):
     
     # ============ SEARCH (any text) ============
     @app.on_message(filters.text & filters.private)
+    @lifecycle.track
     async def search_cmd(bot: Client, message: Message):
         text = message.text.strip()
         
         if text.startswith("/"):
             return
         
-        user_id = message.from_user.id
-        await db.add_user(user_id, message.from_user.username)
-        
-        query = normalize_name(text)
-        
-        if len(query) < 2:
-            await message.reply_text("❌ Enter at least 2 characters!")
-            return
-        
-        movies = await db.search_movies(query)
-        
-        if not movies:
-            info = await get_movie_info(text)
-            if info:
-                await message.reply_text(
-                    f"❌ **Not in database**\n\n"
-                    f"Found on TMDB:\n"
-                    f"🎬 {info['title']} ({info.get('year', '')})\n"
-                    f"⭐ {info.get('rating', 'N/A')}/10\n\n"
-                    f"Contact admin to add!",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await message.reply_text("❌ Movie not found! Check spelling.")
-            return
+        # Recording the user runs alongside the search (tracked, never cancelled)
+        lifecycle.spawn(db.add_user(message.from_user.id, message.from_user.username))
         
-        if len(movies) == 1:
-            await send_movie_card(bot, message, movies[0])
-            return
-        
-        buttons = []
-        for m in movies[:10]:
-            parts_text = f" ({m.get('parts', 1)} parts)" if m.get('parts', 1) > 1 else ""
-            buttons.append([
-                InlineKeyboardButton(
-                    f"🎬 {m['title']}{parts_text}",
-                    callback_data=f"movie:{m['code']}"
-                )
-            ])
-        
-        await message.reply_text(
-            f"🔍 Found {len(movies)} results:",
-            reply_markup=InlineKeyboardMarkup(buttons),
-            parse_mode=ParseMode.MARKDOWN
-        )
+        async with Budget("search", Config.UPDATE_BUDGET) as budget:
+            query = normalize_name(text)
+            
+            if len(query) < 2:
+                await message.reply_text("❌ Enter at least 2 characters!")
+                return
+            
+            movies = await budget.get("search", db.search_movies(query))
+            
+            analytics.track("search", query=query)
+            for m in movies:
+                analytics.track("hit", m["code"])
+            
+            if not movies:
+                analytics.track("miss", query=query)
+                
+                # Progressive: answer now, add TMDB details if they arrive within the budget
+                if Config.PROGRESSIVE_REPLIES and not is_movie_info_cached(text):
+                    sent = await message.reply_text("❌ Movie not found! Check spelling.")
+                    budget.run("tmdb", enrich_not_found(sent, text), optional=True)
+                    return
+                
+                info = await get_movie_info(text)
+                if info:
+                    await message.reply_text(not_in_database_text(info), parse_mode=ParseMode.MARKDOWN)
+                else:
+                    await message.reply_text("❌ Movie not found! Check spelling.")
+                return
+            
+            if len(movies) == 1:
+                await send_movie_card(bot, message, movies[0], budget)
+                return
+            
+            buttons = []
+            for m in movies[:10]:
+                parts_text = f" ({m.get('parts', 1)} parts)" if m.get('parts', 1) > 1 else ""
+                buttons.append([
+                    InlineKeyboardButton(
+                        f"🎬 {m['title']}{parts_text}",
+                        callback_data=encode_callback(KIND_MOVIE, movie_ref(m))
+                    )
+                ])
+            
+            await message.reply_text(
+                f"🔍 Found {len(movies)} results:",
+                reply_markup=InlineKeyboardMarkup(buttons),
+                parse_mode=ParseMode.MARKDOWN
+            )
 
 
 # ============ HELPER FUNCTIONS ============
@@ -256,33 +283,36 @@ async def send_welcome(message: Message):
     )
 
 
-async def send_movie_card(bot: Client, message: Message, movie: dict):
-    info = await get_movie_info(movie["title"])
-    
-    parts_text = f"\n📦 Parts: {movie['parts']}" if movie.get('parts', 1) > 1 else ""
-    
-    qualities = movie.get("qualities", {})
-    quality_text = ""
-    if qualities:
-        q_list = []
-        for q, data in qualities.items():
-            size = data.get("size", "")
-            q_list.append(f"{q} ({size})" if size else q)
-        quality_text = f"\n🎞️ Available: {', '.join(q_list)}"
-    
+def not_in_database_text(info: dict) -> str:
+    return (
+        f"❌ **Not in database**\n\n"
+        f"Found on TMDB:\n"
+        f"🎬 {info['title']} ({info.get('year', '')})\n"
+        f"⭐ {info.get('rating', 'N/A')}/10\n\n"
+        f"Contact admin to add!"
+    )
+
+
+async def enrich_not_found(sent: Message, text: str):
+    """Background: edit a 'not found' reply with TMDB details"""
+    info = await get_movie_info(text)
     if info:
-        caption = (
-            f"🎬 **{info['title']}** ({info.get('year', '')})\n"
-            f"⭐ {info.get('rating', 'N/A')}/10{parts_text}{quality_text}\n\n"
-            f"{info.get('overview', '')[:200]}..."
-        )
-    else:
-        caption = f"🎬 **{movie['title']}**{parts_text}{quality_text}"
+        await sent.edit_text(not_in_database_text(info), parse_mode=ParseMode.MARKDOWN)
+
+
+async def send_movie_card(bot: Client, message: Message, movie: dict, budget: Budget):
+    analytics.track("view", movie["code"])
     
-    payload = encode_payload(movie["code"])
-    link = f"https://t.me/{bot.me.username}?start={payload}"
+    # Progressive: catalog card now (title, parts, qualities, link), TMDB details
+    # if they arrive within what is left of the update's budget
+    if Config.PROGRESSIVE_REPLIES and not is_movie_info_cached(movie["title"]):
+        caption, kb = render_card(movie, None, bot.me.username)
+        sent = await message.reply_text(caption, reply_markup=kb, parse_mode=ParseMode.MARKDOWN)
+        budget.run("card", enrich_movie_card(bot, message, sent, movie), optional=True)
+        return
     
-    kb = InlineKeyboardMarkup([[InlineKeyboardButton("📥 Download", url=link)]])
+    info = await get_movie_info(movie["title"])
+    caption, kb = render_card(movie, info, bot.me.username)
     
     if info and info.get("poster"):
         try:
@@ -294,50 +324,50 @@ async def send_movie_card(bot: Client, message: Message, movie: dict):
     await message.reply_text(caption, reply_markup=kb, parse_mode=ParseMode.MARKDOWN)
 
 
+async def enrich_movie_card(bot: Client, message: Message, sent: Message, movie: dict):
+    """Background: upgrade a catalog-only card with TMDB details"""
+    info = await get_movie_info(movie["title"])
+    if not info:
+        return
+    
+    caption, kb = render_card(movie, info, bot.me.username)
+    
+    # Text can't be edited into a photo - send the poster card, drop the placeholder
+    if info.get("poster"):
+        try:
+            await message.reply_photo(info["poster"], caption=caption, reply_markup=kb, parse_mode=ParseMode.MARKDOWN)
+            await sent.delete()
+            return
+        except Exception as e:
+            logger.warning(f"Poster send failed: {e}")
+    
+    await sent.edit_text(caption, reply_markup=kb, parse_mode=ParseMode.MARKDOWN)
+
+
 async def show_quality_selection(message: Message, movie: dict, part: int = 1):
     """Show available qualities for selection"""
+    rendered = render_qualities(movie, part)
     
-    if part > 1 and "parts_data" in movie:
-        part_key = f"part_{part}"
-        qualities = movie["parts_data"].get(part_key, {}).get("qualities", {})
-    else:
-        qualities = movie.get("qualities", {})
-    
-    if not qualities:
+    if not rendered:
         await message.reply_text("❌ No qualities available!")
         return
     
-    buttons = []
-    for quality, data in qualities.items():
-        size = data.get("size", "")
-        btn_text = f"🎞️ {quality}" + (f" ({size})" if size else "")
-        buttons.append([
-            InlineKeyboardButton(btn_text, callback_data=f"quality:{movie['code']}:{part}:{quality}")
-        ])
-    
-    await message.reply_text(
-        f"🎬 **{movie['title']}**\n\n"
-        f"📦 Part: {part}\n\n"
-        f"Select quality:",
-        reply_markup=InlineKeyboardMarkup(buttons),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    text, keyboard = rendered
+    await message.reply_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
 
 
 async def generate_download_link(bot: Client, message: Message, movie: dict, part: int, quality: str):
     """Generate download link for user"""
     user_id = message.from_user.id
     
+    analytics.track("quality", movie["code"], quality=quality)
+    
     token = await db.create_token(user_id, movie["code"], part, quality)
-    payload = encode_payload(movie["code"], part, quality, token)
+    payload = encode_payload(movie_ref(movie), part, quality, token)
     bot_link = f"https://t.me/{bot.me.username}?start={payload}"
     
     # Get file size
-    if part > 1 and "parts_data" in movie:
-        part_key = f"part_{part}"
-        size = movie["parts_data"].get(part_key, {}).get("qualities", {}).get(quality, {}).get("size", "")
-    else:
-        size = movie.get("qualities", {}).get(quality, {}).get("size", "")
+    size = get_qualities(movie, part).get(quality, {}).get("size", "")
     
     size_text = f"\n📁 Size: {size}" if size else ""
     
@@ -360,7 +390,8 @@ async def send_file_with_ads(
     file_id: str,
     part: int,
     quality: str,
-    file_size: str
+    file_size: str,
+    file_bytes: int = 0
 ):
     """Send file through GitHub ad page"""
     user_id = message.from_user.id
@@ -368,13 +399,12 @@ async def send_file_with_ads(
     status = await message.reply_text("🔄 Generating download link...")
     
     try:
-        # Get file URL from Telegram
-        file = await bot.get_file(file_id)
-        file_url = f"https://api.telegram.org/file/bot{Config.BOT_TOKEN}/{file.file_path}"
-        
         # Create file name
         file_name = f"{movie['title']} - Part {part} ({quality}).mp4"
         
+        # Signed, expiring link to our own download server (streams from Telegram)
+        file_url = streamer.sign(file_id, file_bytes, file_name)
+        
         # Create monetized link (GitHub ad page)
         download_link = create_download_link(
             file_url=file_url,
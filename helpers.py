@@ -2,50 +2,151 @@ import logging
 import aiohttp
 import base64
 import re
+from pyrogram.errors import BadRequest
 from config import Config
+from utils import codec
+from utils.codec import QUALITY_OPTIONS
+from utils.breaker import CircuitBreaker, CircuitOpen
+from utils.cache import TTLCache
+from utils.limiter import AdaptiveLimiter, LimiterRejected
+from utils.singleflight import SingleFlight
+from utils.tmdb_store import MetadataStore
 
 logger = logging.getLogger(__name__)
 
+# Shared HTTP session (created on first use, closed on shutdown)
+_http_session = None
+
+# TMDB results by query (misses are cached for a shorter time)
+metadata_cache = TTLCache("tmdb", ttl=6 * 3600, max_size=2000, persist=True)
+
+# Users seen in the backup channel (only positive answers - a join must count at once)
+subscription_cache = TTLCache("subscriptions", ttl=600, max_size=20000, persist=True)
+
+# Concurrent misses for one title share one store/TMDB lookup
+metadata_flight = SingleFlight("tmdb")
+
+# Offline TMDB dump, checked before the API
+metadata_store = MetadataStore(Config.TMDB_STORE_PATH)
+
+# Fail fast when a dependency is down (400s like USER_NOT_PARTICIPANT are answers, not failures)
+tmdb_breaker = CircuitBreaker("tmdb", timeout=4, open_for=60)
+# The call goes through telegram_limiter - being shed there isn't a Telegram failure
+member_breaker = CircuitBreaker("telegram_member", timeout=3, excluded=(BadRequest,), ignored=(LimiterRejected,))
+
+# Outbound Bot API calls made from handlers (get_chat_member)
+telegram_limiter = AdaptiveLimiter(
+    "telegram",
+    initial=10,
+    max_limit=Config.TELEGRAM_MAX_CONCURRENCY,
+    target_latency=1.0,
+    queue_timeout=Config.LIMITER_QUEUE_TIMEOUT
+)
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Get the shared aiohttp session"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession()
+    return _http_session
+
+
+async def close_http_session():
+    """Close the shared aiohttp session"""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
 
 async def get_movie_info(query: str) -> dict:
-    """Get movie info from TMDB"""
-    if not Config.TMDB_API_KEY or not query:
+    """Get movie info - local TMDB store first, then the TMDB API"""
+    if not query:
         return None
     
+    key = query.lower().strip()
+    if key in metadata_cache:
+        return metadata_cache.get(key)
+    return await metadata_flight.do(key, _lookup_movie_info, key, query)
+
+
+async def _lookup_movie_info(key: str, query: str) -> dict:
     try:
-        url = "https://api.themoviedb.org/3/search/movie"
-        params = {"api_key": Config.TMDB_API_KEY, "query": query}
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data.get("results"):
-                        m = data["results"][0]
-                        poster = f"https://image.tmdb.org/t/p/w500{m['poster_path']}" if m.get("poster_path") else None
-                        overview = m.get("overview", "")[:300]
-                        return {
-                            "title": m.get("title", "Unknown"),
-                            "year": m.get("release_date", "")[:4],
-                            "rating": m.get("vote_average", "N/A"),
-                            "overview": overview,
-                            "poster": poster
-                        }
+        info = await metadata_store.lookup(normalize_name(query))
+        if info:
+            metadata_cache.set(key, info)
+            return info
+    except Exception as e:
+        logger.error(f"TMDB store error: {e}")
+    
+    if not Config.TMDB_API_KEY:
+        return None
+    
+    try:
+        found, info = await tmdb_breaker.call(_fetch_tmdb, query)
+        if found:
+            metadata_cache.set(key, info, ttl=None if info else 600)
+        return info
+    except CircuitOpen:
         return None
     except Exception as e:
         logger.error(f"TMDB error: {e}")
         return None
 
 
+async def _fetch_tmdb(query: str) -> tuple:
+    """Search TMDB - returns (answered, info), raises on server errors"""
+    url = "https://api.themoviedb.org/3/search/movie"
+    params = {"api_key": Config.TMDB_API_KEY, "query": query}
+    
+    session = await get_http_session()
+    async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+        if resp.status == 429 or resp.status >= 500:
+            raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+        if resp.status != 200:
+            return False, None
+        
+        data = await resp.json()
+        if not data.get("results"):
+            return True, None
+        
+        m = data["results"][0]
+        poster = f"https://image.tmdb.org/t/p/w500{m['poster_path']}" if m.get("poster_path") else None
+        overview = m.get("overview", "")[:300]
+        return True, {
+            "title": m.get("title", "Unknown"),
+            "year": m.get("release_date", "")[:4],
+            "rating": m.get("vote_average", "N/A"),
+            "overview": overview,
+            "poster": poster
+        }
+
+
+def is_movie_info_cached(query: str) -> bool:
+    """True if get_movie_info(query) would answer without any I/O"""
+    return bool(query) and query.lower().strip() in metadata_cache
+
+
 async def check_subscription(bot, user_id: int) -> bool:
     """Check if user joined channel"""
     if not Config.BACKUP_CHANNEL_ID:
         return True
+    if subscription_cache.get(user_id):
+        return True
     
     try:
-        member = await bot.get_chat_member(Config.BACKUP_CHANNEL_ID, user_id)
+        member = await member_breaker.call(
+            telegram_limiter.call, bot.get_chat_member, Config.BACKUP_CHANNEL_ID, user_id
+        )
         status = str(member.status).lower()
-        return any(s in status for s in ["member", "administrator", "creator", "owner"])
+        subscribed = any(s in status for s in ["member", "administrator", "creator", "owner"])
+        if subscribed:
+            subscription_cache.set(user_id, True)
+        return subscribed
+    except CircuitOpen:
+        # Telegram is struggling - don't make users wait for it
+        return True
     except Exception as e:
         error = str(e).lower()
         if "user_not_participant" in error:
@@ -56,21 +157,26 @@ async def check_subscription(bot, user_id: int) -> bool:
         return True
 
 
-def encode_payload(movie_code: str, part: int = 1, quality: str = "", token: str = "") -> str:
-    """Encode data to base64"""
+def encode_payload(movie_ref, part: int = 1, quality: str = "", token: str = "") -> str:
+    """Encode deep-link data (movie_ref is the numeric movie id or code)"""
     try:
-        data = f"{movie_code}|{part}|{quality}|{token}"
-        return base64.urlsafe_b64encode(data.encode()).decode()
-    except:
+        return codec.encode(codec.KIND_START, movie_ref, part, quality, token)
+    except Exception as e:
+        logger.error(f"Encode payload error: {e}")
         return ""
 
 
 def decode_payload(payload: str) -> tuple:
-    """Decode base64 to data"""
+    """Decode deep-link data - returns (movie_ref, part, quality, token)"""
     try:
         if not payload:
             return "", 1, "", ""
         
+        decoded = codec.decode(payload)
+        if decoded is not None and decoded.kind == codec.KIND_START:
+            return decoded.ref, decoded.part, decoded.quality, decoded.token
+        
+        # Old links: base64 of "code|part|quality|token"
         decoded = base64.urlsafe_b64decode(payload.encode()).decode()
         
         if "|" not in decoded:
@@ -87,9 +193,27 @@ def decode_payload(payload: str) -> tuple:
         return "", 1, "", ""
 
 
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
 def normalize_name(text: str) -> str:
     """Normalize movie name"""
-    text = re.sub(r'[^\w\s]', '', text)
+    text = _PUNCTUATION.sub('', text)
     text = text.lower().strip()
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE.sub(' ', text)
     return text
+
+
+_QUALITY_LOOKUP = {q.lower(): q for q in QUALITY_OPTIONS}
+
+
+def parse_quality(text: str) -> str:
+    """Canonical quality name ("4k" -> "4K", "720P" -> "720p"), empty if unknown"""
+    return _QUALITY_LOOKUP.get(text.strip().lower(), "")
+
+
+def format_size(file_size: int) -> str:
+    """Human readable file size (MB below 1 GB)"""
+    size_mb = round(file_size / (1024 * 1024), 2) if file_size else 0
+    return f"{size_mb} MB" if size_mb < 1024 else f"{round(size_mb/1024, 2)} GB"
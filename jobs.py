@@ -0,0 +1,115 @@
+"""
+Background jobs - housekeeping that runs on the scheduler, off the request path
+"""
+import asyncio
+import functools
+import logging
+import time
+from config import Config
+from database import db, db_monitor
+from utils.analytics import analytics
+from utils.cache import caches
+from utils.leader import leader
+from utils.memory import memory
+from utils.outbox import BULK, outbox
+from utils.recorder import recorder
+from utils.warmstart import warm_start
+
+logger = logging.getLogger(__name__)
+
+# Broadcast copies kept in flight at once (the outbox does the pacing)
+BROADCAST_WINDOW = 30
+
+
+async def token_cleanup():
+    """Delete expired download tokens"""
+    await db.cleanup_tokens()
+
+
+async def cache_refresh():
+    """Drop expired cache entries so the next lookup refetches fresh data"""
+    removed = sum(cache.expire() for cache in caches.values())
+    if removed:
+        logger.info(f"🧹 Cache refresh: {removed} expired entries dropped")
+
+
+async def stats_rollup():
+    """Store hourly user/movie/file counts"""
+    hour = int(time.time() // 3600) * 3600
+    stats = await db.get_stats()
+    if await leader.check():
+        await db.save_stats_rollup(hour, stats, fence=leader.token)
+
+
+async def memory_gauges():
+    """Log RSS, traced memory and cache/buffer sizes"""
+    memory.report()
+
+
+async def explain_slow_queries():
+    """Explain sampled slow commands and flag collection scans"""
+    await db_monitor.run_explains(db.client)
+
+
+async def broadcasts(bot):
+    """Send queued /broadcast requests (leader only, fenced with the lease token)"""
+    while await leader.check():
+        fence = leader.token
+        job = await db.claim_broadcast(fence)
+        if not job:
+            return
+        
+        # Resumes after the last user a deposed leader got to
+        last_user, sent, failed = job["last_user"], job["sent"], job["failed"]
+        done = False
+        # Bulk lane: the outbox paces these behind user-facing replies
+        with outbox.lane(BULK):
+            while True:
+                users = await db.get_users_after(last_user, BROADCAST_WINDOW)
+                if not users:
+                    done = True
+                    break
+                # Deposed mid-way (fencing token changed) - stop instead of racing the new leader
+                if not await leader.check() or leader.token != fence:
+                    break
+                results = await asyncio.gather(
+                    *(bot.copy_message(user["user_id"], job["from_chat_id"], job["message_id"])
+                      for user in users),
+                    return_exceptions=True
+                )
+                errors = sum(1 for r in results if isinstance(r, Exception))
+                failed += errors
+                sent += len(results) - errors
+                last_user = users[-1]["_id"]
+                if not await db.save_broadcast_progress(job["_id"], fence, last_user, sent, failed):
+                    break
+        
+        if not done:
+            logger.warning(f"📢 Broadcast {job['_id']} handed over after {sent + failed} users")
+            return
+        if not await db.save_broadcast_progress(job["_id"], fence, last_user, sent, failed, done=True):
+            return
+        logger.info(f"📢 Broadcast {job['_id']} done: {sent} sent, {failed} failed")
+        try:
+            await bot.edit_message_text(
+                job["status_chat_id"], job["status_message_id"],
+                f"📢 **Done!**\n\n✅ Sent: {sent}\n❌ Failed: {failed}"
+            )
+        except Exception as e:
+            logger.warning(f"Broadcast status edit failed: {e}")
+
+
+def register_all_jobs(scheduler, bot):
+    """Register all jobs"""
+    scheduler.every("token_cleanup", 600, token_cleanup, jitter=30, timeout=60, leader_only=True)
+    scheduler.every("cache_refresh", 300, cache_refresh, jitter=15, timeout=30)
+    scheduler.every("analytics_flush", 30, analytics.flush, timeout=20)
+    if Config.RECORD_UPDATES:
+        scheduler.every("recorder_flush", 10, recorder.flush, timeout=30)
+    scheduler.every("broadcasts", 10, functools.partial(broadcasts, bot), leader_only=True)
+    scheduler.every("memory_gauges", 60, memory_gauges, timeout=30)
+    if Config.WARM_START_PATH:
+        scheduler.every("cache_snapshot", Config.WARM_START_INTERVAL, warm_start.save, jitter=15, timeout=60)
+    if db_monitor.explain_rate:
+        scheduler.every("explain_slow_queries", 60, explain_slow_queries, timeout=30)
+    scheduler.cron("stats_rollup", "0 * * * *", stats_rollup, jitter=60, timeout=120, leader_only=True)
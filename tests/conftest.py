@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Config is read at import time, give it something valid
+os.environ.setdefault("MONGO_DB_URL", "mongodb://localhost")
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", help="run the @pytest.mark.benchmark tests")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: timing gate, skipped unless --benchmarks is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    # Timings are noisy on shared runners - the gate runs on its own, on request
+    if config.getoption("--benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmark - run with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
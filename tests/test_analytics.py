@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+
+from utils import analytics as analytics_module
+from utils.analytics import MAX_RETRIES, Analytics
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Stub the stats writes - each movie write pops the next outcome (None = success)"""
+    state = {"movies": [], "queries": [], "outcomes": []}
+
+    async def inc(kind, counters):
+        state[kind].append(dict(counters))
+        outcome = state["outcomes"].pop(0) if state["outcomes"] and kind == "movies" else None
+        if outcome is not None:
+            raise outcome
+
+    class DB:
+        async def inc_movie_stats(self, counters):
+            await inc("movies", counters)
+
+        async def inc_query_stats(self, counters):
+            await inc("queries", counters)
+
+    monkeypatch.setattr(analytics_module, "db", DB())
+    return state
+
+
+def test_transient_failure_is_retried_next_flush(writes):
+    analytics = Analytics()
+    analytics.track("view", "a")
+    writes["outcomes"] = [AutoReconnect("primary stepped down")]
+
+    asyncio.run(analytics.flush())
+    assert analytics.snapshot()["unwritten"] == 1
+
+    analytics.track("view", "a")
+    asyncio.run(analytics.flush())
+
+    assert list(writes["movies"][-1].values()) == [{"views": 2}]
+    assert analytics.snapshot()["unwritten"] == 0
+    assert analytics.dropped == 0
+
+
+def test_permanent_failure_is_dropped(writes):
+    analytics = Analytics()
+    analytics.track("view", "a")
+    writes["outcomes"] = [OperationFailure("bad update")]
+
+    asyncio.run(analytics.flush())
+
+    assert analytics.snapshot()["unwritten"] == 0
+    assert analytics.dropped == 1
+
+
+def test_bulk_keeps_only_transient_write_errors(writes):
+    analytics = Analytics()
+    for code in "abc":
+        analytics.track("view", code)
+    writes["outcomes"] = [BulkWriteError({"writeErrors": [
+        {"index": 0, "code": 189},      # primary stepped down
+        {"index": 2, "code": 2},        # bad value
+    ]})]
+
+    asyncio.run(analytics.flush())
+
+    assert [key[0] for key in analytics.unwritten["movies"]] == ["a"]
+    assert analytics.dropped == 1
+
+
+def test_retries_are_capped(writes):
+    analytics = Analytics()
+    analytics.track("view", "a")
+    writes["outcomes"] = [AutoReconnect("down")] * (MAX_RETRIES + 1)
+
+    for _ in range(MAX_RETRIES + 1):
+        asyncio.run(analytics.flush())
+
+    assert len(writes["movies"]) == MAX_RETRIES + 1
+    assert analytics.snapshot()["unwritten"] == 0
+    assert analytics.dropped == 1
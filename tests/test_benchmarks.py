@@ -0,0 +1,23 @@
+"""
+Micro-benchmark gate (benchmarks/bench_helpers.py) as a test, skipped by default
+Run: python -m pytest tests/test_benchmarks.py --benchmarks
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import bench_helpers
+
+
+@pytest.mark.benchmark
+def test_no_regressions():
+    baseline = bench_helpers.load_baseline()
+    assert baseline, "no baseline - run python benchmarks/bench_helpers.py --update"
+
+    results, regressions = bench_helpers.run(baseline=baseline, verbose=False)
+
+    slower = {name: round(results[name] / baseline[name], 2) for name in regressions}
+    assert not regressions, f"slower than baseline: {slower}"
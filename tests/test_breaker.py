@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from utils.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class Answer(Exception):
+    pass
+
+
+class Shed(Exception):
+    pass
+
+
+async def fail():
+    raise ConnectionError("down")
+
+
+async def ok():
+    return "ok"
+
+
+async def call(breaker, func):
+    try:
+        return await breaker.call(func)
+    except Exception as e:
+        return type(e)
+
+
+def test_opens_on_failure_rate():
+    breaker = CircuitBreaker("test_open", min_calls=4, failure_rate=0.5)
+
+    async def main():
+        for func in (ok, ok, fail, fail):
+            await call(breaker, func)
+        return await call(breaker, ok)
+
+    assert asyncio.run(main()) is CircuitOpen
+    assert breaker.state == OPEN
+    assert breaker.trips == 1
+    assert breaker.rejected == 1
+
+
+def test_half_open_probe():
+    breaker = CircuitBreaker("test_probe", min_calls=1, open_for=0)
+
+    async def main():
+        await call(breaker, fail)
+        assert breaker.state == OPEN
+        assert await call(breaker, fail) is ConnectionError
+        assert breaker.state == OPEN
+        assert await call(breaker, ok) == "ok"
+
+    asyncio.run(main())
+
+    assert breaker.state == CLOSED
+
+
+def test_one_probe_at_a_time():
+    breaker = CircuitBreaker("test_one_probe", min_calls=1, open_for=0)
+
+    async def main():
+        await call(breaker, fail)
+        probe = asyncio.create_task(breaker.call(asyncio.sleep, 0.02))
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN
+        assert await call(breaker, ok) is CircuitOpen
+        await probe
+
+    asyncio.run(main())
+
+    assert breaker.state == CLOSED
+
+
+def test_timeout_counts_as_failure():
+    breaker = CircuitBreaker("test_timeout", min_calls=1, timeout=0.01)
+
+    assert asyncio.run(call(breaker, lambda: asyncio.sleep(1))) is asyncio.TimeoutError
+    assert breaker.state == OPEN
+
+
+def test_excluded_and_ignored():
+    breaker = CircuitBreaker("test_excluded", min_calls=2, excluded=(Answer,), ignored=(Shed,))
+
+    async def answer():
+        raise Answer()
+
+    async def shed():
+        raise Shed()
+
+    async def main():
+        for _ in range(5):
+            with pytest.raises(Answer):
+                await breaker.call(answer)
+            with pytest.raises(Shed):
+                await breaker.call(shed)
+
+    asyncio.run(main())
+
+    assert breaker.state == CLOSED
+    snapshot = breaker.snapshot()
+    # Excluded errors are recorded as answers, ignored ones not at all
+    assert snapshot["calls"] == 5
+    assert snapshot["failures"] == 0
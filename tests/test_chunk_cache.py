@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+from utils.chunk_cache import ChunkCache
+
+
+def put(cache: ChunkCache, index: int, data: bytes, uid: str = "uid"):
+    asyncio.run(cache.put(uid, index, data))
+
+
+def test_miss_then_hit_is_memory_mapped(tmp_path):
+    cache = ChunkCache(str(tmp_path), 1024)
+
+    assert cache.open("uid", 0) is None
+    put(cache, 0, b"chunk")
+    chunk = cache.open("uid", 0)
+
+    assert bytes(chunk) == b"chunk"
+    assert chunk.closed is False
+    chunk.close()
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert os.path.exists(tmp_path / "uid" / "0")
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = ChunkCache(str(tmp_path), 1024)
+    put(cache, 0, b"chunk")
+    os.unlink(tmp_path / "uid" / "0")
+
+    assert cache.open("uid", 0) is None
+    assert not cache.contains("uid", 0)
+    assert cache.used == 0
+
+
+def test_size_cap_evicts(tmp_path):
+    cache = ChunkCache(str(tmp_path), 30)
+    for index in range(4):
+        put(cache, index, b"x" * 10)
+
+    assert cache.used == 30
+    assert cache.evictions == 1
+    assert not cache.contains("uid", 0)
+    assert not os.path.exists(tmp_path / "uid" / "0")
+
+
+def test_eviction_keeps_chunks_that_are_read(tmp_path):
+    cache = ChunkCache(str(tmp_path), 30)
+    for index in range(3):
+        put(cache, index, b"x" * 10)
+    cache.open("uid", 0).close()
+
+    put(cache, 3, b"x" * 10)
+
+    # 1 and 2 were read least, 1 is the older of them
+    assert cache.contains("uid", 0)
+    assert not cache.contains("uid", 1)
+    assert cache.contains("uid", 2)
+
+
+def test_load_indexes_chunks_on_disk(tmp_path):
+    folder = tmp_path / "uid"
+    folder.mkdir()
+    for index in range(3):
+        (folder / str(index)).write_bytes(b"x" * 10)
+    (folder / "3.tmp").write_bytes(b"partial")
+
+    cache = ChunkCache(str(tmp_path), 20)
+    cache.load()
+
+    assert not os.path.exists(folder / "3.tmp")
+    assert cache.used == 20
+    assert cache.evictions == 1
+
+
+def test_disabled_cache(tmp_path):
+    cache = ChunkCache(str(tmp_path / "cache"), 0)
+    cache.load()
+
+    assert not cache.enabled
+    assert not os.path.exists(tmp_path / "cache")
@@ -0,0 +1,74 @@
+import base64
+
+import pytest
+
+from helpers import decode_payload, encode_payload
+from utils import codec
+from utils.codec import (
+    KIND_MOVIE,
+    KIND_QUALITY,
+    KIND_START,
+    Payload,
+    decode,
+    decode_callback,
+    encode,
+    encode_callback,
+)
+
+TOKEN = "PZtD5bf2FehHwz93gm63gw"
+
+
+@pytest.mark.parametrize("ref, part, quality, token", [
+    (1234, 2, "1080p", TOKEN),
+    (1, 1, "", ""),
+    (2 ** 40, 300, "4K", ""),
+    ("kill_bill", 1, "720p", TOKEN),
+    (77, 3, "720p HEVC", ""),
+])
+def test_round_trip(ref, part, quality, token):
+    text = encode(KIND_START, ref, part, quality, token)
+
+    assert len(text) <= codec.MAX_LENGTH
+    assert decode(text) == Payload(KIND_START, ref, part, quality, token)
+
+
+def test_numeric_ref_is_compact():
+    assert len(encode(KIND_START, 1234, 2, "1080p", TOKEN)) < 40
+
+
+def test_too_long_raises():
+    with pytest.raises(ValueError):
+        encode(KIND_START, "x" * 60)
+
+
+@pytest.mark.parametrize("text", ["", "!!!", "AA", base64.urlsafe_b64encode(b"\x09\x00\x02").decode()])
+def test_decode_rejects_foreign_data(text):
+    assert decode(text) is None
+
+
+def test_callback_round_trip():
+    data = encode_callback(KIND_QUALITY, 1234, 2, "1080p")
+
+    assert decode_callback(data) == Payload(KIND_QUALITY, 1234, 2, "1080p", "")
+
+
+def test_legacy_callback():
+    assert decode_callback("quality:kill_bill:2:1080p") == Payload(KIND_QUALITY, "kill_bill", 2, "1080p", "")
+    assert decode_callback("movie:kill_bill") == Payload(KIND_MOVIE, "kill_bill", 1, "", "")
+    assert decode_callback("unknown:kill_bill") is None
+    assert decode_callback(None) is None
+
+
+def test_payload_round_trip():
+    assert decode_payload(encode_payload(1234, 2, "1080p", TOKEN)) == (1234, 2, "1080p", TOKEN)
+
+
+def test_legacy_payload():
+    legacy = base64.urlsafe_b64encode(f"kill_bill|1|720p|{TOKEN}".encode()).decode()
+
+    assert decode_payload(legacy) == ("kill_bill", 1, "720p", TOKEN)
+
+
+@pytest.mark.parametrize("payload", ["", "not base64!", base64.urlsafe_b64encode(b"no separators").decode()])
+def test_bad_payload(payload):
+    assert decode_payload(payload) == ("", 1, "", "")
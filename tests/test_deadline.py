@@ -0,0 +1,89 @@
+import asyncio
+
+from utils.deadline import Budget
+
+
+def test_required_step_past_deadline_is_an_overrun():
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "late"
+
+    async def main():
+        async with Budget("test_overrun", 0.02) as budget:
+            result = await budget.get("slow", slow())
+        return result, budget
+
+    result, budget = asyncio.run(main())
+
+    assert result == "late"
+    snap = budget.stats.snapshot()
+    assert (snap["runs"], snap["overruns"]) == (1, 1)
+    assert snap["steps"]["slow"]["overruns"] == 1
+    assert snap["steps"]["slow"]["cancelled"] == 0
+
+
+def test_optional_step_is_cancelled_past_deadline():
+    finished = []
+
+    async def enrich():
+        await asyncio.sleep(1)
+        finished.append(1)
+
+    async def main():
+        started = asyncio.get_running_loop().time()
+        async with Budget("test_optional_cancel", 0.05) as budget:
+            task = budget.run("enrich", enrich(), optional=True)
+        return task, budget, asyncio.get_running_loop().time() - started
+
+    task, budget, elapsed = asyncio.run(main())
+
+    assert task.cancelled()
+    assert not finished
+    assert elapsed < 0.5
+    assert budget.stats.snapshot()["steps"]["enrich"]["cancelled"] == 1
+
+
+def test_optional_step_gets_the_remaining_budget():
+    finished = []
+
+    async def enrich():
+        await asyncio.sleep(0.02)
+        finished.append(1)
+
+    async def main():
+        async with Budget("test_optional_finish", 1) as budget:
+            budget.run("enrich", enrich(), optional=True)
+        return budget
+
+    budget = asyncio.run(main())
+
+    assert finished == [1]
+    snap = budget.stats.snapshot()
+    assert snap["overruns"] == 0
+    assert (snap["steps"]["enrich"]["count"], snap["steps"]["enrich"]["cancelled"]) == (1, 0)
+
+
+def test_unneeded_required_step_is_cancelled():
+    async def lookup():
+        await asyncio.sleep(1)
+
+    async def main():
+        async with Budget("test_unneeded", 1) as budget:
+            task = budget.run("movie", lookup())
+        return task
+
+    assert asyncio.run(main()).cancelled()
+
+
+def test_optional_step_failure_does_not_raise():
+    async def broken():
+        raise ValueError("tmdb down")
+
+    async def main():
+        async with Budget("test_optional_error", 1) as budget:
+            budget.run("enrich", broken(), optional=True)
+        return budget
+
+    snap = asyncio.run(main()).stats.snapshot()
+    assert snap["runs"] == 1
+    assert snap["steps"]["enrich"]["count"] == 1
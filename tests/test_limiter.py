@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from utils.limiter import AdaptiveLimiter, LimiterRejected
+
+
+def test_limits_concurrency():
+    limiter = AdaptiveLimiter("test_concurrency", initial=2, min_limit=2, max_limit=2)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        peak = max(peak, limiter.inflight)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(limiter.call(work) for _ in range(10)))
+
+    asyncio.run(main())
+
+    assert peak == 2
+    assert limiter.inflight == 0
+    assert limiter.completed == 10
+
+
+def test_rejects_past_deadline():
+    limiter = AdaptiveLimiter("test_deadline", initial=1, min_limit=1, max_limit=1, queue_timeout=0.05)
+
+    async def main():
+        slow = asyncio.create_task(limiter.call(asyncio.sleep, 0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterRejected):
+            await limiter.call(asyncio.sleep, 0)
+        await slow
+
+    asyncio.run(main())
+
+    assert limiter.rejected == 1
+    assert limiter.inflight == 0
+    assert not limiter.waiters
+
+
+def test_rejects_when_queue_full():
+    limiter = AdaptiveLimiter("test_queue", initial=1, min_limit=1, max_limit=1, max_queue=1)
+
+    async def main():
+        first = asyncio.create_task(limiter.call(asyncio.sleep, 0.05))
+        queued = asyncio.create_task(limiter.call(asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterRejected):
+            await limiter.call(asyncio.sleep, 0)
+        await asyncio.gather(first, queued)
+
+    asyncio.run(main())
+
+    assert limiter.completed == 2
+
+
+def test_cancelled_waiter_gives_slot_back():
+    limiter = AdaptiveLimiter("test_cancel", initial=1, min_limit=1, max_limit=1)
+
+    async def main():
+        first = asyncio.create_task(limiter.call(asyncio.sleep, 0.02))
+        waiter = asyncio.create_task(limiter.call(asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await first
+        await limiter.call(asyncio.sleep, 0)
+
+    asyncio.run(main())
+
+    assert limiter.inflight == 0
+    assert not limiter.waiters
+
+
+def test_adapts_limit():
+    limiter = AdaptiveLimiter("test_adapt", initial=10, min_limit=2, max_limit=20, target_latency=0.01)
+
+    for _ in range(10):
+        limiter.inflight += 1
+        limiter.release(0.001, True)
+    assert limiter.limit > 10
+
+    grown = limiter.limit
+    limiter.inflight += 1
+    limiter.release(1.0, True)
+    assert limiter.limit == pytest.approx(grown * 0.9)
+
+    limiter.inflight += 1
+    limiter.release(0.001, False)
+    assert limiter.failed == 1
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+from pyrogram.errors import FloodWait
+
+from utils.outbox import ADMIN, BULK, INTERACTIVE, Outbox, OutboxClosed
+
+
+def test_lanes_send_interactive_before_bulk():
+    outbox = Outbox(rate=100, burst=100)
+    order = []
+
+    async def send(name):
+        order.append(name)
+
+    async def submit(lane, name):
+        with outbox.lane(lane):
+            await outbox.submit(name, send, name)
+
+    async def main():
+        # All queued before the dispatcher first runs
+        await asyncio.gather(
+            submit(BULK, "bulk1"), submit(BULK, "bulk2"),
+            submit(ADMIN, "admin"), submit(INTERACTIVE, "reply")
+        )
+        await outbox.stop()
+
+    asyncio.run(main())
+
+    assert order == ["reply", "admin", "bulk1", "bulk2"]
+
+
+def test_global_bucket_paces_sends():
+    outbox = Outbox(rate=20, burst=2)
+
+    async def send(chat_id):
+        return time.monotonic()
+
+    async def main():
+        started = time.monotonic()
+        sent = await asyncio.gather(*(outbox.submit(chat_id, send, chat_id) for chat_id in range(6)))
+        await outbox.stop()
+        return started, sent
+
+    started, sent = asyncio.run(main())
+
+    # Burst of 2, then 4 more at 20/s
+    assert max(sent) - started >= 0.18
+    assert outbox.sent == 6
+
+
+def test_chat_bucket_paces_one_chat():
+    outbox = Outbox(rate=100, burst=100, chat_rate=10, chat_burst=1)
+    sent = {}
+
+    async def send(chat_id, n):
+        sent[(chat_id, n)] = time.monotonic()
+
+    async def main():
+        started = time.monotonic()
+        await asyncio.gather(
+            *(outbox.submit("slow", send, "slow", n) for n in range(3)),
+            outbox.submit("other", send, "other", 0)
+        )
+        await outbox.stop()
+        return started
+
+    started = asyncio.run(main())
+
+    # Other chats aren't held up by one chat's pacing
+    assert sent[("other", 0)] - started < 0.05
+    assert sent[("slow", 2)] - started >= 0.18
+
+
+def test_flood_wait_pauses_every_chat_and_retries():
+    outbox = Outbox(rate=100, burst=100)
+    calls = []
+
+    async def send(chat_id):
+        calls.append((chat_id, time.monotonic()))
+        if len(calls) == 1:
+            raise FloodWait(value=1)
+        return chat_id
+
+    async def later(chat_id):
+        await asyncio.sleep(0.05)
+        return await outbox.submit(chat_id, send, chat_id)
+
+    async def main():
+        started = time.monotonic()
+        results = await asyncio.gather(outbox.submit("a", send, "a"), later("b"))
+        await outbox.stop()
+        return started, results
+
+    started, results = asyncio.run(main())
+
+    assert results == ["a", "b"]
+    assert outbox.flood_waits == 1
+    # The retry and the other chat's send both waited out the pause
+    assert [chat_id for chat_id, _ in calls] == ["a", "a", "b"]
+    assert all(at - started >= 0.95 for _, at in calls[1:])
+
+
+def test_stop_waits_for_inflight_and_refuses_new_sends():
+    outbox = Outbox()
+    done = []
+
+    async def send():
+        await asyncio.sleep(0.05)
+        done.append(1)
+
+    async def main():
+        pending = asyncio.ensure_future(outbox.submit(1, send))
+        await asyncio.sleep(0.01)
+        await outbox.stop()
+        assert done == [1]
+        await pending
+        with pytest.raises(OutboxClosed):
+            await outbox.submit(1, send)
+
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+from helpers import decode_payload
+from utils.render import render_card
+
+INFO = {"title": "Dune", "year": "2021", "rating": 7.8, "overview": "Spice."}
+
+
+def test_card_links_to_the_movie():
+    movie = {"code": "dune", "mid": 42, "qualities": {"1080p": {"size": "2 GB"}}}
+
+    caption, keyboard = render_card(movie, INFO, "moviebot")
+
+    assert "**Dune** (2021)" in caption
+    assert "1080p (2 GB)" in caption
+    url = keyboard.inline_keyboard[0][0].url
+    assert url.startswith("https://t.me/moviebot?start=")
+    assert decode_payload(url.split("start=")[1])[0] == 42
+
+
+def test_card_without_a_deep_link_when_the_ref_does_not_fit():
+    movie = {"code": "x" * 200, "title": "Long"}
+
+    caption, keyboard = render_card(movie, None, "moviebot")
+
+    assert caption == "🎬 **Long**"
+    assert keyboard is None
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.scheduler import Job, next_cron_time, parse_cron
+
+
+def test_parse_cron_fields():
+    minutes, hours, days, months, weekdays = parse_cron("*/15 3 1,15 * 1-5")
+
+    assert minutes == {0, 15, 30, 45}
+    assert hours == {3}
+    assert days == {1, 15}
+    assert months == set(range(1, 13))
+    assert weekdays == {1, 2, 3, 4, 5}
+
+
+@pytest.mark.parametrize("spec", ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * * 7", "*/0 * * * *"])
+def test_parse_cron_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_cron(spec)
+
+
+def test_next_cron_time_daily():
+    fields = parse_cron("30 3 * * *")
+
+    assert next_cron_time(fields, datetime(2026, 10, 19, 3, 29, 59)) == datetime(2026, 10, 19, 3, 30)
+    assert next_cron_time(fields, datetime(2026, 10, 19, 3, 30)) == datetime(2026, 10, 20, 3, 30)
+
+
+def test_next_cron_time_weekday_zero_is_sunday():
+    # 2026-10-19 is a Monday
+    assert next_cron_time(parse_cron("0 0 * * 0"), datetime(2026, 10, 19)) == datetime(2026, 10, 25)
+
+
+def test_next_cron_time_day_and_weekday_either_matches():
+    fields = parse_cron("0 0 1 * 1")
+    t = datetime(2026, 10, 19)
+    fired = []
+    for _ in range(4):
+        t = next_cron_time(fields, t)
+        fired.append(t.date().isoformat())
+
+    assert fired == ["2026-10-26", "2026-11-01", "2026-11-02", "2026-11-09"]
+
+
+def test_next_cron_time_day_with_any_weekday():
+    assert next_cron_time(parse_cron("0 0 13 * *"), datetime(2026, 10, 19)) == datetime(2026, 11, 13)
+
+
+
+def test_cron_job_early_wake_does_not_fire_twice():
+    job = Job("hourly", None, cron="0 * * * *")
+
+    assert job.delay(datetime(2026, 10, 19, 2, 30, tzinfo=timezone.utc)) == 30 * 60
+    # The sleep ended a moment before 03:00 - the next run is 04:00, not 03:00 again
+    assert job.delay(datetime(2026, 10, 19, 2, 59, 59, 900000, tzinfo=timezone.utc)) == 3600.1
+    assert job.cron_slot == datetime(2026, 10, 19, 4, tzinfo=timezone.utc)
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_flight():
+    flight = SingleFlight("test_share")
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"key": key}
+
+    async def main():
+        return await asyncio.gather(*(flight.do(k, fetch, k) for k in "aaab"))
+
+    results = asyncio.run(main())
+
+    assert calls == ["a", "b"]
+    assert results[0] is results[1] is results[2]
+    assert (flight.calls, flight.shared) == (2, 2)
+    assert flight.snapshot()["inflight"] == 0
+
+
+def test_next_call_after_completion_runs_again():
+    flight = SingleFlight("test_again")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        return await flight.do("k", fetch), await flight.do("k", fetch)
+
+    assert asyncio.run(main()) == (1, 2)
+
+
+def test_errors_are_shared():
+    flight = SingleFlight("test_errors")
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(flight.do("k", fetch), flight.do("k", fetch), return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.calls == 1
+
+
+def test_cancelled_caller_does_not_cancel_flight():
+    flight = SingleFlight("test_cancel")
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(flight.do("k", fetch))
+        second = asyncio.create_task(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_wrap_keys_by_arguments():
+    flight = SingleFlight("test_wrap")
+    calls = []
+
+    @flight.wrap
+    async def fetch(code, part=1):
+        calls.append((code, part))
+        await asyncio.sleep(0.01)
+        return code
+
+    async def main():
+        await asyncio.gather(fetch("a"), fetch("a"), fetch("a", part=2))
+
+    asyncio.run(main())
+
+    assert calls == [("a", 1), ("a", 2)]
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils import stream
+from utils.chunk_cache import ChunkCache, chunk_cache
+from utils.stream import CHUNK_SIZE, RangeNotSatisfiable, Streamer, parse_range
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    (" bytes=0-0 ", (0, 0)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "bytes=-", "bytes=0-9,20-29", "items=0-9"])
+def test_parse_range_whole_file(header):
+    assert parse_range(header, SIZE) is None
+
+
+def test_parse_range_unknown_size():
+    assert parse_range("bytes=0-99", 0) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, SIZE)
+
+
+class Client:
+    is_connected = True
+
+
+def make_streamer(max_streams: int = 2) -> Streamer:
+    streamer = Streamer(b"secret", max_streams=max_streams)
+    streamer.client = Client()
+    return streamer
+
+
+def token(streamer: Streamer, size: int = SIZE) -> str:
+    body = f"file.{size}.{int(time.time()) + 60}"
+    return f"{body}.{streamer._signature(body)}"
+
+
+def test_verify():
+    streamer = make_streamer()
+
+    assert streamer.verify(token(streamer)) == ("file", SIZE)
+    assert streamer.verify(token(streamer)[:-1] + "x") is None
+    body = f"file.{SIZE}.{int(time.time()) - 1}"
+    assert streamer.verify(f"{body}.{streamer._signature(body)}") is None
+
+
+def test_slots_are_reserved_in_prepare():
+    streamer = make_streamer(max_streams=2)
+    bodies = [streamer.prepare(token(streamer), "a.mp4")[2] for _ in range(2)]
+
+    assert streamer.active == 2
+    assert streamer.prepare(token(streamer), "a.mp4")[0] == 503
+
+    # Closed without ever being read (HEAD, client gone before the first byte)
+    for body in bodies:
+        body.close()
+        body.close()
+    assert streamer.active == 0
+
+
+def test_unsatisfiable_range_releases_slot():
+    streamer = make_streamer()
+    status, headers, _ = streamer.prepare(token(streamer), "a.mp4", f"bytes={SIZE}-")
+
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{SIZE}"
+    assert streamer.active == 0
+
+
+class Transmitting(Client):
+    """Holds a transmission slot for the whole stream, like Pyrogram's get_file"""
+
+    def __init__(self, slots: int):
+        self.get_file_semaphore = asyncio.Semaphore(slots)
+
+    async def stream_media(self, file_id, limit=0, offset=0):
+        async with self.get_file_semaphore:
+            for index in range(offset, offset + limit):
+                await asyncio.sleep(0.001)
+                yield bytes([index]) * CHUNK_SIZE
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_streams_progress_concurrently(loop, monkeypatch):
+    monkeypatch.setattr(chunk_cache, "max_bytes", 0)
+    streamer = Streamer(b"secret", max_streams=2, buffer_chunks=1, read_timeout=2)
+    streamer.attach(Transmitting(slots=streamer.max_streams), loop)
+    link = token(streamer, size=8 * CHUNK_SIZE)
+
+    first = iter(streamer.prepare(link, "a.mp4")[2])
+    second = iter(streamer.prepare(link, "a.mp4")[2])
+
+    # With one transmission slot the second stream waits for the first to finish
+    assert next(first)[:1] == b"\x00"
+    assert next(second)[:1] == b"\x00"
+    assert next(first)[:1] == b"\x01"
+    assert streamer.errors == 0
+
+    first.close()
+    second.close()
+    assert streamer.active == 0
+
+
+class Stalled(Client):
+    async def stream_media(self, file_id, limit=0, offset=0):
+        await asyncio.sleep(60)
+        yield b""
+
+
+def test_read_timeout_cancels_pending_get(loop, monkeypatch):
+    monkeypatch.setattr(chunk_cache, "max_bytes", 0)
+    streamer = Streamer(b"secret", read_timeout=0.05)
+    streamer.attach(Stalled(), loop)
+
+    body = streamer.prepare(token(streamer), "a.mp4")[2]
+
+    assert list(body) == []
+    assert streamer.errors == 1
+    assert streamer.active == 0
+
+    async def pending():
+        await asyncio.sleep(0.05)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    assert asyncio.run_coroutine_threadsafe(pending(), loop).result(1) == []
+
+
+class Recording(Client):
+    """A file of 4 chunks, the last one short; records each stream_media call"""
+
+    def __init__(self):
+        self.reads = []
+
+    async def stream_media(self, file_id, limit=0, offset=0):
+        self.reads.append(offset)
+        for index in range(offset, offset + limit if limit else 4):
+            if index >= 4:
+                return
+            yield bytes([index]) * (CHUNK_SIZE if index < 3 else 10)
+
+
+def test_cache_misses_are_read_sequentially(tmp_path, monkeypatch):
+    cache = ChunkCache(str(tmp_path), 8 * CHUNK_SIZE)
+    monkeypatch.setattr(stream, "chunk_cache", cache)
+    monkeypatch.setattr(stream, "file_unique_id", lambda file_id: "uid")
+    streamer = make_streamer()
+    streamer.client = Recording()
+
+    async def download():
+        queue = asyncio.Queue()
+        await streamer._produce("file", 0, 0, queue)
+        chunks = []
+        while (chunk := queue.get_nowait()) is not None:
+            chunks.append(bytes(chunk))
+        return chunks
+
+    asyncio.run(cache.put("uid", 2, b"\x02" * CHUNK_SIZE))
+    chunks = asyncio.run(download())
+
+    # One read up to the cached chunk, one after it - not one per chunk
+    assert [c[:1] for c in chunks] == [b"\x00", b"\x01", b"\x02", b"\x03"]
+    assert len(chunks[3]) == 10
+    assert streamer.client.reads == [0, 3]
+    assert all(cache.contains("uid", index) for index in range(4))
+
+    # Written through - the next download is served from the cache
+    assert asyncio.run(download()) == chunks
+    assert streamer.client.reads == [0, 3]
@@ -0,0 +1,93 @@
+import asyncio
+
+from utils.cache import Restored, TTLCache
+from utils.warmstart import ENTRY, HEADER, MAGIC, SECTION, VERSION, WarmStart
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "warm.bin")
+    cache = TTLCache("test_warm_round_trip", ttl=60, persist=True)
+    cache.set("dune", {"title": "Dune", "year": 2021})
+    cache.set(("mid", 7), "dune")
+    cache.set("gone", "x", ttl=-1)
+
+    asyncio.run(WarmStart(path).save())
+    cache.clear()
+    loaded = WarmStart(path).load()
+
+    assert loaded["test_warm_round_trip"] == 2
+    assert "gone" not in cache
+    # Values stay encoded until they are read
+    assert type(cache._data["dune"][1]) is Restored
+    assert cache.get("dune") == {"title": "Dune", "year": 2021}
+    assert cache.get(("mid", 7)) == "dune"
+
+
+def test_live_entries_win(tmp_path):
+    path = str(tmp_path / "warm.bin")
+    cache = TTLCache("test_warm_live", ttl=60, persist=True)
+    cache.set("key", "old")
+
+    asyncio.run(WarmStart(path).save())
+    cache.set("key", "new")
+    WarmStart(path).load()
+
+    assert cache.get("key") == "new"
+
+
+def test_non_persistent_caches_are_skipped(tmp_path):
+    path = str(tmp_path / "warm.bin")
+    cache = TTLCache("test_warm_skip", ttl=60)
+    cache.set("key", "value")
+
+    asyncio.run(WarmStart(path).save())
+
+    assert "test_warm_skip" not in WarmStart(path).load()
+
+
+def test_file_layout(tmp_path):
+    path = tmp_path / "warm.bin"
+    TTLCache("test_warm_layout", ttl=60, persist=True).set("k", "v")
+
+    asyncio.run(WarmStart(str(path)).save())
+    data = path.read_bytes()
+
+    magic, version, _, sections = HEADER.unpack_from(data, 0)
+    assert (magic, version) == (MAGIC, VERSION)
+    names = []
+    pos = HEADER.size
+    for _ in range(sections):
+        name_len, count = SECTION.unpack_from(data, pos)
+        pos += SECTION.size
+        names.append(data[pos:pos + name_len].decode())
+        pos += name_len
+        for _ in range(count):
+            _, key_len, value_len = ENTRY.unpack_from(data, pos)
+            pos += ENTRY.size + key_len + value_len
+    assert pos == len(data)
+    assert "test_warm_layout" in names
+
+
+def test_unknown_format_is_ignored(tmp_path):
+    path = tmp_path / "warm.bin"
+    path.write_bytes(HEADER.pack(b"NOPE", VERSION, 0, 0))
+
+    assert WarmStart(str(path)).load() == {}
+
+
+def test_truncated_file_is_ignored(tmp_path):
+    path = tmp_path / "warm.bin"
+    cache = TTLCache("test_warm_truncated", ttl=60, persist=True)
+    cache.set("k", "v" * 100)
+    asyncio.run(WarmStart(str(path)).save())
+    path.write_bytes(path.read_bytes()[:-50])
+    cache.clear()
+
+    WarmStart(str(path)).load()
+
+    assert "k" not in cache
+
+
+def test_missing_file(tmp_path):
+    assert WarmStart(str(tmp_path / "missing.bin")).load() == {}
+    assert WarmStart("").load() == {}
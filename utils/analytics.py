@@ -0,0 +1,142 @@
+"""
+Analytics utility - buffered usage events flushed as hourly $inc counters
+"""
+import logging
+import time
+from collections import deque
+from pymongo.errors import AutoReconnect, BulkWriteError, NetworkTimeout
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Event -> counter field on the per-movie document
+MOVIE_FIELDS = {
+    "hit": "hits",
+    "view": "views",
+    "quality": "selections",
+    "redeem": "redeems"
+}
+
+# Event -> counter field on the per-query document
+QUERY_FIELDS = {
+    "search": "searches",
+    "miss": "misses"
+}
+
+# Failures worth retrying on the next flush (failover, network) - anything else is dropped
+TRANSIENT_ERRORS = (AutoReconnect, NetworkTimeout)
+# The same for single write errors inside a bulk result (host/network errors,
+# primary stepped down or shutting down, time limit exceeded)
+TRANSIENT_CODES = {6, 7, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+# Flushes a counter is retried in before it is dropped
+MAX_RETRIES = 5
+
+
+class Analytics:
+    def __init__(self, size: int = 50000):
+        self.buffer = deque(maxlen=size)
+        self.dropped = 0
+        # Counters a failed flush couldn't write, retried with the next one
+        self.unwritten = {"movies": {}, "queries": {}}
+        self.retries = {"movies": {}, "queries": {}}
+
+    def track(self, event: str, code: str = None, query: str = None, quality: str = None):
+        """Record an event (no I/O - safe to call from any handler)"""
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append((time.time(), event, code, query, quality))
+
+    async def flush(self):
+        """Aggregate buffered events and write them as counter increments"""
+        if not self.buffer and not any(self.unwritten.values()):
+            return
+
+        # Swap buffers so new events keep landing while we write
+        events, self.buffer = self.buffer, deque(maxlen=self.buffer.maxlen)
+
+        # Start from whatever the last flush couldn't write
+        movies, queries = self.unwritten["movies"], self.unwritten["queries"]
+        retries = self.retries
+        self.unwritten = {"movies": {}, "queries": {}}
+        self.retries = {"movies": {}, "queries": {}}
+
+        for ts, event, code, query, quality in events:
+            hour = int(ts // 3600) * 3600
+
+            if code and event in MOVIE_FIELDS:
+                inc = movies.setdefault((code, hour), {})
+                field = MOVIE_FIELDS[event]
+                inc[field] = inc.get(field, 0) + 1
+                if quality and event == "quality":
+                    q_field = f"qualities.{quality}"
+                    inc[q_field] = inc.get(q_field, 0) + 1
+
+            if query and event in QUERY_FIELDS:
+                inc = queries.setdefault((query[:64], hour), {})
+                field = QUERY_FIELDS[event]
+                inc[field] = inc.get(field, 0) + 1
+
+        written = await self._write("movies", db.inc_movie_stats, movies, retries["movies"])
+        written &= await self._write("queries", db.inc_query_stats, queries, retries["queries"])
+        if written:
+            logger.debug(f"Analytics flushed {len(events)} events")
+
+    async def _write(self, kind: str, write, counters: dict, retries: dict) -> bool:
+        """Write one counter collection; keeps transient failures for the next flush"""
+        try:
+            await write(counters)
+            return True
+        except BulkWriteError as e:
+            # Unordered bulk - everything but the failed ops was applied
+            keys = list(counters)
+            errors = e.details.get("writeErrors", [])
+            transient = {keys[err["index"]] for err in errors if err.get("code") in TRANSIENT_CODES}
+            failed = {keys[err["index"]] for err in errors} - transient
+            self._keep(kind, {key: counters[key] for key in transient}, retries)
+            self._drop({key: counters[key] for key in failed})
+            logger.error(
+                f"Analytics flush error ({kind}): {len(transient) + len(failed)} of {len(keys)} "
+                f"counters failed, {len(failed)} dropped"
+            )
+        except TRANSIENT_ERRORS as e:
+            self._keep(kind, counters, retries)
+            logger.error(f"Analytics flush error ({kind}), retrying next flush: {e}")
+        except Exception as e:
+            self._drop(counters)
+            logger.error(f"Analytics flush error ({kind}), {len(counters)} counters dropped: {e}")
+        return False
+
+    def _drop(self, counters: dict):
+        self.dropped += sum(sum(inc.values()) for inc in counters.values())
+
+    def _keep(self, kind: str, counters: dict, retries: dict):
+        """Merge counters into the next flush, for up to MAX_RETRIES flushes and the buffer size in keys"""
+        target = self.unwritten[kind]
+        given_up = 0
+        for key, inc in counters.items():
+            attempt = retries.get(key, 0) + 1
+            if attempt > MAX_RETRIES:
+                given_up += 1
+                self.dropped += sum(inc.values())
+                continue
+            if key not in target and len(target) >= self.buffer.maxlen:
+                self.dropped += sum(inc.values())
+                continue
+            self.retries[kind][key] = attempt
+            merged = target.setdefault(key, {})
+            for field, count in inc.items():
+                merged[field] = merged.get(field, 0) + count
+        if given_up:
+            logger.error(f"Analytics: {given_up} {kind} counters dropped after {MAX_RETRIES} retries")
+
+    def snapshot(self) -> dict:
+        return {
+            "buffered": len(self.buffer),
+            "capacity": self.buffer.maxlen,
+            "unwritten": len(self.unwritten["movies"]) + len(self.unwritten["queries"]),
+            "dropped": self.dropped
+        }
+
+
+# Global instance
+analytics = Analytics()
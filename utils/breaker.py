@@ -0,0 +1,131 @@
+"""
+Breaker utility - circuit breakers with timeout budgets per dependency
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# All breakers by name (exported via /breakers and /metrics)
+breakers = {}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency that is known to be down"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 10,
+                 window: float = 60, open_for: float = 30, timeout: float = None,
+                 excluded: tuple = (), ignored: tuple = ()):
+        """
+        Opens when at least `min_calls` calls in the last `window` seconds
+        failed at `failure_rate` or more. After `open_for` seconds one probe
+        call is let through (half-open) - success closes it, failure re-opens.
+        `timeout` is the per-call budget, `excluded` exceptions are normal
+        answers (e.g. 400s) and don't count as failures. `ignored` exceptions
+        say nothing about the dependency (e.g. our own limiter shedding the
+        call before it was made) and aren't recorded at all.
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_for = open_for
+        self.timeout = timeout
+        self.excluded = excluded
+        self.ignored = ignored
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._probing = False
+        self._results = deque()
+        breakers[name] = self
+
+    def _before(self):
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.open_for:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpen(f"{self.name} circuit is open")
+
+    def _record(self, ok: bool):
+        now = time.monotonic()
+
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                self.state = CLOSED
+                self._results.clear()
+                logger.info(f"✅ Circuit {self.name} closed")
+            else:
+                self._open(now)
+            return
+
+        self._results.append((now, ok))
+        while self._results and now - self._results[0][0] > self.window:
+            self._results.popleft()
+
+        if len(self._results) >= self.min_calls:
+            failures = sum(1 for _, good in self._results if not good)
+            if failures / len(self._results) >= self.failure_rate:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._results.clear()
+        logger.warning(f"⚠️ Circuit {self.name} opened for {self.open_for}s")
+
+    async def call(self, func, *args, **kwargs):
+        """Call func under the breaker, raises CircuitOpen when failing fast"""
+        self._before()
+        recorded = False
+        try:
+            if self.timeout:
+                result = await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+            else:
+                result = await func(*args, **kwargs)
+        except self.ignored:
+            raise
+        except self.excluded:
+            self._record(True)
+            recorded = True
+            raise
+        except Exception:
+            self._record(False)
+            recorded = True
+            raise
+        else:
+            self._record(True)
+            recorded = True
+            return result
+        finally:
+            # Cancelled mid-probe - let the next call probe instead
+            if not recorded and self.state == HALF_OPEN:
+                self._probing = False
+
+    def snapshot(self) -> dict:
+        failures = sum(1 for _, good in self._results if not good)
+        return {
+            "state": self.state,
+            "calls": len(self._results),
+            "failures": failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_in": max(0, int(self.opened_at + self.open_for - time.monotonic())) if self.state == OPEN else 0
+        }
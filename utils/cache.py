@@ -0,0 +1,122 @@
+"""
+Cache utility - small in-process TTL caches with a shared registry
+"""
+import pickle
+import time
+from collections import OrderedDict
+
+# All caches by name (used by maintenance jobs and admin commands)
+caches = {}
+
+
+class Restored:
+    """Value still encoded in a warm-start snapshot (utils.warmstart), decoded on first read"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        return pickle.loads(self.data)
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, max_size: int = 1000, persist: bool = False):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        # Included in warm-start snapshots (values must be picklable)
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self.restored = 0
+        self._data = OrderedDict()
+        caches[name] = self
+
+    def __contains__(self, key) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None or item[0] <= time.monotonic():
+            self.misses += 1
+            return default
+        value = item[1]
+        if type(value) is Restored:
+            try:
+                value = value.load()
+            except Exception:
+                # Unreadable snapshot entry - treat as a miss
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data[key] = (item[0], value)
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        return item[1].load() if type(item[1]) is Restored else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def keys(self) -> list:
+        return list(self._data)
+
+    def expire(self) -> int:
+        """Drop expired entries, returns how many were removed"""
+        now = time.monotonic()
+        expired = [k for k, (expires, _) in self._data.items() if expires <= now]
+        for k in expired:
+            del self._data[k]
+        return len(expired)
+
+    def dump(self) -> list:
+        """Live entries as (wall-clock expiry, key, value) - value may still be Restored"""
+        now, wall = time.monotonic(), time.time()
+        return [
+            (wall + expires - now, key, value)
+            for key, (expires, value) in list(self._data.items())
+            if expires > now
+        ]
+
+    def restore(self, entries: list) -> int:
+        """Add snapshot entries (wall-clock expiry, key, Restored) behind the live ones"""
+        now, wall = time.monotonic(), time.time()
+        added = 0
+        # Oldest first in the dump - walk it backwards so LRU order survives
+        for expires_at, key, value in reversed(entries):
+            if expires_at <= wall or key in self._data:
+                continue
+            self._data[key] = (now + expires_at - wall, value)
+            self._data.move_to_end(key, last=False)
+            added += 1
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        self.restored += added
+        return added
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "restored": self.restored
+        }
@@ -0,0 +1,148 @@
+"""
+Chunk cache utility - 1 MiB download chunks on local disk, shared by all downloads
+
+Chunks are keyed by (file unique id, chunk index) so every file_id variant of
+the same file hits the same entries:
+    <directory>/<file unique id>/<chunk index>
+
+Hits are memory-mapped and written to the socket straight from the page
+cache. Misses are filled by the download that ran into them (utils.stream
+reads a run of misses with one sequential Telegram read and writes the
+chunks through with put() as they arrive). When the cache is over its size,
+eviction looks at the least recently used entries and drops the one read
+the fewest times (counts are halved as they age, so yesterday's hit doesn't
+stay pinned).
+"""
+import asyncio
+import itertools
+import logging
+import mmap
+import os
+from collections import OrderedDict
+from pyrogram.file_id import FileId, FileUniqueId, FileUniqueType
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Least recently used entries compared on each eviction
+EVICT_SAMPLE = 8
+
+
+def file_unique_id(file_id: str) -> str:
+    """Stable id of the file behind a file_id (documents and videos)"""
+    media_id = FileId.decode(file_id).media_id
+    return FileUniqueId(file_unique_type=FileUniqueType.DOCUMENT, media_id=media_id).encode()
+
+
+class ChunkCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = OrderedDict()     # (uid, index) -> [size, reads]
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: tuple) -> str:
+        return os.path.join(self.directory, key[0], str(key[1]))
+
+    def load(self):
+        """Index chunks left on disk by the previous process"""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return
+        for uid in os.listdir(self.directory):
+            folder = os.path.join(self.directory, uid)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.isdigit():
+                    # Leftover temp file from an interrupted write
+                    os.unlink(os.path.join(folder, name))
+                    continue
+                size = os.path.getsize(os.path.join(folder, name))
+                self._index[(uid, int(name))] = [size, 0]
+                self.used += size
+        self._evict()
+        logger.info(f"✅ Chunk cache: {len(self._index)} chunks, {self.used // (1024 * 1024)} MB")
+
+    def contains(self, uid: str, index: int) -> bool:
+        return (uid, index) in self._index
+
+    def open(self, uid: str, index: int):
+        """Memory-map a cached chunk (None on a miss)"""
+        key = (uid, index)
+        entry = self._index.get(key)
+        if entry is not None:
+            try:
+                with open(self._path(key), "rb") as f:
+                    chunk = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                self._drop(key)
+            else:
+                entry[1] += 1
+                self._index.move_to_end(key)
+                self.hits += 1
+                return chunk
+        self.misses += 1
+        return None
+
+    async def put(self, uid: str, index: int, data: bytes):
+        """Store a chunk read from Telegram (write errors are logged, not raised)"""
+        key = (uid, index)
+        if not data or key in self._index:
+            return
+        try:
+            await asyncio.to_thread(self._write, key, data)
+        except OSError as e:
+            logger.warning(f"Chunk cache write failed: {e}")
+            return
+        self._index[key] = [len(data), 1]
+        self.used += len(data)
+        self._evict()
+
+    def _write(self, key: tuple, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _drop(self, key: tuple):
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        self.used -= entry[0]
+        try:
+            # Open maps of this chunk stay valid until they are closed
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.used > self.max_bytes and self._index:
+            candidates = list(itertools.islice(self._index.items(), EVICT_SAMPLE))
+            key = min(candidates, key=lambda item: item[1][1])[0]
+            for _, entry in candidates:
+                entry[1] //= 2
+            self._drop(key)
+            self.evictions += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "chunks": len(self._index),
+            "mb": round(self.used / (1024 * 1024), 1),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+# Global instance (CHUNK_CACHE_MB = 0 turns it off)
+chunk_cache = ChunkCache(Config.CHUNK_CACHE_DIR, Config.CHUNK_CACHE_MB * 1024 * 1024)
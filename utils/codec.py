@@ -0,0 +1,153 @@
+"""
+Codec utility - compact binary payloads for deep links and callback data
+
+Layout (base64url, no padding):
+    version | kind | movie ref | part (varint) | quality | token (raw bytes)
+
+Movie ref is a varint: numeric movie id (mid << 1), or a length-prefixed
+code ((len << 1) | 1) for movies that don't have an id yet.
+Telegram allows 64 chars for both start parameters and callback_data.
+"""
+import base64
+from collections import namedtuple
+from functools import lru_cache
+
+VERSION = 1
+MAX_LENGTH = 64
+
+# Payload kinds
+KIND_START = 0
+KIND_MOVIE = 1
+KIND_PART = 2
+KIND_QUALITY = 3
+KIND_BACKQ = 4
+
+# Quality enum - APPEND ONLY, index is stored in old links
+QUALITY_OPTIONS = ["360p", "480p", "720p", "1080p", "1440p", "2160p", "4K"]
+QUALITY_INDEX = {q: i for i, q in enumerate(QUALITY_OPTIONS)}
+QUALITY_RAW = 0xFF
+
+# Old text callback prefixes -> kind
+LEGACY_CALLBACKS = {
+    "movie": KIND_MOVIE,
+    "part": KIND_PART,
+    "quality": KIND_QUALITY,
+    "backq": KIND_BACKQ
+}
+
+Payload = namedtuple("Payload", ["kind", "ref", "part", "quality", "token"])
+
+
+def movie_ref(movie: dict):
+    """Numeric id if the movie has one, else its code"""
+    return movie.get("mid") or movie["code"]
+
+
+def _write_varint(out: bytearray, n: int):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def encode(kind: int, ref, part: int = 1, quality: str = "", token: str = "") -> str:
+    """Pack a payload, raises ValueError if it won't fit Telegram's limit"""
+    out = bytearray((VERSION, kind))
+
+    if isinstance(ref, int):
+        _write_varint(out, ref << 1)
+    else:
+        raw = ref.encode()
+        _write_varint(out, (len(raw) << 1) | 1)
+        out += raw
+
+    _write_varint(out, part)
+
+    if not quality:
+        out.append(0)
+    elif quality in QUALITY_INDEX:
+        out.append(QUALITY_INDEX[quality] + 1)
+    else:
+        raw = quality.encode()
+        out += bytes((QUALITY_RAW, len(raw)))
+        out += raw
+
+    if token:
+        out += base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+
+    text = base64.urlsafe_b64encode(bytes(out)).decode().rstrip("=")
+    if len(text) > MAX_LENGTH:
+        raise ValueError(f"Payload too long ({len(text)} chars)")
+    return text
+
+
+@lru_cache(maxsize=4096)
+def decode(text: str):
+    """Unpack a payload, returns None if it isn't one of ours"""
+    try:
+        data = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+        if len(data) < 2 or data[0] != VERSION:
+            return None
+
+        kind = data[1]
+        n, pos = _read_varint(data, 2)
+        if n & 1:
+            end = pos + (n >> 1)
+            ref = data[pos:end].decode()
+            pos = end
+        else:
+            ref = n >> 1
+
+        part, pos = _read_varint(data, pos)
+
+        q = data[pos]
+        pos += 1
+        if q == 0:
+            quality = ""
+        elif q == QUALITY_RAW:
+            end = pos + 1 + data[pos]
+            quality = data[pos + 1:end].decode()
+            pos = end
+        else:
+            quality = QUALITY_OPTIONS[q - 1]
+
+        token = base64.urlsafe_b64encode(data[pos:]).decode().rstrip("=") if pos < len(data) else ""
+
+        return Payload(kind, ref, part or 1, quality, token)
+    except Exception:
+        return None
+
+
+def encode_callback(kind: int, ref, part: int = 1, quality: str = "") -> str:
+    """Pack callback_data for an inline button"""
+    return encode(kind, ref, part, quality)
+
+
+def decode_callback(data) -> Payload:
+    """Unpack callback_data - new binary format or old 'kind:code:part:quality' text"""
+    if not isinstance(data, str):
+        return None
+
+    if ":" not in data:
+        return decode(data)
+
+    fields = data.split(":")
+    kind = LEGACY_CALLBACKS.get(fields[0])
+    if kind is None:
+        return None
+
+    code = fields[1] if len(fields) > 1 else ""
+    part = int(fields[2]) if len(fields) > 2 and fields[2].isdigit() else 1
+    quality = fields[3] if len(fields) > 3 else ""
+    return Payload(kind, code, part, quality, "")
@@ -0,0 +1,253 @@
+"""
+DB monitor utility - Mongo command latency histograms, slow-command log and sampled explains
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import deque
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in ms (last bucket is everything above)
+BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+# Handshake / housekeeping commands not worth tracking
+IGNORED = {"hello", "ismaster", "isMaster", "ping", "endSessions", "explain", "saslStart", "saslContinue"}
+
+# Commands `explain` accepts
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Driver-added fields that explain rejects
+_SESSION_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "readConcern", "writeConcern"}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.failed = 0
+
+    def add(self, ms: float, ok: bool = True):
+        self.counts[bisect.bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        if not ok:
+            self.failed += 1
+
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.failed += other.failed
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (capped at the max seen)"""
+        if not self.count:
+            return 0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= self.count * p:
+                return min(BUCKETS[i], round(self.max, 1)) if i < len(BUCKETS) else round(self.max, 1)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "failed": self.failed,
+            "avg_ms": round(self.total / self.count, 1) if self.count else 0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max, 1)
+        }
+
+
+def _collection(event) -> str:
+    if event.command_name == "getMore":
+        return event.command.get("collection", "")
+    value = event.command.get(event.command_name)
+    return value if isinstance(value, str) else ""
+
+
+def _shape(spec) -> dict:
+    """Query shape without values: {"name": {"$regex": ...}} -> {"name": {"$regex": "?"}}"""
+    if isinstance(spec, dict):
+        return {k: _shape(v) for k, v in spec.items()}
+    if isinstance(spec, list):
+        return [_shape(v) for v in spec[:3]]
+    return "?"
+
+
+def _filter(command: dict) -> dict:
+    """The query part of a command, wherever that command keeps it"""
+    if "filter" in command:
+        return command["filter"]
+    if "query" in command:
+        return command["query"]
+    for key in ("updates", "deletes"):
+        if command.get(key):
+            return command[key][0].get("q", {})
+    for stage in command.get("pipeline", [])[:1]:
+        return stage.get("$match", {})
+    return {}
+
+
+def _plan_stages(plan: dict) -> list:
+    stages = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def _winning_plan(result: dict) -> dict:
+    if "queryPlanner" in result:
+        return result["queryPlanner"].get("winningPlan", {})
+    # aggregate: plan of the first $cursor stage
+    for stage in result.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"].get("queryPlanner", {}).get("winningPlan", {})
+    return {}
+
+
+class CommandMonitor(monitoring.CommandListener):
+    def __init__(self, slow_ms: float = 100, explain_rate: float = 0.0, keep: int = 50):
+        """
+        `slow_ms` - commands slower than this are logged and kept for /dbstats
+        `explain_rate` - fraction of slow reads queued for an explain (0 disables)
+        """
+        self.slow_ms = slow_ms
+        self.explain_rate = explain_rate
+
+        # Events arrive on the driver's threads
+        self._lock = threading.Lock()
+        self._started = {}
+        self.histograms = {}                  # (collection, command) -> Histogram
+        self.slow = deque(maxlen=keep)
+        self.explains = deque(maxlen=keep)
+        self._to_explain = deque(maxlen=keep)
+
+    # ======================
+    # LISTENER
+    # ======================
+
+    def started(self, event):
+        if event.command_name in IGNORED:
+            return
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (
+                _collection(event),
+                event.command if event.command_name in EXPLAINABLE else None
+            )
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+    def _finish(self, event, ok: bool):
+        with self._lock:
+            started = self._started.pop((event.connection_id, event.request_id), None)
+            if started is None:
+                return
+            collection, command = started
+            ms = event.duration_micros / 1000
+
+            key = (collection, event.command_name)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].add(ms, ok)
+
+            if ms < self.slow_ms:
+                return
+
+            spec = _filter(command) if command else {}
+            self.slow.append({
+                "at": int(time.time()),
+                "database": event.database_name,
+                "collection": collection,
+                "command": event.command_name,
+                "ms": round(ms, 1),
+                "shape": _shape(spec)
+            })
+
+            if command is not None and self.explain_rate and random.random() < self.explain_rate:
+                clean = {k: v for k, v in command.items() if k not in _SESSION_FIELDS}
+                self._to_explain.append((event.database_name, collection, ms, clean))
+
+        logger.warning(
+            "slow mongo command",
+            extra={"fields": {"cmd": event.command_name, "coll": collection, "ms": round(ms, 1), "ok": ok}}
+        )
+
+    # ======================
+    # EXPLAIN
+    # ======================
+
+    async def run_explains(self, client) -> int:
+        """Explain the queued slow commands on `client` (runs off the listener thread)"""
+        done = 0
+        while self._to_explain:
+            database, collection, ms, command = self._to_explain.popleft()
+            try:
+                result = await client[database].command({"explain": command, "verbosity": "queryPlanner"})
+            except Exception as e:
+                logger.debug(f"explain failed for {collection}: {e}")
+                continue
+
+            stages = _plan_stages(_winning_plan(result))
+            entry = {
+                "at": int(time.time()),
+                "collection": collection,
+                "command": next(iter(command)),
+                "ms": round(ms, 1),
+                "plan": " > ".join(s for s in stages if s),
+                "collscan": "COLLSCAN" in stages
+            }
+            self.explains.append(entry)
+            if entry["collscan"]:
+                logger.warning(
+                    "collection scan",
+                    extra={"fields": {"coll": collection, "cmd": entry["command"], "ms": entry["ms"]}}
+                )
+            done += 1
+        return done
+
+    # ======================
+    # REPORTING
+    # ======================
+
+    def by_command(self) -> dict:
+        return self._group(lambda key: key[1])
+
+    def by_collection(self) -> dict:
+        return self._group(lambda key: key[0] or "-")
+
+    def _group(self, pick) -> dict:
+        grouped = {}
+        with self._lock:
+            for key, hist in self.histograms.items():
+                name = pick(key)
+                if name not in grouped:
+                    grouped[name] = Histogram()
+                grouped[name].merge(hist)
+        return {name: hist.snapshot() for name, hist in grouped.items()}
+
+    def snapshot(self) -> dict:
+        return {
+            "commands": self.by_command(),
+            "collections": self.by_collection(),
+            "slow": list(self.slow)[-10:],
+            "explains": list(self.explains)[-10:]
+        }
@@ -0,0 +1,129 @@
+"""
+Deadline utility - per-update time budget for running independent steps concurrently
+
+    async with Budget("start", 5) as budget:
+        budget.run("info", get_movie_info(title), optional=True)
+        budget.run("movie", db.get_movie(ref))
+        if not await budget.get("subscription", check_subscription(bot, user_id)):
+            return
+        movie = await budget.get("movie")
+
+Required steps are awaited to completion; finishing after the deadline is
+recorded as an overrun. Optional steps get whatever budget is left when
+the handler is done and are cancelled past it. Steps that were started but
+never needed are cancelled.
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Per-handler step stats (exported via /metrics)
+budgets = {}
+
+
+class BudgetStats:
+    def __init__(self):
+        self.runs = 0
+        self.overruns = 0
+        self.steps = {}
+
+    def step(self, name: str) -> dict:
+        if name not in self.steps:
+            self.steps[name] = {"count": 0, "overruns": 0, "cancelled": 0, "total_ms": 0.0}
+        return self.steps[name]
+
+    def snapshot(self) -> dict:
+        return {
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "steps": {
+                name: {
+                    "count": s["count"],
+                    "overruns": s["overruns"],
+                    "cancelled": s["cancelled"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 1) if s["count"] else 0
+                }
+                for name, s in self.steps.items()
+            }
+        }
+
+
+class Budget:
+    def __init__(self, name: str, seconds: float):
+        self.name = name
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds
+        self.stats = budgets.setdefault(name, BudgetStats())
+        self._tasks = {}        # step -> (task, optional)
+        self._overrun = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def run(self, step: str, coro, optional: bool = False) -> asyncio.Task:
+        """Start a step now, concurrently with the rest of the handler"""
+        task = asyncio.create_task(self._timed(step, coro))
+        # Cancelled before it started - close the step so it isn't reported as never awaited
+        task.add_done_callback(lambda _: coro.close())
+        self._tasks[step] = (task, optional)
+        return task
+
+    async def _timed(self, step: str, coro):
+        started = time.monotonic()
+        try:
+            result = await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record(step, started)
+            raise
+        self._record(step, started)
+        return result
+
+    def _record(self, step: str, started: float):
+        stats = self.stats.step(step)
+        stats["count"] += 1
+        stats["total_ms"] += (time.monotonic() - started) * 1000
+        if time.monotonic() > self.deadline:
+            stats["overruns"] += 1
+            self._overrun.append(step)
+
+    async def get(self, step: str, coro=None):
+        """Result of a step (starting it first when `coro` is given)"""
+        if coro is not None:
+            self.run(step, coro)
+        return await self._tasks[step][0]
+
+    async def close(self):
+        """Give optional steps the remaining budget, cancel everything else still running"""
+        optional = [task for task, opt in self._tasks.values() if opt and not task.done()]
+        if optional:
+            await asyncio.wait(optional, timeout=self.remaining())
+
+        for step, (task, opt) in self._tasks.items():
+            if not task.done():
+                task.cancel()
+                self.stats.step(step)["cancelled"] += 1
+            elif not task.cancelled() and task.exception() is not None and opt:
+                logger.warning(f"Optional step {self.name}.{step} failed: {task.exception()}")
+
+        self.stats.runs += 1
+        if self._overrun:
+            self.stats.overruns += 1
+            logger.info(
+                "budget overrun",
+                extra={"fields": {
+                    "handler": self.name,
+                    "steps": ",".join(self._overrun),
+                    "ms": int((time.monotonic() - self.started) * 1000)
+                }}
+            )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,143 @@
+"""
+Leader utility - Mongo lease leader election with heartbeats and fencing tokens
+
+One document per lease: {_id, holder, token, expires_at}. The holder renews
+it every `heartbeat` seconds; anyone may take it over once it has expired,
+which bumps `token`. Singleton work runs only while `is_leader` is true and
+passes `token` along so writes from a deposed leader can be rejected.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    def __init__(self, name: str = "leader", ttl: float = 30, heartbeat: float = 10):
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.instance_id = f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(3)}"
+
+        self.collection = None
+        self.token = 0
+        self.holder = None
+        self.elections = 0
+        self.step_downs = 0
+        self._valid_until = 0.0
+        self._task = None
+
+    @property
+    def is_leader(self) -> bool:
+        # Trust the lease only until ttl - heartbeat after the last successful renewal
+        # started, so a clock skew of up to `heartbeat` can't give two leaders
+        return self.token > 0 and time.monotonic() < self._valid_until
+
+    async def start(self, collection):
+        """Run the first election, then keep heartbeating in the background"""
+        self.collection = collection
+        await self._beat()
+        self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            await self._beat()
+
+    async def _beat(self):
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        try:
+            if self.token:
+                doc = await self.collection.find_one_and_update(
+                    {"_id": self.name, "holder": self.instance_id, "token": self.token},
+                    {"$set": {"expires_at": expires_at}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if doc:
+                    self._valid_until = started + self.ttl - self.heartbeat
+                    return
+                self._step_down("lease taken over")
+
+            try:
+                doc = await self.collection.find_one_and_update(
+                    {"_id": self.name, "expires_at": {"$lt": now}},
+                    {
+                        "$set": {"holder": self.instance_id, "expires_at": expires_at, "acquired_at": now},
+                        "$inc": {"token": 1}
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Lease exists and hasn't expired - someone else leads
+                current = await self.collection.find_one({"_id": self.name}, {"holder": 1})
+                self.holder = current["holder"] if current else None
+                return
+
+            self.token = doc["token"]
+            self.holder = self.instance_id
+            self._valid_until = started + self.ttl - self.heartbeat
+            self.elections += 1
+            logger.info(f"👑 Became leader ({self.instance_id}, token {self.token})")
+
+        except Exception as e:
+            logger.warning(f"Leader heartbeat failed: {e}")
+            if self.token and not self.is_leader:
+                self._step_down("lease not renewed in time")
+
+    def _step_down(self, reason: str):
+        logger.warning(f"👋 Leadership lost: {reason}")
+        self.token = 0
+        self.holder = None
+        self._valid_until = 0.0
+        self.step_downs += 1
+
+    async def check(self) -> bool:
+        """Confirm with Mongo that our fencing token is still current (before singleton writes)"""
+        if not self.is_leader:
+            return False
+        doc = await self.collection.find_one({"_id": self.name}, {"holder": 1, "token": 1})
+        if not doc or doc["holder"] != self.instance_id or doc["token"] != self.token:
+            self._step_down("fencing token is stale")
+            return False
+        return True
+
+    async def stop(self):
+        """Stop heartbeating and release the lease so another replica takes over at once"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.token and self.collection is not None:
+            try:
+                await self.collection.update_one(
+                    {"_id": self.name, "holder": self.instance_id, "token": self.token},
+                    {"$set": {"expires_at": datetime.now(timezone.utc)}}
+                )
+            except Exception as e:
+                logger.warning(f"Lease release failed: {e}")
+        self.token = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "instance": self.instance_id,
+            "leader": self.is_leader,
+            "holder": self.holder,
+            "token": self.token,
+            "elections": self.elections,
+            "step_downs": self.step_downs
+        }
+
+
+# Global instance
+leader = LeaderElection(ttl=Config.LEADER_TTL, heartbeat=Config.LEADER_HEARTBEAT)
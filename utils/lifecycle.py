@@ -0,0 +1,137 @@
+"""
+Lifecycle utility - in-flight update tracking and graceful shutdown
+"""
+import asyncio
+import functools
+import logging
+import time
+from pyrogram.types import CallbackQuery, Message
+from utils.limiter import LimiterRejected
+
+logger = logging.getLogger(__name__)
+
+# Sent to updates that arrive while draining (the client is still connected)
+RESTARTING_TEXT = "🔄 Restarting, try again in a moment."
+# Sent when a limiter sheds the update's work (queue full / waited past its deadline)
+BUSY_TEXT = "⏳ Busy right now, try again in a moment."
+
+
+class Lifecycle:
+    def __init__(self):
+        self.accepting = True
+        self.inflight = 0
+        self.dropped = 0
+        self._drained = False
+        self._idle = None
+        self._hooks = []
+
+    def track(self, func=None, notify: bool = True):
+        """
+        Decorator for handlers - counts in-flight updates, turns new ones away while stopping
+        and answers "busy" when a limiter sheds the update's work
+        notify=False skips those replies (for side handlers like recording)
+        """
+        if func is None:
+            return functools.partial(self.track, notify=notify)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not self.accepting:
+                self.dropped += 1
+                if notify:
+                    await self._reply(args, RESTARTING_TEXT)
+                return
+
+            self._enter()
+            try:
+                return await func(*args, **kwargs)
+            except LimiterRejected as e:
+                logger.info(f"Update shed: {e}")
+                if notify:
+                    await self._reply(args, BUSY_TEXT)
+            finally:
+                self._exit()
+
+        return wrapper
+
+    def _enter(self):
+        self.inflight += 1
+        self._get_idle().clear()
+
+    def _exit(self):
+        self.inflight -= 1
+        if self.inflight == 0:
+            self._get_idle().set()
+
+    async def _reply(self, args: tuple, text: str):
+        """Answer an update we couldn't handle, so messages get a reply and button spinners stop"""
+        update = args[1] if len(args) > 1 else None
+        try:
+            if isinstance(update, CallbackQuery):
+                await update.answer(text)
+            elif isinstance(update, Message):
+                await update.reply_text(text)
+        except Exception as e:
+            logger.debug(f"Turn-away reply failed: {e}")
+
+    def spawn(self, coro) -> asyncio.Task:
+        """
+        Run a background task that counts as in-flight work (drained on shutdown)
+        Counted right away, so work spawned by handlers still draining is drained too
+        """
+        if self._drained:
+            # Cleanup hooks are running - too late to start anything
+            coro.close()
+            self.dropped += 1
+            return None
+
+        self._enter()
+
+        async def runner():
+            try:
+                await coro
+            except Exception as e:
+                logger.error(f"Background task error: {e}")
+            finally:
+                self._exit()
+
+        return asyncio.create_task(runner())
+
+    def on_shutdown(self, name: str, callback):
+        """Register an async cleanup hook (runs in registration order)"""
+        self._hooks.append((name, callback))
+
+    def _get_idle(self) -> asyncio.Event:
+        # Created lazily so it binds to the bot thread's loop
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            if self.inflight == 0:
+                self._idle.set()
+        return self._idle
+
+    async def shutdown(self, timeout: float):
+        """Stop accepting updates, drain in-flight handlers, then run cleanup hooks"""
+        self.accepting = False
+        started = time.monotonic()
+
+        logger.info(f"🛑 Shutting down: {self.inflight} update(s) in flight")
+
+        try:
+            await asyncio.wait_for(self._get_idle().wait(), timeout=timeout)
+            logger.info(f"✅ Drained in {time.monotonic() - started:.1f}s")
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Drain deadline hit, {self.inflight} update(s) abandoned")
+        self._drained = True
+
+        for name, callback in self._hooks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Shutdown hook {name} error: {e}")
+
+        if self.dropped:
+            logger.info(f"Dropped {self.dropped} update(s) received during shutdown")
+
+
+# Global instance
+lifecycle = Lifecycle()
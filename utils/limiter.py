@@ -0,0 +1,127 @@
+"""
+Limiter utility - adaptive (AIMD) concurrency limits per dependency
+"""
+import asyncio
+import functools
+import time
+from collections import deque
+
+# All limiters by name (exported via /limits and /metrics)
+limiters = {}
+
+
+class LimiterRejected(Exception):
+    """Raised when a call waited past its deadline or the queue is full"""
+
+
+class AdaptiveLimiter:
+    def __init__(self, name: str, initial: int = 20, min_limit: int = 2, max_limit: int = 200,
+                 target_latency: float = 0.25, queue_timeout: float = 2.0, max_queue: int = 1000):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+
+        self.inflight = 0
+        self.waiters = deque()
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self._last_decrease = 0.0
+        limiters[name] = self
+
+    async def acquire(self, timeout: float = None):
+        """Wait for a slot, raises LimiterRejected past the deadline"""
+        if self.inflight < int(self.limit) and not self.waiters:
+            self.inflight += 1
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LimiterRejected(f"{self.name}: queue full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append(fut)
+        try:
+            # The releasing call hands its slot over (inflight stays counted)
+            await asyncio.wait_for(fut, timeout if timeout is not None else self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(fut)
+            self.rejected += 1
+            raise LimiterRejected(f"{self.name}: deadline exceeded")
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed over just before we got cancelled - give it back
+                self.inflight -= 1
+                self._wake()
+            else:
+                self._discard(fut)
+            raise
+
+    def _discard(self, fut):
+        try:
+            self.waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def _wake(self):
+        while self.waiters and self.inflight < int(self.limit):
+            fut = self.waiters.popleft()
+            if not fut.done():
+                self.inflight += 1
+                fut.set_result(None)
+
+    def release(self, latency: float, ok: bool):
+        """Free a slot and adapt the limit"""
+        self.inflight -= 1
+
+        if ok and latency <= self.target_latency:
+            # Additive increase: about +1 per full window of good calls
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            # Multiplicative decrease, at most once per target latency
+            now = time.monotonic()
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+                self._last_decrease = now
+
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+        self._wake()
+
+    async def call(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) under the limit"""
+        await self.acquire()
+        started = time.monotonic()
+        ok = False
+        try:
+            result = await func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self.release(time.monotonic() - started, ok)
+
+    def wrap(self, func):
+        """Decorator version of call()"""
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self.call(func, *args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "queued": len(self.waiters),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,135 @@
+"""
+Logging utility - queue-based non-blocking logging with sampling and error rate limits
+"""
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+
+class KeyValueFormatter(logging.Formatter):
+    """ts=... level=... logger=... msg="..." key=value ..."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        msg = record.getMessage().replace('"', '\\"')
+        line = (
+            f"ts={self.formatTime(record, '%Y-%m-%dT%H:%M:%S')} "
+            f"level={record.levelname} logger={record.name} msg=\"{msg}\""
+        )
+        for key, value in getattr(record, "fields", {}).items():
+            value = str(value)
+            if " " in value or not value:
+                value = '"' + value.replace('"', '\\"') + '"'
+            line += f" {key}={value}"
+        if getattr(record, "suppressed", 0):
+            line += f" suppressed={record.suppressed}"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of below-WARNING records for chatty loggers"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+
+class ErrorRateLimitFilter(logging.Filter):
+    """Allow at most `burst` ERROR+ records per call site per `window` seconds"""
+
+    def __init__(self, burst: int = 10, window: float = 60):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR:
+            return True
+
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        started, count, suppressed = self._sites.get(key, (now, 0, 0))
+
+        if now - started > self.window:
+            started, count = now, 0
+
+        if count >= self.burst:
+            self._sites[key] = (started, count, suppressed + 1)
+            return False
+
+        # First record after a quiet period reports what was dropped
+        record.suppressed = suppressed
+        self._sites[key] = (started, count + 1, 0)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may change later) but leave formatting to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_rates(text: str) -> dict:
+    """'handlers.user=0.1,pyrogram=0.5' -> {'handlers.user': 0.1, 'pyrogram': 0.5}"""
+    rates = {}
+    for item in text.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(level: str = "INFO", sampling: str = "", error_burst: int = 10,
+                  queue_size: int = 10000) -> logging.handlers.QueueListener:
+    """
+    Route all records through a bounded queue to a background writer thread.
+    Returns the listener - call .stop() on exit to flush.
+    """
+    log_queue = queue.Queue(maxsize=queue_size)
+
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_rates(sampling)))
+    handler.addFilter(ErrorRateLimitFilter(burst=error_burst))
+
+    writer = logging.StreamHandler(sys.stderr)
+    writer.setFormatter(KeyValueFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    listener.start()
+    return listener
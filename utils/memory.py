@@ -0,0 +1,157 @@
+"""
+Memory utility - tracemalloc top allocations and diffs, RSS, and sizes of caches and buffers
+"""
+import gc
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from config import Config
+from utils.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Extra buffers to report by name -> callable returning an entry count
+sizes = {}
+
+_NOISE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>")
+)
+
+
+def register_size(name: str, func):
+    """Report len-like `func()` as `name` in /memory and the gauges"""
+    sizes[name] = func
+
+
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is missing)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except (OSError, ValueError, IndexError):
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class MemoryProfiler:
+    def __init__(self, frames: int = 0, warn_mb: float = 0):
+        """
+        `frames` - traceback depth traced from startup (0 = off until /memory start)
+        `warn_mb` - log a warning when RSS goes above this (0 disables)
+        """
+        self.frames = frames
+        self.warn_mb = warn_mb
+        self.baseline = None
+        self.baseline_at = 0
+        self.baseline_rss = 0.0
+        self.last = {}
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        """Trace from startup when `frames` is set"""
+        if self.frames:
+            self.trace(self.frames)
+
+    def trace(self, frames: int = 1):
+        """Start tracing now (on demand) and diff from here"""
+        if not self.tracing:
+            tracemalloc.start(frames)
+        self.reset_baseline()
+
+    def stop(self):
+        """Stop tracing and free the traces and the baseline snapshot"""
+        self.baseline = None
+        if self.tracing:
+            tracemalloc.stop()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_NOISE)
+
+    def reset_baseline(self):
+        """Compare future diffs against the heap as it is now"""
+        self.baseline_rss = rss_mb()
+        self.baseline_at = int(time.time())
+        if self.tracing:
+            self.baseline = self._snapshot()
+
+    # ======================
+    # ALLOCATIONS
+    # ======================
+
+    def top(self, limit: int = 10) -> list:
+        """Biggest allocation sites right now"""
+        if not self.tracing:
+            return []
+        return [
+            {
+                "where": str(stat.traceback[0]),
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count
+            }
+            for stat in self._snapshot().statistics("lineno")[:limit]
+        ]
+
+    def diff(self, limit: int = 10) -> list:
+        """Allocation sites that grew the most since the baseline"""
+        if not self.tracing or self.baseline is None:
+            return []
+        return [
+            {
+                "where": str(stat.traceback[0]),
+                "size_kb": round(stat.size / 1024, 1),
+                "diff_kb": round(stat.size_diff / 1024, 1),
+                "count_diff": stat.count_diff
+            }
+            for stat in self._snapshot().compare_to(self.baseline, "lineno")[:limit]
+        ]
+
+    # ======================
+    # GAUGES
+    # ======================
+
+    def gauges(self) -> dict:
+        traced, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        rss = rss_mb()
+        values = {
+            "rss_mb": rss,
+            "rss_growth_mb": round(rss - self.baseline_rss, 1) if self.baseline_at else 0,
+            "traced_mb": round(traced / 1048576, 1),
+            "traced_peak_mb": round(peak / 1048576, 1),
+            "gc_objects": len(gc.get_objects())
+        }
+        for name, cache in caches.items():
+            values[f"cache_{name}"] = cache.stats()["size"]
+        for name, func in sizes.items():
+            try:
+                values[name] = func()
+            except Exception:
+                values[name] = -1
+        return values
+
+    def report(self) -> dict:
+        """Log the gauges (scheduler job) and keep them for /metrics"""
+        self.last = self.gauges()
+        logger.info("memory", extra={"fields": self.last})
+        if self.warn_mb and self.last["rss_mb"] > self.warn_mb:
+            logger.warning(f"⚠️ RSS {self.last['rss_mb']}MB is above {self.warn_mb}MB")
+        return self.last
+
+    def snapshot(self, limit: int = 10) -> dict:
+        return {
+            "gauges": self.gauges(),
+            "baseline_at": self.baseline_at,
+            "top": self.top(limit),
+            "diff": self.diff(limit)
+        }
+
+
+# Global instance
+memory = MemoryProfiler(frames=Config.MEMORY_TRACE_FRAMES, warn_mb=Config.MEMORY_WARN_MB)
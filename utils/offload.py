@@ -0,0 +1,51 @@
+"""
+Offload utility - a managed worker pool for work that would block the event loop
+
+    text = await offload.run(format_movie_list, movies)
+
+Threads suit work that releases the GIL or is short enough that the loop
+keeps getting switched in (formatting, tracemalloc snapshots).
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class Offloader:
+    def __init__(self, threads: int = 4):
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="offload")
+        self.stats = {"count": 0, "active": 0, "total_ms": 0.0}
+
+    async def run(self, func, *args):
+        """func(*args) on the thread pool"""
+        stats = self.stats
+        stats["active"] += 1
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+        finally:
+            stats["active"] -= 1
+            stats["count"] += 1
+            stats["total_ms"] += (time.monotonic() - started) * 1000
+
+    async def shutdown(self):
+        """Drop queued work, wait for running calls, stop the workers"""
+        await asyncio.to_thread(self._pool.shutdown, True, cancel_futures=True)
+
+    def snapshot(self) -> dict:
+        s = self.stats
+        return {
+            "workers": self.threads,
+            "active": s["active"],
+            "count": s["count"],
+            "avg_ms": round(s["total_ms"] / s["count"], 1) if s["count"] else 0
+        }
+
+
+# Global instance
+offload = Offloader(threads=Config.OFFLOAD_THREADS)
@@ -0,0 +1,264 @@
+"""
+Outbox utility - one scheduler for every outgoing Telegram message
+
+- global token bucket (Telegram allows ~30 msgs/s per bot)
+- per-chat pacing (~1 msg/s per chat, small burst for reply + edit)
+- priority lanes: interactive > admin > bulk
+- FloodWait pauses all sends (and the chat past that) and requeues the message
+  instead of failing it
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Lanes (lower = sent first)
+INTERACTIVE = 0
+ADMIN = 1
+BULK = 2
+LANE_NAMES = ["interactive", "admin", "bulk"]
+
+# Explicit lane for sends made in the current task (see Outbox.lane)
+_current_lane = contextvars.ContextVar("outbox_lane", default=None)
+
+# How deep to look into a lane for a chat that is ready
+SCAN_LIMIT = 50
+
+
+class OutboxClosed(Exception):
+    """Raised by submit() once the outbox is stopping"""
+
+
+class Outbox:
+    def __init__(self, rate: float = 30, burst: float = 30, chat_rate: float = 1, chat_burst: float = 3):
+        self.rate = rate
+        self.burst = burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        self._lanes = [deque(), deque(), deque()]
+        self._tokens = burst
+        self._refilled = time.monotonic()
+        self._chats = {}          # chat_id -> [tokens, last_refill, hold_until]
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self._closing = False
+
+        self.sent = 0
+        self.failed = 0
+        self.flood_waits = 0
+
+    @contextmanager
+    def lane(self, lane: int):
+        """Send everything inside this block on the given lane"""
+        token = _current_lane.set(lane)
+        try:
+            yield
+        finally:
+            _current_lane.reset(token)
+
+    def _pick_lane(self, chat_id) -> int:
+        lane = _current_lane.get()
+        if lane is not None:
+            return lane
+        return ADMIN if chat_id == Config.ADMIN_ID else INTERACTIVE
+
+    async def submit(self, chat_id, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) as a send to chat_id and wait for its result"""
+        if self._closing:
+            raise OutboxClosed("outbox is stopped")
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+        fut = asyncio.get_running_loop().create_future()
+        lane = self._pick_lane(chat_id)
+        self._lanes[lane].append((chat_id, lane, func, args, kwargs, fut))
+        self._wakeup.set()
+        return await fut
+
+    # ======================
+    # RATE LIMITING
+    # ======================
+
+    def _chat_ready(self, chat_id, now: float) -> bool:
+        state = self._chats.get(chat_id)
+        if state is None:
+            return True
+        tokens, last, hold_until = state
+        if now < hold_until:
+            return False
+        return tokens + (now - last) * self.chat_rate >= 1
+
+    def _take_chat(self, chat_id, now: float):
+        tokens, last, hold_until = self._chats.get(chat_id, (self.chat_burst, now, 0))
+        tokens = min(self.chat_burst, tokens + (now - last) * self.chat_rate)
+        self._chats[chat_id] = [tokens - 1, now, hold_until]
+
+    def hold(self, chat_id, seconds: float):
+        """Pause sends to a chat (FloodWait)"""
+        now = time.monotonic()
+        tokens, last, _ = self._chats.get(chat_id, (0, now, 0))
+        self._chats[chat_id] = [tokens, last, now + seconds]
+
+    def pause(self, seconds: float):
+        """Pause all sends (FloodWait - the limit may be the bot's, not just the chat's)"""
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            # Start again from an empty bucket rather than a full burst
+            self._tokens = 0
+            self._refilled = until
+
+    def _next_ready(self, now: float):
+        for queue in self._lanes:
+            for i, item in enumerate(queue):
+                if i >= SCAN_LIMIT:
+                    break
+                if self._chat_ready(item[0], now):
+                    del queue[i]
+                    return item
+        return None
+
+    def _prune(self, now: float):
+        # Drop chats that are idle and fully refilled
+        idle = [
+            chat_id for chat_id, (tokens, last, hold_until) in self._chats.items()
+            if now > hold_until and (now - last) * self.chat_rate + tokens >= self.chat_burst
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    # ======================
+    # DISPATCH
+    # ======================
+
+    async def _run(self):
+        pruned = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+
+            if now - pruned > 60:
+                self._prune(now)
+                pruned = now
+
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+
+            item = self._next_ready(now)
+            if item is None:
+                # Nothing sendable - wait for a new message or a chat to refill
+                self._wakeup.clear()
+                pending = any(self._lanes)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=0.1 if pending else None)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._tokens -= 1
+            self._take_chat(item[0], now)
+            # Keep a reference (the loop only holds tasks weakly), stop() waits for these
+            task = asyncio.create_task(self._execute(item))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, item: tuple):
+        chat_id, lane, func, args, kwargs, fut = item
+        if fut.done():
+            return
+        try:
+            result = await func(*args, **kwargs)
+        except FloodWait as e:
+            self.flood_waits += 1
+            if self._closing:
+                fut.cancel()
+                return
+            # Requeue at the front of its lane once the pause expires
+            self.pause(e.value)
+            self.hold(chat_id, e.value)
+            logger.warning(f"FloodWait {e.value}s for chat {chat_id}, all sends paused, rescheduled")
+            self._lanes[lane].appendleft(item)
+            self._wakeup.set()
+        except Exception as e:
+            self.failed += 1
+            fut.set_exception(e)
+        else:
+            self.sent += 1
+            fut.set_result(result)
+
+    async def stop(self, timeout: float = 10):
+        """Refuse new sends, let in-flight sends finish, cancel the queued ones"""
+        self._closing = True
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._inflight:
+            await asyncio.wait(list(self._inflight), timeout=timeout)
+        for queue in self._lanes:
+            while queue:
+                fut = queue.popleft()[-1]
+                if not fut.done():
+                    fut.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": {name: len(q) for name, q in zip(LANE_NAMES, self._lanes)},
+            "tokens": round(self._tokens, 1),
+            "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "chats_tracked": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "flood_waits": self.flood_waits
+        }
+
+
+# Global instance
+outbox = Outbox(
+    rate=Config.OUTBOX_RATE,
+    burst=Config.OUTBOX_RATE,
+    chat_rate=Config.OUTBOX_CHAT_RATE,
+    chat_burst=Config.OUTBOX_CHAT_BURST
+)
+
+
+def _chat_id(args: tuple, kwargs: dict):
+    return kwargs["chat_id"] if "chat_id" in kwargs else args[0]
+
+
+class OutboundClient(Client):
+    """Client whose message sends all go through the outbox"""
+
+    async def send_message(self, *args, **kwargs):
+        return await outbox.submit(_chat_id(args, kwargs), super().send_message, *args, **kwargs)
+
+    async def send_photo(self, *args, **kwargs):
+        return await outbox.submit(_chat_id(args, kwargs), super().send_photo, *args, **kwargs)
+
+    async def send_document(self, *args, **kwargs):
+        return await outbox.submit(_chat_id(args, kwargs), super().send_document, *args, **kwargs)
+
+    async def send_cached_media(self, *args, **kwargs):
+        return await outbox.submit(_chat_id(args, kwargs), super().send_cached_media, *args, **kwargs)
+
+    async def copy_message(self, *args, **kwargs):
+        return await outbox.submit(_chat_id(args, kwargs), super().copy_message, *args, **kwargs)
+
+    async def edit_message_text(self, *args, **kwargs):
+        return await outbox.submit(_chat_id(args, kwargs), super().edit_message_text, *args, **kwargs)
@@ -0,0 +1,93 @@
+"""
+Recorder utility - opt-in capture of anonymized user updates for replay (see utils.replay)
+
+One gzipped JSON line per update:
+    {"t": 1718000000.123, "k": "m", "u": 8841023, "x": "kill bil"}
+k: "m" message text / "c" callback data, u: salted hash of the user id
+(stable within one file only), x: text or callback data. Download tokens
+are stripped from /start payloads.
+"""
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from config import Config
+from helpers import decode_payload, encode_payload
+
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    def __init__(self, directory: str = "recordings", sample: float = 1.0, max_buffer: int = 5000):
+        self.directory = directory
+        self.sample = sample
+        self.max_buffer = max_buffer
+        self.path = None
+        self.recorded = 0
+        self.dropped = 0
+        self._salt = secrets.token_bytes(16)
+        self._buffer = []
+
+    def _anon(self, user_id: int) -> int:
+        digest = hmac.new(self._salt, str(user_id).encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:4], "big")
+
+    def _sampled(self, anon: int) -> bool:
+        # Sample whole users, not single updates, so tap sequences stay intact
+        return anon % 10000 < self.sample * 10000
+
+    def record(self, kind: str, user_id: int, text: str):
+        """Buffer one update (kind "m" message, "c" callback)"""
+        anon = self._anon(user_id)
+        if not text or not self._sampled(anon):
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+
+        if kind == "m" and text.startswith("/start "):
+            ref, part, quality, token = decode_payload(text[7:])
+            if token:
+                text = "/start " + encode_payload(ref, part, quality)
+
+        self._buffer.append({"t": round(time.time(), 3), "k": kind, "u": anon, "x": text})
+
+    def _write(self, lines: list):
+        if self.path is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(self.directory, time.strftime("updates-%Y%m%d-%H%M%S.jsonl.gz"))
+        # Appending adds a gzip member - gzip.open reads them back as one stream
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def flush(self):
+        """Write buffered updates to the current file (off the event loop)"""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        lines = [json.dumps(u, separators=(",", ":"), ensure_ascii=False) + "\n" for u in batch]
+        await asyncio.to_thread(self._write, lines)
+        self.recorded += len(batch)
+
+    def snapshot(self) -> dict:
+        return {
+            "path": self.path,
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "dropped": self.dropped
+        }
+
+
+# Global instance (only fed when Config.RECORD_UPDATES is on)
+recorder = Recorder(Config.RECORD_DIR, Config.RECORD_SAMPLE)
+
+
+def read_updates(path: str) -> list:
+    """Load a recording made by Recorder"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
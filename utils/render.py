@@ -0,0 +1,125 @@
+"""
+Render utility - ready-to-send texts and keyboards per movie, cached by catalog version
+"""
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from helpers import encode_payload
+from utils.cache import TTLCache
+from utils.codec import KIND_MOVIE, KIND_PART, KIND_QUALITY, encode_callback, movie_ref
+
+# (code, part, view, version) -> (text, keyboard)
+render_cache = TTLCache("render", ttl=3600, max_size=2000)
+
+
+def _cache_key(movie: dict, part: int, view: str) -> tuple:
+    return (movie["code"], part, view, movie.get("version", 0))
+
+
+def invalidate(code: str):
+    """Drop every cached render for a movie (called after catalog writes)"""
+    for key in render_cache.keys():
+        if key[0] == code:
+            render_cache.pop(key)
+
+
+def get_qualities(movie: dict, part: int = 1) -> dict:
+    """Qualities for a part (part 1 lives at the top level)"""
+    if part > 1 and "parts_data" in movie:
+        return movie["parts_data"].get(f"part_{part}", {}).get("qualities", {})
+    return movie.get("qualities", {})
+
+
+def render_parts(movie: dict) -> tuple:
+    """Part selection: (text, keyboard)"""
+    key = _cache_key(movie, 0, "parts")
+    cached = render_cache.get(key)
+    if cached:
+        return cached
+
+    ref = movie_ref(movie)
+    buttons = [
+        InlineKeyboardButton(f"📦 Part {i}", callback_data=encode_callback(KIND_PART, ref, i))
+        for i in range(1, movie["parts"] + 1)
+    ]
+    keyboard = [buttons[i:i+3] for i in range(0, len(buttons), 3)]
+
+    rendered = (
+        f"🎬 **{movie['title']}**\n\n"
+        f"This movie has {movie['parts']} parts.\n"
+        f"Select one:",
+        InlineKeyboardMarkup(keyboard)
+    )
+    render_cache.set(key, rendered)
+    return rendered
+
+
+def render_qualities(movie: dict, part: int) -> tuple:
+    """Quality selection: (text, keyboard), or None if the part has no files"""
+    key = _cache_key(movie, part, "qualities")
+    cached = render_cache.get(key)
+    if cached:
+        return cached
+
+    qualities = get_qualities(movie, part)
+    if not qualities:
+        return None
+
+    ref = movie_ref(movie)
+    buttons = []
+    for quality, data in qualities.items():
+        size = data.get("size", "")
+        btn_text = f"🎞️ {quality}" + (f" ({size})" if size else "")
+        buttons.append([
+            InlineKeyboardButton(btn_text, callback_data=encode_callback(KIND_QUALITY, ref, part, quality))
+        ])
+
+    if movie.get("parts", 1) > 1:
+        buttons.append([InlineKeyboardButton("◀️ Back to Parts", callback_data=encode_callback(KIND_MOVIE, ref))])
+
+    rendered = (
+        f"🎬 **{movie['title']}**\n\n"
+        f"📦 Part: {part}\n\n"
+        f"Select quality:",
+        InlineKeyboardMarkup(buttons)
+    )
+    render_cache.set(key, rendered)
+    return rendered
+
+
+def render_card(movie: dict, info: dict, bot_username: str) -> tuple:
+    """Search result card: (caption, keyboard) - TMDB info is optional, the keyboard is
+    None when the movie can't be put in a deep link"""
+    key = _cache_key(movie, 0, "card_info" if info else "card")
+    cached = render_cache.get(key)
+    if cached:
+        return cached
+
+    parts_text = f"\n📦 Parts: {movie['parts']}" if movie.get('parts', 1) > 1 else ""
+
+    qualities = movie.get("qualities", {})
+    quality_text = ""
+    if qualities:
+        q_list = []
+        for q, data in qualities.items():
+            size = data.get("size", "")
+            q_list.append(f"{q} ({size})" if size else q)
+        quality_text = f"\n🎞️ Available: {', '.join(q_list)}"
+
+    if info:
+        caption = (
+            f"🎬 **{info['title']}** ({info.get('year', '')})\n"
+            f"⭐ {info.get('rating', 'N/A')}/10{parts_text}{quality_text}\n\n"
+            f"{info.get('overview', '')[:200]}..."
+        )
+    else:
+        caption = f"🎬 **{movie['title']}**{parts_text}{quality_text}"
+
+    # Empty if the ref doesn't fit Telegram's payload limit (logged by encode_payload)
+    payload = encode_payload(movie_ref(movie))
+    keyboard = None
+    if payload:
+        link = f"https://t.me/{bot_username}?start={payload}"
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("📥 Download", url=link)]])
+
+    rendered = (caption, keyboard)
+    render_cache.set(key, rendered)
+    return rendered
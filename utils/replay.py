@@ -0,0 +1,249 @@
+"""
+Replay utility - feed a recording (utils.recorder) back through the real handlers
+
+    python -m utils.replay recordings/updates-....jsonl.gz [--speed 1|10|max] [--telegram-ms 50]
+
+Handlers run against local stand-ins: Telegram is a fake client that answers
+every call after --telegram-ms, Mongo is REPLAY_MONGO_URL / REPLAY_DB_NAME
+(replayed /start and taps read and write it, so point it at a copy) and TMDB
+is limited to the local store. Replays refuse to start when that resolves to
+the production MONGO_DB_URL + DB_NAME. Prints throughput and latency per handler.
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import logging
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from pyrogram import enums, types
+from config import Config
+from utils.recorder import read_updates
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayClient:
+    """Stands in for pyrogram.Client: collects handlers, fakes Telegram API calls"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.me = types.User(id=1, is_bot=True, first_name="Replay", username="replay_bot")
+        self.handlers = {"m": [], "c": []}
+        self.calls = 0
+        self._ids = itertools.count(1)
+
+    # ======================
+    # REGISTRATION
+    # ======================
+
+    def _register(self, kind: str, filters, group: int):
+        def decorator(func):
+            self.handlers[kind].append((group, filters, func))
+            self.handlers[kind].sort(key=lambda h: h[0])
+            return func
+        return decorator
+
+    def on_message(self, filters=None, group: int = 0):
+        return self._register("m", filters, group)
+
+    def on_callback_query(self, filters=None, group: int = 0):
+        return self._register("c", filters, group)
+
+    # ======================
+    # FAKE TELEGRAM
+    # ======================
+
+    def _message(self, chat_id: int, text: str = "") -> types.Message:
+        return types.Message(
+            id=next(self._ids),
+            chat=types.Chat(id=chat_id, type=enums.ChatType.PRIVATE),
+            from_user=self.me,
+            text=text,
+            date=datetime.now(),
+            client=self
+        )
+
+    async def _api(self, chat_id=0, text: str = ""):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._message(chat_id, text)
+
+    async def send_message(self, chat_id, text="", **kwargs):
+        return await self._api(chat_id, text)
+
+    async def edit_message_text(self, chat_id, message_id, text="", **kwargs):
+        return await self._api(chat_id, text)
+
+    async def send_photo(self, chat_id, photo=None, **kwargs):
+        return await self._api(chat_id)
+
+    async def send_document(self, chat_id, document=None, **kwargs):
+        return await self._api(chat_id)
+
+    async def send_cached_media(self, chat_id, file_id=None, **kwargs):
+        return await self._api(chat_id)
+
+    async def copy_message(self, chat_id, from_chat_id=None, message_id=None, **kwargs):
+        return await self._api(chat_id)
+
+    async def delete_messages(self, chat_id, message_ids=None, **kwargs):
+        await self._api(chat_id)
+        return True
+
+    async def answer_callback_query(self, callback_query_id, **kwargs):
+        await self._api()
+        return True
+
+    async def get_chat_member(self, chat_id, user_id):
+        await self._api()
+        return SimpleNamespace(status=enums.ChatMemberStatus.MEMBER)
+
+    async def get_file(self, file_id, **kwargs):
+        await self._api()
+        raise ValueError("no file downloads in replay")
+
+    # ======================
+    # DISPATCH
+    # ======================
+
+    def make_update(self, record: dict):
+        user = types.User(id=record["u"], is_bot=False, first_name="User")
+        if record["k"] == "c":
+            return types.CallbackQuery(
+                id=str(next(self._ids)),
+                from_user=user,
+                chat_instance="replay",
+                message=self._message(record["u"]),
+                data=record["x"],
+                client=self
+            )
+        message = self._message(record["u"], record["x"])
+        message.from_user = user
+        return message
+
+    async def _matches(self, filters, update) -> bool:
+        if filters is None:
+            return True
+        if inspect.iscoroutinefunction(filters.__call__):
+            return await filters(self, update)
+        return filters(self, update)
+
+    async def dispatch(self, record: dict) -> list:
+        """Run the update through the first matching handler of each group, like Pyrogram"""
+        update = self.make_update(record)
+        handled = []
+        done_groups = set()
+        for group, filters, func in self.handlers[record["k"]]:
+            if group in done_groups or not await self._matches(filters, update):
+                continue
+            done_groups.add(group)
+            await func(self, update)
+            handled.append(func.__name__)
+        return handled
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def use_replay_database():
+    """Point Config at the replay database; refuses production"""
+    url = Config.REPLAY_MONGO_URL or Config.MONGO_DB_URL
+    name = Config.REPLAY_DB_NAME or Config.DB_NAME
+    if (url, name) == (Config.MONGO_DB_URL, Config.DB_NAME):
+        raise RuntimeError("Replay needs REPLAY_MONGO_URL or REPLAY_DB_NAME set to a non-production database")
+    if "database" in sys.modules:
+        raise RuntimeError("database was imported before the replay database was set")
+    Config.MONGO_DB_URL = url
+    Config.DB_NAME = name
+
+
+async def replay(path: str, speed: float = None, telegram_ms: float = 50) -> dict:
+    """Replay a recording; speed None = as fast as possible"""
+    use_replay_database()
+
+    # Local imports - these pull in the database client and handlers
+    from database import db
+    from handlers import register_all_handlers
+    from utils.lifecycle import lifecycle
+
+    Config.TMDB_API_KEY = ""
+    Config.RECORD_UPDATES = False
+
+    records = read_updates(path)
+    client = ReplayClient(latency=telegram_ms / 1000)
+    register_all_handlers(client)
+
+    latencies = {}
+    errors = 0
+
+    async def run(record: dict):
+        nonlocal errors
+        started = time.monotonic()
+        try:
+            names = await client.dispatch(record)
+        except Exception as e:
+            errors += 1
+            logger.debug(f"replay error: {e}")
+            names = ["error"]
+        latencies.setdefault(names[-1] if names else "unhandled", []).append(time.monotonic() - started)
+
+    tasks = []
+    first = records[0]["t"] if records else 0
+    started = time.monotonic()
+    for record in records:
+        if speed:
+            delay = (record["t"] - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run(record)))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+
+    # Let background work (card enrichment etc.) finish before closing Mongo
+    lifecycle.on_shutdown("mongo", db.close)
+    await lifecycle.shutdown(30)
+
+    everything = [v for values in latencies.values() for v in values]
+    report = {
+        "updates": len(records),
+        "seconds": round(elapsed, 2),
+        "throughput": round(len(records) / elapsed, 1) if elapsed else 0,
+        "errors": errors,
+        "telegram_calls": client.calls,
+        "p50_ms": round(percentile(everything, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 1),
+        "handlers": {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.5) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1)
+            }
+            for name, values in sorted(latencies.items())
+        }
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded updates through the handlers")
+    parser.add_argument("recording")
+    parser.add_argument("--speed", default="1", help="1, 10, ... or max")
+    parser.add_argument("--telegram-ms", type=float, default=50, help="simulated Telegram API latency")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    report = asyncio.run(replay(args.recording, speed, args.telegram_ms))
+
+    print(f"▶️ {report['updates']} updates in {report['seconds']}s ({report['throughput']}/s), {report['errors']} errors")
+    print(f"⏱️ p50 {report['p50_ms']}ms | p95 {report['p95_ms']}ms | p99 {report['p99_ms']}ms")
+    print(f"📡 {report['telegram_calls']} Telegram calls")
+    for name, h in report["handlers"].items():
+        print(f"   {name}: {h['count']} | p50 {h['p50_ms']}ms | p95 {h['p95_ms']}ms")
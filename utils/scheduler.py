@@ -0,0 +1,221 @@
+"""
+Scheduler utility - asyncio-native periodic jobs (interval + cron) on the bot loop
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from utils.leader import leader
+
+logger = logging.getLogger(__name__)
+
+
+# ======================
+# CRON PARSING
+# ======================
+
+# (min, max) for: minute hour day month weekday
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+def _parse_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for chunk in field.split(","):
+        step = 1
+        if "/" in chunk:
+            chunk, step_text = chunk.split("/", 1)
+            step = int(step_text)
+        if chunk == "*":
+            start, end = low, high
+        elif "-" in chunk:
+            start, end = (int(x) for x in chunk.split("-", 1))
+        else:
+            start = end = int(chunk)
+        if start < low or end > high or step < 1:
+            raise ValueError(f"Cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse_cron(spec: str) -> list:
+    """Parse 'minute hour day month weekday' (weekday 0 = Sunday)"""
+    fields = spec.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron spec needs 5 fields: {spec}")
+    return [_parse_field(f, low, high) for f, (low, high) in zip(fields, CRON_RANGES)]
+
+
+def next_cron_time(fields: list, after: datetime) -> datetime:
+    """
+    Next UTC minute matching the parsed cron fields
+    Like cron, when both day of month and weekday are restricted a day
+    matching either one fires ("0 0 1 * 1" = the 1st and every Monday)
+    """
+    minutes, hours, days, months, weekdays = fields
+    t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    any_day = len(days) == 31
+    any_weekday = len(weekdays) == 7
+
+    # One year of minutes is enough for any valid spec
+    for _ in range(366 * 24 * 60):
+        day_ok = t.day in days
+        weekday_ok = (t.weekday() + 1) % 7 in weekdays
+        if any_day or any_weekday:
+            day_match = day_ok and weekday_ok
+        else:
+            day_match = day_ok or weekday_ok
+        if (
+            t.month in months
+            and day_match
+            and t.hour in hours
+            and t.minute in minutes
+        ):
+            return t
+        t += timedelta(minutes=1)
+    raise ValueError("Cron spec never fires")
+
+
+# ======================
+# JOBS
+# ======================
+
+class Job:
+    def __init__(self, name: str, func, interval: float = None, cron: str = None,
+                 jitter: float = 0, timeout: float = None, leader_only: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.cron_fields = parse_cron(cron) if cron else None
+        self.jitter = jitter
+        self.timeout = timeout
+        self.leader_only = leader_only
+        # Cron minute the last delay() was aimed at
+        self.cron_slot = None
+
+        # Metrics
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+        self.next_run = None
+        self.running = None
+
+    def delay(self, now: datetime = None) -> float:
+        """Seconds until the next run (jitter included)"""
+        if self.cron_fields:
+            now = now or datetime.now(timezone.utc)
+            # Strictly after the last slot - a sleep that wakes a little early
+            # must not aim at the slot it was already sleeping towards
+            after = max(now, self.cron_slot) if self.cron_slot else now
+            self.cron_slot = next_cron_time(self.cron_fields, after)
+            delay = (self.cron_slot - now).total_seconds()
+        else:
+            delay = self.interval
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return max(delay, 0)
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "schedule": self.cron or f"every {self.interval}s",
+            "leader_only": self.leader_only,
+            "running": self.running is not None,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+            "next_run": self.next_run
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+        self._tasks = []
+
+    def every(self, name: str, seconds: float, func, jitter: float = 0, timeout: float = None,
+              leader_only: bool = False):
+        """Run func every N seconds (leader_only: on the elected replica only)"""
+        self.jobs[name] = Job(name, func, interval=seconds, jitter=jitter, timeout=timeout, leader_only=leader_only)
+
+    def cron(self, name: str, spec: str, func, jitter: float = 0, timeout: float = None,
+             leader_only: bool = False):
+        """Run func on a cron schedule (UTC)"""
+        self.jobs[name] = Job(name, func, cron=spec, jitter=jitter, timeout=timeout, leader_only=leader_only)
+
+    def start(self):
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job)))
+        logger.info(f"✅ Scheduler started: {len(self.jobs)} jobs")
+
+    async def stop(self, timeout: float = 10):
+        """Stop scheduling, give running jobs a moment to finish"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        running = [job.running for job in self.jobs.values() if job.running]
+        if running:
+            done, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    async def _loop(self, job: Job):
+        while True:
+            delay = job.delay()
+            job.next_run = time.time() + delay
+            await asyncio.sleep(delay)
+
+            # Singleton work - other replicas just wait for their turn
+            if job.leader_only and not leader.is_leader:
+                continue
+
+            # Overlap prevention - never run a job twice at once
+            if job.running:
+                job.skipped += 1
+                logger.warning(f"Job {job.name} still running, skipped")
+                continue
+
+            job.running = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        started = time.monotonic()
+        job.last_run = time.time()
+        try:
+            await asyncio.wait_for(job.func(), timeout=job.timeout)
+            job.last_error = None
+        except asyncio.TimeoutError:
+            job.failures += 1
+            job.last_error = f"timeout after {job.timeout}s"
+            logger.error(f"Job {job.name} timed out")
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Job {job.name} error: {e}")
+        finally:
+            job.runs += 1
+            job.last_duration = time.monotonic() - started
+            job.running = None
+
+    async def run_now(self, name: str):
+        """Run a job immediately (used by admin commands)"""
+        job = self.jobs[name]
+        if job.running:
+            return False
+        job.running = asyncio.create_task(self._run(job))
+        await job.running
+        return True
+
+    def snapshot(self) -> list:
+        return [job.snapshot() for job in self.jobs.values()]
+
+
+# Global instance
+scheduler = Scheduler()
@@ -0,0 +1,269 @@
+"""
+Session store utility - Pyrogram session storage that survives redeploys
+
+MongoStorage keeps the auth key and peers in Mongo:
+- the session document is loaded once on open, auth changes are written through
+- peers are loaded lazily on first lookup and kept in a bounded in-memory LRU
+- peer updates are buffered and written in batches (unchanged peers are skipped)
+- peers belong to a session (`session` field), so replicas don't share or wipe them
+
+MappedFileStorage is the stock SQLite file (point SESSION_DIR at a mounted
+volume) with SQLite memory-mapped I/O turned on.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pyrogram.storage import FileStorage, Storage
+from pyrogram.storage.sqlite_storage import get_input_peer
+
+logger = logging.getLogger(__name__)
+
+
+class MongoStorage(Storage):
+    USERNAME_TTL = FileStorage.USERNAME_TTL
+
+    def __init__(self, name: str, database, cache_size: int = 50000,
+                 batch_size: int = 500, flush_interval: float = 5):
+        super().__init__(name)
+        self.sessions = database["sessions"]
+        self.peers = database["session_peers"]
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._session = {}
+        self._date_dirty = False
+        self._cache = OrderedDict()     # id -> (access_hash, type, username, phone_number, updated)
+        self._usernames = {}            # username -> id
+        self._pending = {}              # id -> peer tuple waiting to be written
+        self._flushing = None
+        self._flusher = None
+
+        self.loaded = 0
+        self.written = 0
+        self.skipped = 0
+
+    # ======================
+    # LIFECYCLE
+    # ======================
+
+    async def open(self):
+        # Atomic create-or-load - replicas may be starting at the same time
+        self._session = await self.sessions.find_one_and_update(
+            {"_id": self.name},
+            {"$setOnInsert": {"dc_id": 2, "date": 0}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        # Peers written before they were kept per session belong to no one - drop them
+        await self.peers.delete_many({"session": {"$exists": False}})
+        await self.peers.create_index([("session", ASCENDING), ("peer_id", ASCENDING)], unique=True)
+        await self.peers.create_index([("session", ASCENDING), ("username", ASCENDING)], sparse=True)
+        await self.peers.create_index([("session", ASCENDING), ("phone_number", ASCENDING)], sparse=True)
+
+        self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info(f"✅ Session {self.name} loaded from Mongo")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Peer flush failed: {e}")
+
+    async def flush(self):
+        """Write buffered peers (and the session date) in one batch"""
+        if self._pending:
+            batch, self._pending = self._pending, {}
+            ops = [
+                UpdateOne(
+                    {"session": self.name, "peer_id": peer_id},
+                    {"$set": {
+                        "access_hash": access_hash,
+                        "type": peer_type,
+                        "username": username,
+                        "phone_number": phone_number,
+                        "last_update_on": int(time.time())
+                    }},
+                    upsert=True
+                )
+                for peer_id, (access_hash, peer_type, username, phone_number) in batch.items()
+            ]
+            try:
+                await self.peers.bulk_write(ops, ordered=False)
+            except Exception:
+                # Keep them for the next flush (newer updates win)
+                self._pending = {**batch, **self._pending}
+                raise
+            self.written += len(ops)
+
+        if self._date_dirty:
+            self._date_dirty = False
+            await self.sessions.update_one({"_id": self.name}, {"$set": {"date": self._session.get("date", 0)}})
+
+    async def save(self):
+        self._session["date"] = int(time.time())
+        self._date_dirty = True
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Session save failed: {e}")
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Session close flush failed: {e}")
+
+    async def delete(self):
+        await self.sessions.delete_one({"_id": self.name})
+        await self.peers.delete_many({"session": self.name})
+        self._cache.clear()
+        self._usernames.clear()
+        self._pending.clear()
+
+    # ======================
+    # PEERS
+    # ======================
+
+    def _remember(self, peer_id: int, access_hash: int, peer_type: str, username: str,
+                  phone_number: str, updated: float):
+        self._cache[peer_id] = (access_hash, peer_type, username, phone_number, updated)
+        self._cache.move_to_end(peer_id)
+        if username:
+            self._usernames[username] = peer_id
+
+        while len(self._cache) > self.cache_size:
+            old_id, old = self._cache.popitem(last=False)
+            if old[2] and self._usernames.get(old[2]) == old_id:
+                del self._usernames[old[2]]
+
+    async def update_peers(self, peers: list):
+        now = time.time()
+        for peer_id, access_hash, peer_type, username, phone_number in peers:
+            cached = self._cache.get(peer_id)
+            # Same peer seen recently - nothing to write
+            if cached and cached[:4] == (access_hash, peer_type, username, phone_number) \
+                    and now - cached[4] < self.USERNAME_TTL / 2:
+                self._cache.move_to_end(peer_id)
+                self.skipped += 1
+                continue
+            self._remember(peer_id, access_hash, peer_type, username, phone_number, now)
+            self._pending[peer_id] = (access_hash, peer_type, username, phone_number)
+
+        if len(self._pending) >= self.batch_size and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def _load(self, query: dict, sort: bool = False) -> tuple:
+        """Fetch one peer of this session from Mongo into the cache, returns (id, access_hash, type, updated)"""
+        query = {"session": self.name, **query}
+        if sort:
+            docs = await self.peers.find(query).sort("last_update_on", DESCENDING).limit(1).to_list(1)
+            doc = docs[0] if docs else None
+        else:
+            doc = await self.peers.find_one(query)
+        if doc is None:
+            return None
+        self.loaded += 1
+        self._remember(
+            doc["peer_id"], doc["access_hash"], doc["type"],
+            doc.get("username"), doc.get("phone_number"), doc.get("last_update_on", 0)
+        )
+        return doc["peer_id"], doc["access_hash"], doc["type"], doc.get("last_update_on", 0)
+
+    async def get_peer_by_id(self, peer_id: int):
+        cached = self._cache.get(peer_id)
+        if cached:
+            self._cache.move_to_end(peer_id)
+            return get_input_peer(peer_id, cached[0], cached[1])
+
+        found = await self._load({"peer_id": peer_id})
+        if found is None:
+            raise KeyError(f"ID not found: {peer_id}")
+        return get_input_peer(*found[:3])
+
+    async def get_peer_by_username(self, username: str):
+        peer_id = self._usernames.get(username)
+        cached = self._cache.get(peer_id) if peer_id is not None else None
+        if cached and cached[2] == username:
+            found = (peer_id, cached[0], cached[1], cached[4])
+        else:
+            found = await self._load({"username": username}, sort=True)
+            if found is None:
+                raise KeyError(f"Username not found: {username}")
+
+        if abs(time.time() - found[3]) > self.USERNAME_TTL:
+            raise KeyError(f"Username expired: {username}")
+        return get_input_peer(*found[:3])
+
+    async def get_peer_by_phone_number(self, phone_number: str):
+        found = await self._load({"phone_number": phone_number})
+        if found is None:
+            raise KeyError(f"Phone number not found: {phone_number}")
+        return get_input_peer(*found[:3])
+
+    # ======================
+    # SESSION FIELDS
+    # ======================
+
+    async def _accessor(self, field: str, value):
+        if value is object:
+            return self._session.get(field)
+        self._session[field] = value
+        if field == "date":
+            # Only bumped on save - written with the next flush
+            self._date_dirty = True
+        else:
+            await self.sessions.update_one({"_id": self.name}, {"$set": {field: value}}, upsert=True)
+
+    async def dc_id(self, value: int = object):
+        return await self._accessor("dc_id", value)
+
+    async def api_id(self, value: int = object):
+        return await self._accessor("api_id", value)
+
+    async def test_mode(self, value: bool = object):
+        return await self._accessor("test_mode", value)
+
+    async def auth_key(self, value: bytes = object):
+        return await self._accessor("auth_key", value)
+
+    async def date(self, value: int = object):
+        return await self._accessor("date", value)
+
+    async def user_id(self, value: int = object):
+        return await self._accessor("user_id", value)
+
+    async def is_bot(self, value: bool = object):
+        return await self._accessor("is_bot", value)
+
+    def snapshot(self) -> dict:
+        return {
+            "backend": "mongo",
+            "peers": len(self._cache),
+            "pending": len(self._pending),
+            "loaded": self.loaded,
+            "written": self.written,
+            "skipped": self.skipped
+        }
+
+
+class MappedFileStorage(FileStorage):
+    """Stock SQLite session file with memory-mapped reads"""
+
+    MMAP_SIZE = 64 * 1024 * 1024
+
+    async def open(self):
+        await super().open()
+        self.conn.execute(f"PRAGMA mmap_size={self.MMAP_SIZE}")
+
+    def snapshot(self) -> dict:
+        peers = self.conn.execute("SELECT COUNT(*) FROM peers").fetchone()[0] if self.conn else 0
+        return {"backend": "file", "path": str(self.database), "peers": peers}
@@ -0,0 +1,61 @@
+"""
+Single-flight utility - concurrent identical lookups share one in-flight call
+
+    movie_flight = SingleFlight("movie")
+    movie = await movie_flight.do(code, fetch_movie, code)
+
+While a call for a key is running, later callers with the same key await
+the same task instead of starting their own. The call runs shielded: a
+caller that gives up (deadline, client gone) doesn't cancel it for the rest.
+Results are shared as is, so callers must not mutate them.
+"""
+import asyncio
+import functools
+
+# All flights by name (exported via /metrics)
+flights = {}
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self._inflight = {}
+        flights[name] = self
+
+    def _done(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Everyone may have stopped waiting - don't leave the error unretrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, func, *args, **kwargs):
+        """Result of func(*args, **kwargs), shared with concurrent calls for `key`"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.create_task(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def wrap(self, func):
+        """Decorator version of do(), keyed by the call's arguments"""
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            return await self.do(key, func, *args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "inflight": len(self._inflight)
+        }
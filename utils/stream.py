@@ -0,0 +1,323 @@
+"""
+Stream utility - serve Telegram files over HTTP from our own process
+
+    /dl/<token>/<file name>
+    token = <file_id>.<size>.<expires>.<signature>
+
+Links are HMAC-signed and expire, and the bot token never appears in them.
+Files are read over MTProto (Client.stream_media, 1 MiB chunks) on the bot
+loop; the web thread pulls chunks through a small bounded queue, so a slow
+client slows the Telegram reads down instead of growing memory. Byte ranges
+are served when the size is known (files added before sizes were stored
+are served whole). With the chunk cache on, chunks go through
+utils.chunk_cache and hits are read from memory-mapped files.
+"""
+import asyncio
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import logging
+import mmap
+import re
+import threading
+import time
+import urllib.parse
+from config import Config
+from utils.chunk_cache import chunk_cache, file_unique_id
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # stream_media chunk size (fixed by Telegram)
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> tuple:
+    """Single "bytes=" range -> (start, end) inclusive; None = whole file"""
+    if not header or not size:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Multiple ranges or other units - answering with the whole file is allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class Streamer:
+    def __init__(self, secret: bytes, ttl: int = 3600, buffer_chunks: int = 4,
+                 max_streams: int = 20, read_timeout: float = 30):
+        self.secret = secret
+        self.ttl = ttl
+        self.buffer_chunks = buffer_chunks
+        self.max_streams = max_streams
+        self.read_timeout = read_timeout
+        self.client = None
+        self.loop = None
+        self.closing = False
+
+        self.active = 0
+        self.served = 0
+        self.rejected = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def attach(self, client, loop: asyncio.AbstractEventLoop):
+        """Read files through this client, on its loop"""
+        self.client = client
+        self.loop = loop
+
+    # ======================
+    # SIGNED LINKS
+    # ======================
+
+    def _signature(self, body: str) -> str:
+        digest = hmac.new(self.secret, body.encode(), hashlib.sha256).digest()[:16]
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+    def sign(self, file_id: str, size: int, file_name: str) -> str:
+        """Public download URL for a file, valid for `ttl` seconds"""
+        if not Config.PUBLIC_URL:
+            raise ValueError("PUBLIC_URL is not set")
+        body = f"{file_id}.{int(size or 0)}.{int(time.time()) + self.ttl}"
+        name = urllib.parse.quote(file_name, safe="")
+        return f"{Config.PUBLIC_URL.rstrip('/')}/dl/{body}.{self._signature(body)}/{name}"
+
+    def verify(self, token: str) -> tuple:
+        """(file_id, size) for a valid, unexpired token, else None"""
+        body, _, signature = token.rpartition(".")
+        if not body or not hmac.compare_digest(signature, self._signature(body)):
+            return None
+        try:
+            file_id, size, expires = body.rsplit(".", 2)
+            size, expires = int(size), int(expires)
+        except ValueError:
+            return None
+        if expires < time.time():
+            return None
+        return file_id, size
+
+    # ======================
+    # RESPONSES
+    # ======================
+
+    def prepare(self, token: str, name: str, range_header: str = None) -> tuple:
+        """(status, headers, body iterable) for a download request"""
+        found = self.verify(token)
+        if found is None:
+            return 403, {}, [b"Link expired or invalid"]
+        if self.client is None or not self.client.is_connected:
+            return 503, {"Retry-After": "10"}, [b"Starting up"]
+        if self.closing:
+            return 503, {"Retry-After": "10"}, [b"Restarting, try again shortly"]
+        # The slot is taken here, so a burst of requests can't all get past the check
+        with self._lock:
+            if self.active >= self.max_streams:
+                self.rejected += 1
+                return 503, {"Retry-After": "5"}, [b"Too many downloads, try again shortly"]
+            self.active += 1
+
+        file_id, size = found
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(name, safe='')}",
+            "Accept-Ranges": "bytes" if size else "none",
+            "Cache-Control": "private, no-store"
+        }
+        if not size:
+            return 200, headers, Download(self, self._body(file_id, 0, None))
+
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            self._release()
+            return 416, {"Content-Range": f"bytes */{size}"}, []
+
+        start, end = byte_range or (0, size - 1)
+        headers["Content-Length"] = str(end - start + 1)
+        body = Download(self, self._body(file_id, start, end))
+        if byte_range is None:
+            return 200, headers, body
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return 206, headers, body
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+
+    async def drain(self, timeout: float):
+        """Refuse new downloads and wait for running ones to finish (shutdown hook)"""
+        self.closing = True
+        deadline = time.monotonic() + timeout
+        while self.active and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.active:
+            logger.warning(f"⚠️ {self.active} download(s) still running at shutdown")
+
+    async def _open(self, file_id: str, offset: int, limit: int) -> tuple:
+        queue = asyncio.Queue(self.buffer_chunks)
+        task = asyncio.create_task(self._produce(file_id, offset, limit, queue))
+        return queue, task
+
+    async def _produce(self, file_id: str, offset: int, limit: int, queue: asyncio.Queue):
+        """Read chunks from Telegram - blocks on the full queue while the client is behind"""
+        try:
+            uid = self._unique_id(file_id) if chunk_cache.enabled else None
+            if uid:
+                await self._produce_cached(file_id, uid, offset, limit, queue)
+            else:
+                async for chunk in self.client.stream_media(file_id, limit=limit, offset=offset):
+                    await queue.put(chunk)
+            await queue.put(None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    @staticmethod
+    def _unique_id(file_id: str) -> str:
+        try:
+            return file_unique_id(file_id)
+        except Exception:
+            return None
+
+    async def _produce_cached(self, file_id: str, uid: str, offset: int, limit: int, queue: asyncio.Queue):
+        end = offset + limit if limit else None
+        index = offset
+        while end is None or index < end:
+            chunk = chunk_cache.open(uid, index)
+            if chunk is None:
+                index, last = await self._read_misses(file_id, uid, index, end, queue)
+            else:
+                await queue.put(chunk)
+                index += 1
+                last = len(chunk) < CHUNK_SIZE
+            if last:
+                break
+
+    async def _read_misses(self, file_id: str, uid: str, index: int, end: int, queue: asyncio.Queue) -> tuple:
+        """One sequential read from `index` up to the next cached chunk, written through to the cache.
+        Returns (next index, end of file reached)"""
+        chunks = self.client.stream_media(file_id, limit=end - index if end is not None else 0, offset=index)
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+                await chunk_cache.put(uid, index, chunk)
+                index += 1
+                if len(chunk) < CHUNK_SIZE:
+                    return index, True
+                if chunk_cache.contains(uid, index):
+                    return index, False
+        finally:
+            await chunks.aclose()
+        return index, True
+
+    def _body(self, file_id: str, start: int, end: int):
+        """Bytes start..end (inclusive; end None = to the end of the file), runs on the web thread"""
+        first = start // CHUNK_SIZE
+        limit = (end // CHUNK_SIZE - first + 1) if end is not None else 0
+        skip = start - first * CHUNK_SIZE
+        remaining = end - start + 1 if end is not None else None
+
+        task = None
+        try:
+            queue, task = asyncio.run_coroutine_threadsafe(self._open(file_id, first, limit), self.loop).result()
+            while remaining is None or remaining > 0:
+                get = asyncio.run_coroutine_threadsafe(queue.get(), self.loop)
+                try:
+                    chunk = get.result(self.read_timeout)
+                except concurrent.futures.TimeoutError:
+                    # Don't leave the get() waiting on the bot loop
+                    get.cancel()
+                    raise
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                stop = len(chunk) if remaining is None else min(len(chunk), skip + remaining)
+                # Cached chunks are mmaps - slicing copies straight out of the page cache
+                data = chunk[skip:stop]
+                if isinstance(chunk, mmap.mmap):
+                    chunk.close()
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(data)
+                self.bytes_sent += len(data)
+                yield data
+            self.served += 1
+        except GeneratorExit:
+            # Client went away
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Stream error: {e!r}")
+        finally:
+            if task is not None:
+                self.loop.call_soon_threadsafe(task.cancel)
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "max_streams": self.max_streams,
+            "served": self.served,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "mb_sent": round(self.bytes_sent / CHUNK_SIZE, 1)
+        }
+
+
+class Download:
+    """Response body that holds a stream slot until it is finished or closed (even if never read)"""
+
+    def __init__(self, streamer: Streamer, chunks):
+        self.streamer = streamer
+        self.chunks = chunks
+        self.released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            return next(self.chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        # The server calls this for every response, HEAD and aborted ones included
+        self.chunks.close()
+        if not self.released:
+            self.released = True
+            self.streamer._release()
+
+
+def _secret() -> bytes:
+    # Derived from the bot token unless set, so every replica accepts the same links
+    if Config.STREAM_SECRET:
+        return Config.STREAM_SECRET.encode()
+    return hashlib.sha256(b"stream:" + Config.BOT_TOKEN.encode()).digest()
+
+
+# Global instance
+streamer = Streamer(
+    _secret(),
+    ttl=Config.STREAM_LINK_TTL,
+    buffer_chunks=Config.STREAM_BUFFER_CHUNKS,
+    max_streams=Config.STREAM_MAX_STREAMS
+)
@@ -0,0 +1,177 @@
+"""
+TMDB store utility - local indexed movie metadata loaded from offline dumps
+
+Import (gzipped JSON lines, one movie per line):
+    python -m utils.tmdb_store movies_export.json.gz [more.json.gz ...]
+
+Each line may carry: id, title / original_title, release_date, vote_average,
+overview, poster_path, popularity. Missing fields are stored empty.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+POSTER_URL = "https://image.tmdb.org/t/p/w500"
+
+_TITLE_YEAR = re.compile(r'^(.*) (\d{4})$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    title TEXT,
+    year TEXT,
+    rating REAL,
+    overview TEXT,
+    poster TEXT,
+    popularity REAL
+);
+CREATE INDEX IF NOT EXISTS movies_key ON movies (key, popularity DESC);
+"""
+
+
+class MetadataStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    @property
+    def available(self) -> bool:
+        return self._conn is not None or os.path.exists(self.path)
+
+    # ======================
+    # LOOKUP
+    # ======================
+
+    def lookup_sync(self, key: str) -> dict:
+        """Most popular movie whose normalized title is `key` ("dune 2021" also filters by year)"""
+        if not key or not self.available:
+            return None
+
+        match = _TITLE_YEAR.match(key)
+
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT title, year, rating, overview, poster FROM movies WHERE key = ? "
+                "ORDER BY popularity DESC LIMIT 1",
+                (key,)
+            ).fetchone()
+            if row is None and match:
+                key, year = match.group(1), match.group(2)
+                row = conn.execute(
+                    "SELECT title, year, rating, overview, poster FROM movies WHERE key = ? AND year = ? "
+                    "ORDER BY popularity DESC LIMIT 1",
+                    (key, year)
+                ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        title, year, rating, overview, poster = row
+        return {
+            "title": title,
+            "year": year or "",
+            "rating": rating if rating is not None else "N/A",
+            "overview": overview or "",
+            "poster": f"{POSTER_URL}{poster}" if poster else None
+        }
+
+    async def lookup(self, key: str) -> dict:
+        """Async lookup - runs the SQLite query off the event loop"""
+        if not key or not self.available:
+            return None
+        return await asyncio.to_thread(self.lookup_sync, key)
+
+    # ======================
+    # IMPORT
+    # ======================
+
+    def import_dump(self, filename: str) -> int:
+        """Stream a gzipped JSON-lines dump into the store, BATCH_SIZE rows at a time"""
+        # Local import - helpers imports this module
+        from helpers import normalize_name
+
+        count = 0
+        batch = []
+
+        def flush():
+            with self._lock:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO movies (id, key, title, year, rating, overview, poster, popularity) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+                conn.commit()
+            batch.clear()
+
+        with gzip.open(filename, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    m = json.loads(line)
+                except ValueError:
+                    continue
+
+                title = m.get("title") or m.get("original_title")
+                if not title or "id" not in m:
+                    continue
+
+                batch.append((
+                    m["id"],
+                    normalize_name(title),
+                    title,
+                    (m.get("release_date") or "")[:4],
+                    m.get("vote_average"),
+                    (m.get("overview") or "")[:300],
+                    m.get("poster_path"),
+                    m.get("popularity") or 0
+                ))
+                count += 1
+
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+
+        if batch:
+            flush()
+        return count
+
+    def stats(self) -> dict:
+        size = 0
+        if self.available:
+            with self._lock:
+                size = self._connect().execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+if __name__ == "__main__":
+    from config import Config
+
+    if len(sys.argv) < 2:
+        exit("Usage: python -m utils.tmdb_store dump.json.gz [...]")
+
+    store = MetadataStore(Config.TMDB_STORE_PATH)
+    for dump in sys.argv[1:]:
+        print(f"📥 Importing {dump}...")
+        print(f"✅ {store.import_dump(dump)} movies")
+    print(f"📦 Store now has {store.stats()['size']} movies")
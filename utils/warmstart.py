@@ -0,0 +1,140 @@
+"""
+Warm start utility - snapshot persistent caches to disk, map them back at startup
+
+File layout (little-endian):
+    b"WARM" | version (u8) | written at (f64) | section count (u16)
+    per section: name length (u16) | name | entry count (u32)
+    per entry:   expires at (f64, wall clock) | key length (u32) | value length (u32) | key | value
+
+Keys and values are pickles. At startup only the keys are decoded; values stay
+in the memory-mapped file and are unpickled on first read (utils.cache.Restored),
+expired entries are skipped. Snapshots are written to a temp file and renamed,
+so an open map of the previous snapshot stays valid.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import pickle
+import struct
+import time
+from config import Config
+from utils.cache import Restored, caches
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WARM"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBdH")
+SECTION = struct.Struct("<HI")
+ENTRY = struct.Struct("<dII")
+
+
+def _encode(entries: list) -> list:
+    """(expiry, key, value) -> (expiry, key bytes, value bytes); Restored values are copied as is"""
+    encoded = []
+    for expires_at, key, value in entries:
+        try:
+            data = bytes(value.data) if type(value) is Restored else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            encoded.append((expires_at, pickle.dumps(key, pickle.HIGHEST_PROTOCOL), data))
+        except Exception:
+            continue
+    return encoded
+
+
+class WarmStart:
+    def __init__(self, path: str):
+        self.path = path
+        self.loaded = {}
+        self.saved = 0
+        self.last_save = None
+        self._map = None
+
+    def load(self) -> dict:
+        """Restore every persistent cache from the snapshot file, returns entries per cache"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+
+        started = time.monotonic()
+        try:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._map)
+
+            magic, version, written_at, sections = HEADER.unpack_from(view, 0)
+            if magic != MAGIC or version != VERSION:
+                logger.warning(f"Ignoring cache snapshot {self.path}: unknown format")
+                return {}
+
+            pos = HEADER.size
+            for _ in range(sections):
+                name_len, count = SECTION.unpack_from(view, pos)
+                pos += SECTION.size
+                name = bytes(view[pos:pos + name_len]).decode()
+                pos += name_len
+
+                entries = []
+                for _ in range(count):
+                    expires_at, key_len, value_len = ENTRY.unpack_from(view, pos)
+                    pos += ENTRY.size
+                    if pos + key_len + value_len > len(view):
+                        raise ValueError("truncated")
+                    key = pickle.loads(view[pos:pos + key_len])
+                    pos += key_len
+                    entries.append((expires_at, key, Restored(view[pos:pos + value_len])))
+                    pos += value_len
+
+                cache = caches.get(name)
+                if cache is not None and cache.persist:
+                    self.loaded[name] = cache.restore(entries)
+
+        except Exception as e:
+            logger.warning(f"Cache snapshot {self.path} unreadable: {e}")
+            return self.loaded
+
+        logger.info(
+            "cache snapshot loaded",
+            extra={"fields": {
+                "entries": sum(self.loaded.values()),
+                "age_s": int(time.time() - written_at),
+                "ms": int((time.monotonic() - started) * 1000)
+            }}
+        )
+        return self.loaded
+
+    def _write(self, sections: list):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, time.time(), len(sections)))
+            for name, entries in sections:
+                encoded = _encode(entries)
+                name = name.encode()
+                f.write(SECTION.pack(len(name), len(encoded)))
+                f.write(name)
+                for expires_at, key, value in encoded:
+                    f.write(ENTRY.pack(expires_at, len(key), len(value)))
+                    f.write(key)
+                    f.write(value)
+        os.replace(tmp, self.path)
+
+    async def save(self):
+        """Write all persistent caches (entries are collected here, encoded off the event loop)"""
+        if not self.path:
+            return
+        sections = [(name, cache.dump()) for name, cache in caches.items() if cache.persist]
+        await asyncio.to_thread(self._write, sections)
+        self.saved = sum(len(entries) for _, entries in sections)
+        self.last_save = time.time()
+
+    def snapshot(self) -> dict:
+        return {
+            "path": self.path,
+            "loaded": self.loaded,
+            "saved": self.saved,
+            "last_save": int(self.last_save) if self.last_save else None
+        }
+
+
+# Global instance
+warm_start = WarmStart(Config.WARM_START_PATH)
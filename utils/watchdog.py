@@ -0,0 +1,101 @@
+"""
+Watchdog utility - event loop lag monitor
+
+A task on the loop sleeps `interval` and records how late it woke up (the
+time every other update also had to wait). A daemon thread watches that
+heartbeat: once the loop has been stuck for more than `threshold`, it logs
+the stack of the loop thread - the code that is blocking it - once per stall.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from config import Config
+from utils.dbmonitor import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self.histogram = Histogram()
+        self.lag_ms = 0.0
+        self.stalls = 0
+        self.last_stall = None
+        self._beat = time.monotonic()
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start measuring the running loop (call from the loop thread)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    async def _measure(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag_ms = max(0.0, (now - started - self.interval) * 1000)
+            self.histogram.add(self.lag_ms)
+            self._beat = now
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            stuck = time.monotonic() - beat
+            if stuck < self.threshold + self.interval or reported == beat:
+                continue
+            reported = beat
+            self.stalls += 1
+            self._report(stuck)
+
+    def _report(self, stuck: float):
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame else "(no frame)"
+        task = asyncio.current_task(self._loop)
+        self.last_stall = {
+            "at": int(time.time()),
+            "stuck_ms": int(stuck * 1000),
+            "task": task.get_name() if task else None,
+            "where": traceback.format_stack(frame, limit=1)[0].strip() if frame else None
+        }
+        logger.warning(
+            "event loop blocked",
+            extra={"fields": {
+                "stuck_ms": self.last_stall["stuck_ms"],
+                "task": self.last_stall["task"],
+                "stack": stack
+            }}
+        )
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> dict:
+        lag = self.histogram.snapshot()
+        return {
+            "lag_ms": round(self.lag_ms, 1),
+            "p50_ms": lag["p50_ms"],
+            "p99_ms": lag["p99_ms"],
+            "max_ms": lag["max_ms"],
+            "stalls": self.stalls,
+            "last_stall": self.last_stall
+        }
+
+
+# Global instance (started by bot.py on the bot loop)
+watchdog = LoopWatchdog(threshold=Config.LOOP_LAG_THRESHOLD_MS / 1000)